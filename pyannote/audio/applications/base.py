@@ -141,6 +141,10 @@ class Application(object):
         except ModuleNotFoundError as e:
             warnings.warn(e.args[0])
 
+        # additional training options (e.g. "accumulate" gradients over
+        # several batches or use "mixed_precision"). see Trainer.fit
+        self.training_params_ = self.config_.get('training', {})
+
         # data augmentation (only when training the model)
         if training and 'data_augmentation' in self.config_ :
             DataAugmentation = get_class_by_name(
@@ -179,7 +183,8 @@ class Application(object):
             get_optimizer=self.get_optimizer_,
             get_scheduler=self.get_scheduler_,
             learning_rate=self.learning_rate_,
-            log_dir=train_dir, device=self.device)
+            log_dir=train_dir, device=self.device,
+            **self.training_params_)
 
     def load_model(self, epoch, train_dir=None):
         """Load pretrained model
@@ -167,13 +167,11 @@ Configuration file:
     >>> homogeneous_segments = peak_detection.apply(raw_scores, dimension=1)
 """
 
-from functools import partial
 from pathlib import Path
 
 import numpy as np
 import torch
 from docopt import docopt
-from pyannote.database import get_annotated
 from pyannote.database import get_unique_identifier
 from pyannote.metrics.diarization import DiarizationPurityCoverageFMeasure
 from pyannote.metrics.segmentation import SegmentationPurityCoverageFMeasure
@@ -181,16 +179,12 @@ from pyannote.metrics.segmentation import SegmentationPurityCoverageFMeasure
 from pyannote.audio.labeling.extraction import SequenceLabeling
 from pyannote.audio.signal import Peak
 from .speech_detection import SpeechActivityDetection
+from .speech_detection import validate_thresholds
+from .speech_detection import grid_search
 
 from pyannote.audio.pipeline.speaker_change_detection \
     import SpeakerChangeDetection as SpeakerChangeDetectionPipeline
 
-def validate_helper_func(current_file, pipeline=None, metric=None):
-    reference = current_file['annotation']
-    uem = get_annotated(current_file)
-    hypothesis = pipeline(current_file)
-    return metric(reference, hypothesis, uem=uem)
-
 class SpeakerChangeDetection(SpeechActivityDetection):
 
     def validate_epoch(self, epoch, protocol_name, subset='development',
@@ -213,43 +207,33 @@ class SpeakerChangeDetection(SpeechActivityDetection):
 
         # pipeline
         pipeline = SpeakerChangeDetectionPipeline(purity=self.purity)
+        pipeline.instantiate({'alpha': .5,
+                              'min_duration': 0.})
 
-        # dichotomic search to find alpha that maximizes coverage
-        # while having at least `self.purity`
-
-        lower_alpha = 0.
-        upper_alpha = 1.
-        best_alpha = .5 * (lower_alpha + upper_alpha)
-        best_coverage = 0.
-
-        for _ in range(10):
-
-            current_alpha = .5 * (lower_alpha + upper_alpha)
-            pipeline.instantiate({'alpha': current_alpha,
-                                  'min_duration': 0.})
-
-            if self.diarization:
-                metric = DiarizationPurityCoverageFMeasure(parallel=True)
-            else:
-                metric = SegmentationPurityCoverageFMeasure(parallel=True)
-
-            validate = partial(validate_helper_func,
-                               pipeline=pipeline,
-                               metric=metric)
-            _ = self.pool_.map(validate, validation_data)
-
-            purity, coverage, _ = metric.compute_metrics()
-
-            # TODO: normalize coverage with what one could achieve if
-            # we were to put all reference speech turns in its own cluster
-
-            if purity < self.purity:
-                upper_alpha = current_alpha
-            else:
-                lower_alpha = current_alpha
-                if coverage > best_coverage:
-                    best_coverage = coverage
-                    best_alpha = current_alpha
+        if self.diarization:
+            metric = DiarizationPurityCoverageFMeasure()
+        else:
+            metric = SegmentationPurityCoverageFMeasure()
+
+        # grid search to find alpha that maximizes coverage
+        # while having at least `self.purity`. each call processes all
+        # alphas in one go.
+        def fun(alphas):
+            details = validate_thresholds(self.pool_, validation_data,
+                                          pipeline, alphas, metric)
+            values = []
+            for detail in details:
+                purity, coverage, _ = metric.compute_metrics(detail=detail)
+
+                # TODO: normalize coverage with what one could achieve if
+                # we were to put all reference speech turns in its own cluster
+
+                values.append(1. - coverage if purity >= self.purity
+                              else 1. + (1. - purity))
+            return np.array(values)
+
+        best_alpha, value = grid_search(fun)
+        best_coverage = 1. - value if value <= 1. else 0.
 
         return {'metric': f'coverage@{self.purity:.2f}purity',
                 'minimize': False,
@@ -171,16 +171,13 @@ Configuration file:
     >>> homogeneous_segments = peak_detection.apply(raw_scores, dimension=1)
 """
 
-from functools import partial
 from pathlib import Path
 import multiprocessing as mp
 from tqdm import tqdm
-import scipy.optimize
 
 import numpy as np
 import torch
 from docopt import docopt
-from pyannote.database import get_annotated
 from pyannote.database import get_protocol
 from pyannote.database import FileFinder
 from pyannote.database import get_unique_identifier
@@ -204,28 +201,8 @@ from pyannote.audio.pipeline.speaker_change_detection \
     import SpeakerChangeDetection as SpeakerChangeDetectionPipeline
 from pyannote.metrics.segmentation import SegmentationPurityCoverageFMeasure
 
-
-def validate_helper_func(current_file, pipeline=None, metric=None,
-                         reference='annotation'):
-    """Helper function used in validation
-
-    Parameters
-    ----------
-    current_file : dict
-    pipeline : `pyannote.pipeline.Pipeline`
-    metric : `pyannote.metrics.BaseMetric`
-    reference : str
-        `current_file` key containing reference. Defaults to "annotation".
-
-    Returns
-    -------
-    value : float
-        Metric value.
-    """
-    reference = current_file[reference]
-    uem = get_annotated(current_file)
-    hypothesis = pipeline(current_file)
-    return metric(reference, hypothesis, uem=uem)
+from .speech_detection import validate_thresholds
+from .speech_detection import grid_search
 
 
 class Segmentation(Application):
@@ -321,29 +298,26 @@ class Segmentation(Application):
 
         # pipeline
         pipeline = SpeechActivityDetectionPipeline()
+        pipeline.instantiate({'onset': .5,
+                              'offset': .5,
+                              'min_duration_on': 0.,
+                              'min_duration_off': 0.,
+                              'pad_onset': 0.,
+                              'pad_offset': 0.})
+
+        # each call processes all thresholds in one go
+        def fun(thresholds):
+            metric = DetectionErrorRate()
+            details = validate_thresholds(self.pool_, validation_data,
+                                          pipeline, thresholds, metric)
+            return np.array([metric.compute_metric(detail)
+                             for detail in details])
+
+        threshold, value = grid_search(fun)
 
-        def fun(threshold):
-            pipeline.instantiate({'onset': threshold,
-                                  'offset': threshold,
-                                  'min_duration_on': 0.,
-                                  'min_duration_off': 0.,
-                                  'pad_onset': 0.,
-                                  'pad_offset': 0.})
-            metric = DetectionErrorRate(parallel=True)
-            validate = partial(validate_helper_func,
-                               pipeline=pipeline,
-                               metric=metric)
-            _ = self.pool_.map(validate, validation_data)
-
-            return abs(metric)
-
-        res = scipy.optimize.minimize_scalar(
-            fun, bounds=(0., 1.), method='bounded', options={'maxiter': 10})
-
-        threshold = res.x.item()
         return {'metric': 'detection_error_rate',
                 'minimize': True,
-                'value': res.fun,
+                'value': value,
                 'pipeline': pipeline.instantiate({'onset': threshold,
                                                   'offset': threshold,
                                                   'min_duration_on': 0.,
@@ -376,30 +350,27 @@ class Segmentation(Application):
 
         # pipeline
         pipeline = SpeechActivityDetectionPipeline()
+        pipeline.instantiate({'onset': .5,
+                              'offset': .5,
+                              'min_duration_on': 0.,
+                              'min_duration_off': 0.,
+                              'pad_onset': 0.,
+                              'pad_offset': 0.})
+
+        # each call processes all thresholds in one go
+        def fun(thresholds):
+            metric = DetectionErrorRate()
+            details = validate_thresholds(self.pool_, validation_data,
+                                          pipeline, thresholds, metric,
+                                          reference='overlap')
+            return np.array([metric.compute_metric(detail)
+                             for detail in details])
+
+        threshold, value = grid_search(fun)
 
-        def fun(threshold):
-            pipeline.instantiate({'onset': threshold,
-                                  'offset': threshold,
-                                  'min_duration_on': 0.,
-                                  'min_duration_off': 0.,
-                                  'pad_onset': 0.,
-                                  'pad_offset': 0.})
-            metric = DetectionErrorRate(parallel=True)
-            validate = partial(validate_helper_func,
-                               pipeline=pipeline,
-                               metric=metric,
-                               reference='overlap')
-            _ = self.pool_.map(validate, validation_data)
-
-            return abs(metric)
-
-        res = scipy.optimize.minimize_scalar(
-            fun, bounds=(0., 1.), method='bounded', options={'maxiter': 10})
-
-        threshold = res.x.item()
         return {'metric': 'detection_error_rate',
                 'minimize': True,
-                'value': res.fun,
+                'value': value,
                 'pipeline': pipeline.instantiate({'onset': threshold,
                                                   'offset': threshold,
                                                   'min_duration_on': 0.,
@@ -432,40 +403,30 @@ class Segmentation(Application):
 
         # pipeline
         pipeline = SpeakerChangeDetectionPipeline(purity=self.purity)
-
-        # dichotomic search to find alpha that maximizes coverage
-        # while having at least `self.purity`
-
-        lower_alpha = 0.
-        upper_alpha = 1.
-        best_alpha = .5 * (lower_alpha + upper_alpha)
-        best_coverage = 0.
-
-        for _ in range(10):
-
-            current_alpha = .5 * (lower_alpha + upper_alpha)
-            pipeline.instantiate({'alpha': current_alpha,
-                                  'min_duration': 0.})
-
-            metric = SegmentationPurityCoverageFMeasure(parallel=True)
-
-            validate = partial(validate_helper_func,
-                               pipeline=pipeline,
-                               metric=metric)
-            _ = self.pool_.map(validate, validation_data)
-
-            purity, coverage, _ = metric.compute_metrics()
-
-            # TODO: normalize coverage with what one could achieve if
-            # we were to put all reference speech turns in its own cluster
-
-            if purity < self.purity:
-                upper_alpha = current_alpha
-            else:
-                lower_alpha = current_alpha
-                if coverage > best_coverage:
-                    best_coverage = coverage
-                    best_alpha = current_alpha
+        pipeline.instantiate({'alpha': .5,
+                              'min_duration': 0.})
+
+        metric = SegmentationPurityCoverageFMeasure()
+
+        # grid search to find alpha that maximizes coverage
+        # while having at least `self.purity`. each call processes all
+        # alphas in one go.
+        def fun(alphas):
+            details = validate_thresholds(self.pool_, validation_data,
+                                          pipeline, alphas, metric)
+            values = []
+            for detail in details:
+                purity, coverage, _ = metric.compute_metrics(detail=detail)
+
+                # TODO: normalize coverage with what one could achieve if
+                # we were to put all reference speech turns in its own cluster
+
+                values.append(1. - coverage if purity >= self.purity
+                              else 1. + (1. - purity))
+            return np.array(values)
+
+        best_alpha, value = grid_search(fun)
+        best_coverage = 1. - value if value <= 1. else 0.
 
         return {'metric': f'coverage@{self.purity:.2f}purity',
                 'minimize': False,
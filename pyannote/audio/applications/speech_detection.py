@@ -162,7 +162,6 @@ Configuration file:
 
 import torch
 import numpy as np
-import scipy.optimize
 from tqdm import tqdm
 from pathlib import Path
 from docopt import docopt
@@ -189,6 +188,100 @@ def validate_helper_func(current_file, pipeline=None, metric=None):
     hypothesis = pipeline(current_file)
     return metric(reference, hypothesis, uem=uem)
 
+
+def validate_batch_helper_func(current_file, pipeline=None, thresholds=None,
+                               metric=None, reference='annotation'):
+    """Helper function used in (batch) validation
+
+    Parameters
+    ----------
+    current_file : dict
+    pipeline : `pyannote.pipeline.Pipeline`
+        Pipeline with an `apply_batch` method.
+    thresholds : np.ndarray
+        Thresholds passed to `pipeline.apply_batch`.
+    metric : `pyannote.metrics.BaseMetric`
+    reference : str
+        `current_file` key containing reference. Defaults to "annotation".
+
+    Returns
+    -------
+    components : list of dict
+        Metric components, for each threshold.
+    """
+    reference = current_file[reference]
+    uem = get_annotated(current_file)
+    return [metric.compute_components(reference, hypothesis, uem=uem)
+            for hypothesis in pipeline.apply_batch(current_file, thresholds)]
+
+
+def validate_thresholds(pool, validation_data, pipeline, thresholds, metric,
+                        reference='annotation'):
+    """Evaluate many thresholds at once
+
+    Parameters
+    ----------
+    pool : multiprocessing.Pool
+        Files are processed in parallel using this pool.
+    validation_data : list of dict
+    pipeline : `pyannote.pipeline.Pipeline`
+        Pipeline with an `apply_batch` method.
+    thresholds : np.ndarray
+        Thresholds passed to `pipeline.apply_batch`.
+    metric : `pyannote.metrics.BaseMetric`
+    reference : str
+        `current_file` key containing reference. Defaults to "annotation".
+
+    Returns
+    -------
+    details : list of dict
+        Metric components accumulated over all files, for each threshold.
+    """
+
+    validate = partial(validate_batch_helper_func, pipeline=pipeline,
+                       thresholds=thresholds, metric=metric,
+                       reference=reference)
+    components = pool.map(validate, validation_data)
+
+    return [{name: sum(c[t][name] for c in components)
+             for name in metric.metric_components()}
+            for t, _ in enumerate(thresholds)]
+
+
+def grid_search(func, lower=0., upper=1., num=19, n_iter=2):
+    """Coarse-to-fine grid search of the threshold that minimizes `func`
+
+    Parameters
+    ----------
+    func : callable
+        Takes a (num, ) array of thresholds as input and returns the
+        corresponding (num, ) array of values, in one go.
+    lower, upper : float, optional
+        Search interval. Defaults to [0, 1].
+    num : int, optional
+        Number of thresholds evaluated at each iteration. Defaults to 19.
+    n_iter : int, optional
+        Number of iterations. Each iteration zooms around the best threshold
+        of previous iteration. Defaults to 2.
+
+    Returns
+    -------
+    threshold : float
+        Best threshold.
+    value : float
+        Corresponding value.
+    """
+
+    for _ in range(n_iter):
+        thresholds = np.linspace(lower, upper, num=num + 2)[1:-1]
+        values = func(thresholds)
+        best = np.argmin(values)
+        threshold, value = thresholds[best].item(), values[best].item()
+        step = thresholds[1] - thresholds[0]
+        lower, upper = threshold - step, threshold + step
+
+    return threshold, value
+
 class SpeechActivityDetection(Application):
 
     def __init__(self, experiment_dir, db_yml=None, training=False):
@@ -253,29 +346,26 @@ class SpeechActivityDetection(Application):
 
         # pipeline
         pipeline = SpeechActivityDetectionPipeline()
+        pipeline.instantiate({'onset': .5,
+                              'offset': .5,
+                              'min_duration_on': 0.,
+                              'min_duration_off': 0.,
+                              'pad_onset': 0.,
+                              'pad_offset': 0.})
+
+        # each call processes all thresholds in one go
+        def fun(thresholds):
+            metric = DetectionErrorRate()
+            details = validate_thresholds(self.pool_, validation_data,
+                                          pipeline, thresholds, metric)
+            return np.array([metric.compute_metric(detail)
+                             for detail in details])
+
+        threshold, value = grid_search(fun)
 
-        def fun(threshold):
-            pipeline.instantiate({'onset': threshold,
-                                  'offset': threshold,
-                                  'min_duration_on': 0.,
-                                  'min_duration_off': 0.,
-                                  'pad_onset': 0.,
-                                  'pad_offset': 0.})
-            metric = DetectionErrorRate(parallel=True)
-            validate = partial(validate_helper_func,
-                               pipeline=pipeline,
-                               metric=metric)
-            _ = self.pool_.map(validate, validation_data)
-
-            return abs(metric)
-
-        res = scipy.optimize.minimize_scalar(
-            fun, bounds=(0., 1.), method='bounded', options={'maxiter': 10})
-
-        threshold = res.x.item()
         return {'metric': 'detection_error_rate',
                 'minimize': True,
-                'value': res.fun,
+                'value': value,
                 'pipeline': pipeline.instantiate({'onset': threshold,
                                                   'offset': threshold,
                                                   'min_duration_on': 0.,
@@ -27,9 +27,32 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import numpy as np
+
+
 class Augmentation(object):
 
     def __call__(self, waveform, sample_rate):
         return waveform
 
+    def batch(self, waveforms, sample_rate):
+        """Augment a batch of waveforms
+
+        Subclasses should override this method with a vectorized version.
+
+        Parameters
+        ----------
+        waveforms : `np.ndarray`
+            (batch_size, n_samples) waveforms.
+        sample_rate : `int`
+            Sample rate.
+
+        Returns
+        -------
+        augmented : `np.ndarray`
+            (batch_size, n_samples) augmented waveforms.
+        """
+        return np.vstack([self(waveform[:, np.newaxis], sample_rate)[:, 0]
+                          for waveform in waveforms])
+
 NoAugmentation = Augmentation
@@ -27,13 +27,16 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import io
+import os
+import yaml
 import numpy as np
-from pyannote.core import Segment
+from pathlib import Path
 from pyannote.audio.features.utils import RawAudio
 from pyannote.audio.features.utils import get_audio_duration
-from pyannote.generators.fragment import random_subsegment
 from pyannote.database import get_protocol
 from pyannote.database import FileFinder
+from pyannote.audio.util import mkdir_p
 from .base import Augmentation
 
 
@@ -45,36 +48,238 @@ class AddNoise(Augmentation):
     collection : str or list of str
         `pyannote.database` collection(s) used for adding noise. Defaults to
         'MUSAN.Collection.BackgroundNoise' available in `pyannote.db.musan`
-        package.
+        package (or to the collection `bank` was built from).
     db_yml : str, optional
         Path to `pyannote.database` configuration file.
     snr_min, snr_max : int, optional
         Defines Signal-to-Noise Ratio (SNR) range in dB. Defaults to [5, 20].
+    bank : `Path`, optional
+        Path to noise bank directory, built beforehand with `save_bank`.
+        Noise is cropped from this (memory-mapped) bank and `collection` is
+        not even loaded. Defaults to loading noise files in memory once and
+        for all (see `load_pool`), the first time noise is added.
+
+    Usage
+    -----
+    Build the noise bank once and for all, before training:
+    >>> AddNoise(collection='MUSAN.Collection.BackgroundNoise').save_bank(
+    ...     '/path/to/bank', sample_rate=16000)
+
+    Then use it (e.g. in `data_augmentation` section of `config.yml`):
+    >>> augmentation = AddNoise(bank='/path/to/bank')
     """
 
-    def __init__(self, collection=None, db_yml=None, snr_min=5, snr_max=20):
+    def __init__(self, collection=None, db_yml=None, snr_min=5, snr_max=20,
+                 bank=None):
         super().__init__()
 
-        if collection is None:
-            collection = 'MUSAN.Collection.BackgroundNoise'
-        if not isinstance(collection, (list, tuple)):
+        if collection is not None and \
+           not isinstance(collection, (list, tuple)):
             collection = [collection]
+
+        self.bank = None if bank is None else \
+            Path(bank).expanduser().resolve(strict=False)
+
+        # noise bank must be built beforehand (rather than lazily by each
+        # data loading worker or training process)
+        if self.bank is not None:
+            metadata_yml = self.bank / 'metadata.yml'
+            if not metadata_yml.exists():
+                msg = (f'Noise bank {self.bank} does not exist. Please build '
+                       f'it first with `AddNoise(collection=...).save_bank('
+                       f'bank, sample_rate)`.')
+                raise ValueError(msg)
+            with io.open(metadata_yml, 'r') as f:
+                bank_collection = yaml.safe_load(f)['collection']
+            if collection is None:
+                collection = bank_collection
+            elif list(collection) != bank_collection:
+                msg = (f'inconsistent "collection" (is: {bank_collection}, '
+                       f'should be: {list(collection)}). Please rebuild noise '
+                       f'bank {self.bank} with the expected collection.')
+                raise ValueError(msg)
+
+        if collection is None:
+            collection = ['MUSAN.Collection.BackgroundNoise']
         self.collection = collection
         self.db_yml = db_yml
 
         self.snr_min = snr_min
         self.snr_max = snr_max
 
-        # load noise database
+        # no need to load noise database when using a noise bank
         self.files_ = []
+        if self.bank is not None:
+            return
+
+        # load noise database
         preprocessors = {'audio': FileFinder(config_yml=db_yml),
                          'duration': get_audio_duration}
         for collection in self.collection:
             protocol = get_protocol(collection, preprocessors=preprocessors)
             self.files_.extend(protocol.files())
 
-    def normalize(self, waveform):
-        return waveform / (np.sqrt(np.mean(waveform ** 2)) + 1e-8)
+    def normalize(self, waveform, axis=None):
+        rms = np.sqrt(np.mean(waveform ** 2, axis=axis, keepdims=True))
+        return waveform / (rms + 1e-8)
+
+    def load_pool(self, sample_rate):
+        """Load (normalized) noise collection into one contiguous array
+
+        Parameters
+        ----------
+        sample_rate : `int`
+            Sample rate.
+
+        Returns
+        -------
+        pool : `np.ndarray`
+            (n_samples, ) concatenated (RMS-normalized) noise files.
+        offsets : `np.ndarray`
+            (n_files + 1, ) start index of each noise file in `pool`.
+        """
+
+        if getattr(self, 'sample_rate_', None) == sample_rate:
+            return self.pool_, self.offsets_
+
+        if self.bank is not None:
+            pool, offsets = self.load_bank(self.bank, sample_rate,
+                                           collection=self.collection)
+
+        else:
+            raw_audio = RawAudio(sample_rate=sample_rate, mono=True)
+
+            noises, offsets = [], [0]
+            for file in self.files_:
+                noise = self.normalize(raw_audio(file).data[:, 0])
+                noises.append(noise.astype(np.float32))
+                offsets.append(offsets[-1] + len(noise))
+
+            pool = np.hstack(noises)
+            offsets = np.array(offsets, dtype=np.int64)
+
+        self.pool_ = pool
+        self.offsets_ = offsets
+        self.sample_rate_ = sample_rate
+
+        return self.pool_, self.offsets_
+
+    def save_bank(self, bank, sample_rate, dtype='float32'):
+        """Resample, normalize and pack noise collection into a noise bank
+
+        Parameters
+        ----------
+        bank : `Path`
+            Path to noise bank directory.
+        sample_rate : `int`
+            Sample rate.
+        dtype : {'float32', 'float16'}, optional
+            Storage type. 'float16' halves the size of the bank.
+            Defaults to 'float32'.
+        """
+
+        # instances created from an existing bank do not load the noise
+        # collection: this would overwrite the bank with an empty one
+        if not self.files_:
+            msg = ('There is no noise file to save. Noise banks can only be '
+                   'built by instances created without "bank" option.')
+            raise ValueError(msg)
+
+        bank = Path(bank).expanduser().resolve(strict=False)
+        mkdir_p(bank)
+
+        raw_audio = RawAudio(sample_rate=sample_rate, mono=True)
+
+        # first pass to get the total number of samples
+        offsets = [0]
+        for file in self.files_:
+            n_samples = int(np.ceil(file['duration'] * sample_rate))
+            offsets.append(offsets[-1] + n_samples)
+
+        # second pass to write (resampled and normalized) noise one file at a
+        # time, so that the whole collection never needs to fit in memory.
+        # files are written under a temporary name then atomically renamed so
+        # that concurrent builders (e.g. data loading workers) never see a
+        # partial bank.
+        suffix = f'.{os.getpid()}.tmp'
+        waveform_npy = bank / 'waveform.npy'
+        pool = np.lib.format.open_memmap(
+            str(waveform_npy) + suffix, mode='w+', dtype=dtype,
+            shape=(offsets[-1], ))
+        for f, file in enumerate(self.files_):
+            noise = self.normalize(raw_audio(file).data[:, 0])
+            # actual number of samples may slightly differ from expected one
+            noise = np.resize(noise, offsets[f + 1] - offsets[f])
+            pool[offsets[f]:offsets[f + 1]] = noise
+        pool.flush()
+        del pool
+        os.replace(str(waveform_npy) + suffix, waveform_npy)
+
+        offsets_npy = bank / 'offsets.npy'
+        with io.open(str(offsets_npy) + suffix, 'wb') as f:
+            np.save(f, np.array(offsets, dtype=np.int64))
+        os.replace(str(offsets_npy) + suffix, offsets_npy)
+
+        # metadata.yml is written last and marks the bank as complete
+        metadata_yml = bank / 'metadata.yml'
+        params = {'sample_rate': sample_rate,
+                  'dtype': str(np.dtype(dtype)),
+                  'collection': list(self.collection),
+                  'uris': [file['uri'] for file in self.files_]}
+        with io.open(str(metadata_yml) + suffix, 'w') as f:
+            yaml.dump(params, f, default_flow_style=False)
+        os.replace(str(metadata_yml) + suffix, metadata_yml)
+
+    @staticmethod
+    def load_bank(bank, sample_rate, collection=None, uris=None):
+        """Load (memory-mapped) noise bank
+
+        Parameters
+        ----------
+        bank : `Path`
+            Path to noise bank directory.
+        sample_rate : `int`
+            Expected sample rate.
+        collection : list of str, optional
+            Expected noise collection(s). Defaults to not checking it.
+        uris : list of str, optional
+            Expected noise files. Defaults to not checking them.
+
+        Returns
+        -------
+        pool : `np.memmap`
+            (n_samples, ) concatenated (RMS-normalized) noise files.
+        offsets : `np.ndarray`
+            (n_files + 1, ) start index of each noise file in `pool`.
+        """
+
+        bank = Path(bank)
+
+        with io.open(bank / 'metadata.yml', 'r') as f:
+            params = yaml.safe_load(f)
+
+        if params['sample_rate'] != sample_rate:
+            msg = (f'inconsistent "sample_rate" (is: {params["sample_rate"]}, '
+                   f'should be: {sample_rate}). Please rebuild noise bank '
+                   f'{bank} with the expected sample rate.')
+            raise ValueError(msg)
+
+        if collection is not None and \
+           list(collection) != params['collection']:
+            msg = (f'inconsistent "collection" (is: {params["collection"]}, '
+                   f'should be: {list(collection)}). Please rebuild noise '
+                   f'bank {bank} with the expected collection.')
+            raise ValueError(msg)
+
+        if uris is not None and list(uris) != params['uris']:
+            msg = (f'inconsistent noise files. Please rebuild noise bank '
+                   f'{bank} with the expected files.')
+            raise ValueError(msg)
+
+        pool = np.load(bank / 'waveform.npy', mmap_mode='r')
+        offsets = np.load(bank / 'offsets.npy')
+
+        return pool, offsets
 
     def __call__(self, original, sample_rate):
         """Augment original waveform
@@ -92,40 +297,42 @@ class AddNoise(Augmentation):
             (n_samples, n_channels) noise-augmented waveform.
         """
 
-        raw_audio = RawAudio(sample_rate=sample_rate, mono=True)
-
-        original_duration = len(original) / sample_rate
+        return self.batch(original.T, sample_rate).T
 
-        # accumulate enough noise to cover duration of original waveform
-        noises = []
-        left = original_duration
-        while left > 0:
+    def batch(self, waveforms, sample_rate):
+        """Augment a batch of waveforms
 
-            # select noise file at random
-            file = np.random.choice(self.files_)
-            duration = file['duration']
+        Parameters
+        ----------
+        waveforms : `np.ndarray`
+            (batch_size, n_samples) waveforms.
+        sample_rate : `int`
+            Sample rate.
 
-            # if noise file is longer than what is needed, crop it
-            if duration > left:
-                segment = next(random_subsegment(Segment(0, duration), left))
-                noise = raw_audio.crop(file, segment,
-                                       mode='center', fixed=left)
-                left = 0
+        Returns
+        -------
+        augmented : `np.ndarray`
+            (batch_size, n_samples) noise-augmented waveforms.
+        """
 
-            # otherwise, take the whole file
-            else:
-                noise = raw_audio(file).data
-                left -= duration
+        pool, offsets = self.load_pool(sample_rate)
+        batch_size, n_samples = waveforms.shape
 
-            noise = self.normalize(noise)
-            noises.append(noise)
+        # select noise file at random and, if it is longer than what is
+        # needed, select (random) start within this file
+        f = np.random.randint(len(offsets) - 1, size=batch_size)
+        margin = np.maximum(0, offsets[f + 1] - offsets[f] - n_samples)
+        starts = offsets[f] + np.int64(np.random.random(batch_size) * margin)
 
-        # concatenate
+        # noise files shorter than waveform are completed with next files
         # FIXME: use fade-in between concatenated noises
-        noise = np.vstack(noises)
+        noise = pool.take(starts[:, np.newaxis] + np.arange(n_samples),
+                          mode='wrap').astype(np.float32)
 
         # select SNR at random
-        snr = (self.snr_max - self.snr_min) * np.random.random_sample() + self.snr_min
+        snr = (self.snr_max - self.snr_min) * \
+            np.random.random_sample(batch_size) + self.snr_min
         alpha = np.exp(-np.log(10) * snr / 20)
 
-        return self.normalize(original) + alpha * noise
+        return self.normalize(waveforms, axis=1) + \
+            alpha[:, np.newaxis] * noise
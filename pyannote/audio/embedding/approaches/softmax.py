@@ -72,6 +72,13 @@ class Softmax(Trainer):
         In case `duration` is None, set segment minimum duration.
     max_duration : float, optional
         In case `duration` is None, set segment maximum duration.
+    n_buckets : int, optional
+        In case `duration` is None, draw one duration per batch among
+        `n_buckets` duration buckets so that batches are rectangular.
+        Defaults to drawing one duration per segment.
+    curriculum : float, optional
+        Gradually move from short to long duration buckets during the first
+        `curriculum` epochs. Requires `n_buckets`.
     per_fold : int, optional
         Number of speakers per batch. Defaults to the whole speaker set.
     per_label : int, optional
@@ -89,7 +96,7 @@ class Softmax(Trainer):
 
     def __init__(self, duration=None, min_duration=None, max_duration=None,
                  per_label=1, per_fold=None, per_epoch=7, parallel=1,
-                 label_min_duration=0.):
+                 label_min_duration=0., n_buckets=None, curriculum=None):
         super().__init__()
 
         self.per_fold = per_fold
@@ -100,6 +107,8 @@ class Softmax(Trainer):
         self.duration = duration
         self.min_duration = min_duration
         self.max_duration = max_duration
+        self.n_buckets = n_buckets
+        self.curriculum = curriculum
 
         self.parallel = parallel
 
@@ -121,7 +130,8 @@ class Softmax(Trainer):
             per_label=self.per_label, per_fold=self.per_fold,
             per_epoch=self.per_epoch, duration=self.duration,
             min_duration=self.min_duration,
-            max_duration=self.max_duration, parallel=self.parallel)
+            max_duration=self.max_duration, n_buckets=self.n_buckets,
+            curriculum=self.curriculum, parallel=self.parallel)
 
     def extra_init(self, model, device, checkpoint=None,
                    labels=None):
@@ -62,6 +62,14 @@ class TripletLoss(Trainer):
         In case `duration` is None, set segment minimum duration.
     max_duration : float, optional
         In case `duration` is None, set segment maximum duration.
+    n_buckets : int, optional
+        In case `duration` is None, draw one duration per batch among
+        `n_buckets` duration buckets so that batches are rectangular.
+        Defaults to drawing one duration per segment.
+    curriculum : float, optional
+        Gradually move from short to long duration buckets during the first
+        `curriculum` epochs. Requires `n_buckets`.
+        Both are only supported by 'corpus' `variant`.
     metric : {'euclidean', 'cosine', 'angular'}, optional
         Defaults to 'cosine'.
     margin: float, optional
@@ -104,7 +112,8 @@ class TripletLoss(Trainer):
     def __init__(self, duration=None, min_duration=None, max_duration=None,
                  metric='cosine', margin=0.2, clamp='positive',
                  sampling='all', per_label=3, per_fold=None, per_epoch=7,
-                 parallel=1, variant='corpus', label_min_duration=0.):
+                 parallel=1, variant='corpus', label_min_duration=0.,
+                 n_buckets=None, curriculum=None):
 
         super(TripletLoss, self).__init__()
 
@@ -137,6 +146,13 @@ class TripletLoss(Trainer):
         self.min_duration = min_duration
         self.max_duration = max_duration
 
+        if variant != 'corpus' and (n_buckets is not None or
+                                    curriculum is not None):
+            msg = "'n_buckets' and 'curriculum' require 'corpus' variant."
+            raise ValueError(msg)
+        self.n_buckets = n_buckets
+        self.curriculum = curriculum
+
         self.parallel = parallel
 
     @property
@@ -412,6 +428,7 @@ class TripletLoss(Trainer):
                 per_label=self.per_label, per_fold=self.per_fold,
                 per_epoch=self.per_epoch, duration=self.duration,
                 min_duration=self.min_duration, max_duration=self.max_duration,
+                n_buckets=self.n_buckets, curriculum=self.curriculum,
                 parallel=self.parallel)
 
         elif self.variant == 'unsupervised':
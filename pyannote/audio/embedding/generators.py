@@ -27,12 +27,13 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import itertools
 import numpy as np
 from pyannote.core import Segment
-from pyannote.generators.fragment import random_segment
 from pyannote.generators.fragment import random_subsegment
 from pyannote.generators.batch import batchify, EndOfBatch
 from pyannote.database.protocol import SpeakerDiarizationProtocol
+from pyannote.audio.train.loader import BatchLoader
 
 
 def get_dummy_protocol(current_file: dict) -> SpeakerDiarizationProtocol:
@@ -64,6 +65,49 @@ def get_dummy_protocol(current_file: dict) -> SpeakerDiarizationProtocol:
     return DummyProtocol()
 
 
+def random_sub_segments(starts, ends, duration=None,
+                        min_duration=None, max_duration=None):
+    """Choose one sub-segment at random in each segment
+
+    Parameters
+    ----------
+    starts, ends : (n_segments, ) np.ndarray
+        Segment boundaries.
+    duration : float, optional
+        Choose fixed `duration` sub-segments.
+    min_duration, max_duration : float, optional
+        In case `duration` is None, choose sub-segments duration at random
+        between `min_duration` and `max_duration`. When `min_duration` is None,
+        segments longer than `max_duration` are cut at exactly `max_duration`.
+        When `max_duration` is None, segments are kept as they are.
+
+    Returns
+    -------
+    starts, ends : (n_segments, ) np.ndarray
+        Sub-segment boundaries.
+    """
+
+    durations = ends - starts
+
+    if duration is not None:
+        sub_durations = np.full(len(starts), duration)
+
+    elif max_duration is None:
+        return starts, ends
+
+    elif min_duration is None:
+        sub_durations = np.minimum(durations, max_duration)
+
+    else:
+        max_durations = np.minimum(durations, max_duration)
+        sub_durations = min_duration + \
+            np.random.random(len(starts)) * (max_durations - min_duration)
+
+    starts = starts + \
+        np.random.random(len(starts)) * (durations - sub_durations)
+    return starts, starts + sub_durations
+
+
 
 class SessionWiseSpeechSegmentGenerator(object):
     """Generate batch of pure speech segments with associated speaker labels
@@ -97,15 +141,18 @@ class SessionWiseSpeechSegmentGenerator(object):
     max_duration : float, optional
         In case `duration` is None, set segment maximum duration.
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
     """
 
     def __init__(self, feature_extraction,
                  per_label=3, per_fold=None, per_epoch=7,
                  duration=None, min_duration=None, max_duration=None,
-                 label_min_duration=0., parallel=1):
+                 label_min_duration=0., parallel=1, prefetch=10, seed=None):
 
         if per_fold is None:
             msg = f'per_fold = None is not supported.'
@@ -122,36 +169,157 @@ class SessionWiseSpeechSegmentGenerator(object):
         self.max_duration = max_duration
         self.label_min_duration = label_min_duration
         self.parallel = parallel
+        self.prefetch = prefetch
+        self.seed = seed
+
+        self.min_duration_ = 0. if self.min_duration is None \
+                                else self.min_duration
 
     def initialize(self, protocol, subset='train'):
-        """Intialize one batch generator per file in the protocol"""
+        """Index speech turns of every file in the protocol
+
+        sessions_ : list
+            One {'current_file': <protocol dictionary>,
+                 'labels': <list of labels>,
+                 'starts': <(n_segments, ) array of segment start times>,
+                 'ends': <(n_segments, ) array of segment end times>,
+                 'cumsum': <(n_segments, ) cumulated segment durations>,
+                 'bounds': <(n_labels, 2) cumsum range of each label>}
+            dictionary per file, where segments are grouped by label.
+        """
 
-        self.batches_ = []
+        self.sessions_ = []
+        databases = set()
 
         for current_file in getattr(protocol, subset)():
 
-            # create a dummy protocol that contains only one file
-            dummy = get_dummy_protocol(current_file)
+            databases.add(current_file['database'])
+            annotation = current_file['annotation']
+
+            labels, starts, ends = [], [], []
+            for label in annotation.labels():
+
+                # remove segments shorter than min_duration (when provided)
+                segments = [s for s in annotation.label_timeline(label)
+                            if s.duration > self.min_duration_]
+
+                # remove labels with less than 'label_min_duration' of speech
+                # otherwise those may generate the same segments over and
+                # over again
+                duration = sum(s.duration for s in segments)
+                if not segments or duration < self.label_min_duration:
+                    continue
+
+                labels.append(label)
+                starts.append([s.start for s in segments])
+                ends.append([s.end for s in segments])
 
-            # initialize batch generator for current file
-            generator = SpeechSegmentGenerator(self.feature_extraction,
-                per_label=self.per_label, per_fold=self.per_fold,
-                duration=self.duration, min_duration=self.min_duration,
-                max_duration=self.max_duration,
-                label_min_duration=self.label_min_duration, parallel=1)
+            # skip sessions without any usable speech turn
+            if not labels:
+                continue
 
-            # keep track of it
-            self.batches_.append(generator(dummy, subset='train'))
+            n_segments = [len(start) for start in starts]
+            starts = np.hstack(starts)
+            ends = np.hstack(ends)
+            cumsum = np.cumsum(ends - starts)
+
+            last = np.cumsum(n_segments) - 1
+            upper = cumsum[last]
+            lower = np.hstack([[0.], upper[:-1]])
+
+            self.sessions_.append({'current_file': current_file,
+                                   'labels': labels,
+                                   'starts': starts,
+                                   'ends': ends,
+                                   'cumsum': cumsum,
+                                   'bounds': np.vstack([lower, upper]).T})
+
+        self.domains_ = {}
+        self.domains_['database'] = {db: i for i, db in
+                                     enumerate(sorted(databases))}
+
+    def samples(self):
+        """Generate samples, `batch_size` samples at a time per session
+
+        Samples are drawn on demand from compact per-session indexes. Each
+        consecutive group of `batch_size` samples is extracted from the same
+        session, in order for batches to be session-wise.
+        """
+
+        n_sessions = len(self.sessions_)
+
+        while True:
+
+            for s in np.random.permutation(n_sessions):
+
+                session = self.sessions_[s]
+                current_file = session['current_file']
+                labels = session['labels']
+                database = current_file['database']
+                y_database = self.domains_['database'][database]
+
+                # choose 'per_fold' labels at random
+                n_labels = len(labels)
+                chosen = np.random.choice(n_labels, size=self.per_fold,
+                                          replace=n_labels < self.per_fold)
+                chosen = np.repeat(chosen, self.per_label)
+
+                # for each label, choose 'per_label' segments at random with
+                # probability proportional to their duration
+                lower, upper = session['bounds'][chosen].T
+                t = lower + np.random.random(len(chosen)) * (upper - lower)
+                i = np.searchsorted(session['cumsum'], t, side='right')
+                i = np.minimum(i, len(session['cumsum']) - 1)
+
+                starts, ends = random_sub_segments(
+                    session['starts'][i], session['ends'][i],
+                    duration=self.duration, min_duration=self.min_duration,
+                    max_duration=self.max_duration)
+
+                for k, start, end in zip(chosen, starts, ends):
+
+                    sub_segment = Segment(start, end)
+                    if self.duration is None:
+                        X = self.feature_extraction.crop(
+                            current_file, sub_segment, mode='center')
+                    else:
+                        X = self.feature_extraction.crop(
+                            current_file, sub_segment, mode='center',
+                            fixed=self.duration)
+
+                    extra = {'label': labels[k],
+                             'database': database}
+
+                    yield {'X': X,
+                           'y': k,
+                           'y_database': y_database,
+                           'extra': extra}
+
+    def batches(self):
+        """Batch generator
+
+        Returns
+        -------
+        batches : generator
+            Generator that yields session-wise batches indefinitely.
+        """
+        return batchify(self.samples(), self.signature,
+                        batch_size=self.batch_size, prefetch=0)
 
     def __call__(self, protocol, subset='train'):
 
-        # initialize one batch generator per file in the protocol
+        # index all sessions once and for all
         self.initialize(protocol, subset=subset)
 
-        # generate one batch per file
-        while True:
-            for batches in self.batches_:
-                yield next(batches)
+        if not self.parallel:
+            if self.seed is not None:
+                np.random.seed(self.seed)
+            yield from self.batches()
+            return
+
+        # workers share the sessions index built by `initialize`
+        yield from BatchLoader(self.batches, n_workers=self.parallel,
+                               prefetch=self.prefetch, seed=self.seed)
 
     @property
     def batch_size(self):
@@ -334,6 +502,20 @@ class SpeechSegmentGenerator(object):
         In case `duration` is None, set segment minimum duration.
     max_duration : float, optional
         In case `duration` is None, set segment maximum duration.
+    n_buckets : int, optional
+        In case `duration` is None, split [`min_duration`, `max_duration`]
+        range into `n_buckets` duration buckets and draw one bucket per batch:
+        all segments in a batch then share the same duration (the center of
+        the bucket) and only speakers with long enough segments are selected.
+        Defaults to drawing one duration per segment.
+    curriculum : float, optional
+        Only use the shortest bucket at first, then gradually add longer ones
+        so that all buckets are used after `curriculum` epochs. Requires
+        `n_buckets`. Defaults to using all buckets from the start.
+        Progress is measured in batches actually consumed (background
+        generators then only prefetch a couple of batches) and each epoch
+        contains as many batches as needed to reach `per_epoch` using the
+        buckets available during this epoch.
     parallel : int, optional
         Number of prefetching background generators. Defaults to 1.
         Each generator will prefetch enough batches to cover a whole epoch.
@@ -343,7 +525,8 @@ class SpeechSegmentGenerator(object):
     def __init__(self, feature_extraction,
                  per_label=3, per_fold=None, per_epoch=7,
                  duration=None, min_duration=None, max_duration=None,
-                 label_min_duration=0., parallel=1):
+                 label_min_duration=0., n_buckets=None, curriculum=None,
+                 parallel=1):
 
         super(SpeechSegmentGenerator, self).__init__()
 
@@ -365,6 +548,25 @@ class SpeechSegmentGenerator(object):
         self.min_duration_ = 0. if self.min_duration is None \
                                 else self.min_duration
 
+        if n_buckets is not None and (self.duration is not None or
+                                      self.min_duration is None or
+                                      self.max_duration is None):
+            msg = ('"n_buckets" requires variable duration segments (i.e. '
+                   'both "min_duration" and "max_duration").')
+            raise ValueError(msg)
+        self.n_buckets = n_buckets
+
+        if curriculum is not None and n_buckets is None:
+            msg = '"curriculum" requires "n_buckets".'
+            raise ValueError(msg)
+        self.curriculum = curriculum
+
+        # duration of segments in each bucket (i.e. center of each bucket)
+        if self.n_buckets is not None:
+            edges = np.linspace(self.min_duration, self.max_duration,
+                                num=self.n_buckets + 1)
+            self.durations_ = .5 * (edges[:-1] + edges[1:])
+
         self.weighted_ = True
 
     def initialize(self, protocol, subset='train'):
@@ -422,96 +624,177 @@ class SpeechSegmentGenerator(object):
         self.domains_ = {}
         self.domains_['database'] = {db: i for i, db in enumerate(databases)}
 
-    def generator(self):
+        self.files_ = list({id(current_file): current_file
+                            for data in self.data_.values()
+                            for _, _, current_file in data}.values())
+
+        self.table_ = self.build_table_()
+
+        if self.n_buckets is not None:
+            self.buckets_ = [self.build_table_(min_duration=duration)
+                             for duration in self.durations_]
+            self.nonempty_ = np.array([b for b, table in enumerate(self.buckets_)
+                                       if table is not None], dtype=int)
+            if not len(self.nonempty_):
+                msg = (f'No segment is long enough for any of the '
+                       f'{self.n_buckets} duration buckets.')
+                raise ValueError(msg)
+
+        # (fractional) epoch of the last batch consumed (see `__call__`)
+        self.epoch_ = 0.
+
+    def build_table_(self, min_duration=0.):
+        """Gather all (label, file, segment) triplets in one table
+
+        Parameters
+        ----------
+        min_duration : float, optional
+            Only keep segments longer than `min_duration`.
+
+        Returns
+        -------
+        table : dict
+            Triplets sorted by label, where each triplet is weighted by its
+            probability of being chosen when generating a segment for this
+            label. 'bounds' provides the cumulated weight range of each label
+            (empty for labels without any segment) and 'labels' the index of
+            labels with at least one segment. None if no segment is left.
+        """
+
+        file_index = {id(current_file): f
+                      for f, current_file in enumerate(self.files_)}
+
+        files, starts, ends, weights, lengths = [], [], [], [], []
+        for label, data in self.data_.items():
+            lengths.append(0)
+            for segments, _, current_file in data:
+
+                segments = [s for s in segments if s.duration >= min_duration]
+                if not segments:
+                    continue
+
+                files.append(np.full(len(segments),
+                                     file_index[id(current_file)]))
+                starts.append([s.start for s in segments])
+                ends.append([s.end for s in segments])
+
+                # choose file with probability proportional to the total
+                # duration of label in this file, then choose segment with
+                # probability proportional to its duration (or uniformly)
+                durations = np.array(ends[-1]) - np.array(starts[-1])
+                if self.weighted_:
+                    weights.append(durations)
+                else:
+                    weights.append(np.full(len(segments),
+                                           np.mean(durations)))
+                lengths[-1] += len(segments)
+
+        if not files:
+            return None
+
+        cumsum = np.cumsum(np.hstack(weights))
+        upper = np.hstack([[0.], cumsum])[np.cumsum(lengths)]
+        lower = np.hstack([[0.], upper[:-1]])
+        return {'file': np.hstack(files),
+                'start': np.hstack(starts),
+                'end': np.hstack(ends),
+                'cumsum': cumsum,
+                'bounds': np.vstack([lower, upper]).T,
+                'labels': np.where(upper > lower)[0]}
+
+    def iter_samples_(self, chosen, table, duration=None):
+        """Generate one segment for each chosen label
+
+        Parameters
+        ----------
+        chosen : (n_samples, ) np.array
+            Index of chosen labels.
+        table : dict
+            Table of (label, file, segment) triplets (see `build_table_`).
+        duration : float, optional
+            Fixed segment duration. Defaults to self.duration.
+        """
 
         labels = list(self.data_)
 
-        while True:
+        if duration is None:
+            duration = self.duration
 
-            # shuffle labels
-            np.random.shuffle(labels)
+        # choose one (file, segment) pair at random for each label, all in
+        # one go
+        lower, upper = table['bounds'][chosen].T
+        t = lower + np.random.random(len(chosen)) * (upper - lower)
+        i = np.searchsorted(table['cumsum'], t, side='right')
+        i = np.minimum(i, len(table['cumsum']) - 1)
 
-            # loop on each label
-            for label in labels:
+        starts, ends = random_sub_segments(
+            table['start'][i], table['end'][i], duration=duration,
+            min_duration=self.min_duration,
+            max_duration=self.max_duration)
 
-                # load data for this label
-                # segment_generators, durations, files, features = \
-                #     zip(*self.data_[label])
-                segments, durations, files = zip(*self.data_[label])
+        for k, f, start, end in zip(chosen, table['file'][i], starts, ends):
 
-                # choose 'per_label' files at random with probability
-                # proportional to the total duration of 'label' in those files
-                probabilities = durations / np.sum(durations)
-                chosen = np.random.choice(len(files), size=self.per_label,
-                                          p=probabilities)
+            current_file = self.files_[f]
+            sub_segment = Segment(start, end)
 
-                # loop on (randomly) chosen files
-                for i in chosen:
+            if duration is None:
+                X = self.feature_extraction.crop(
+                    current_file, sub_segment, mode='center')
+            else:
+                X = self.feature_extraction.crop(
+                    current_file, sub_segment, mode='center',
+                    fixed=duration)
 
-                    # choose one segment at random with
-                    # probability proportional to duration
-                    # segment = next(segment_generators[i])
-                    segment = next(
-                        random_segment(segments[i], weighted=self.weighted_))
+            label = labels[k]
+            database = current_file['database']
+            extra = {'label': label,
+                     'database': database}
 
-                    if self.duration is None:
+            yield {'X': X,
+                   'y': self.labels_[label],
+                   'y_database': self.domains_['database'][database],
+                   'extra': extra}
 
-                        if self.min_duration is None:
-
-                            # case: no duration | no min | no max
-                            # keep segment as it is
-                            if self.max_duration is None:
-                                sub_segment = segment
-
-                            # case: no duration | no min | max
-                            else:
-
-                                # if segment is too long, choose sub-segment
-                                # at random at exactly max_duration
-                                if segment.duration > self.max_duration:
-                                    sub_segment = next(random_subsegment(
-                                        segment, self.max_duration))
-
-                                # otherwise, keep segment as it is
-                                else:
-                                    sub_segment = segment
-
-                        else:
-                            # case: no duration | min | no max
-                            # keep segment as it is (too short segments have
-                            # already been filtered out)
-                            if self.max_duration is None:
-                                sub_segment = segment
-
-                            # case: no duration | min | max
-                            else:
-                                # choose sub-segment at random between
-                                # min_duration and max_duration
-                                sub_segment = next(random_subsegment(
-                                    segment, self.max_duration,
-                                    min_duration=self.min_duration))
+    def generator(self):
 
-                        X = self.feature_extraction.crop(
-                            files[i], sub_segment, mode='center')
+        if self.n_buckets is not None:
+            yield from self.bucket_generator()
+            return
 
-                    else:
+        while True:
 
-                        # choose sub-segment at random at exactly duration
-                        sub_segment = next(random_subsegment(
-                            segment, self.duration))
+            # shuffle labels and choose 'per_label' (file, segment) pairs at
+            # random for each of them
+            chosen = np.repeat(np.random.permutation(len(self.data_)),
+                               self.per_label)
+            yield from self.iter_samples_(chosen, self.table_)
 
-                        X = self.feature_extraction.crop(
-                            files[i], sub_segment, mode='center',
-                            fixed=self.duration)
+    def bucket_generator(self):
+        """Generate batches of same duration segments
 
-                    database = files[i]['database']
-                    extra = {'label': label,
-                             'database': database}
+        Each batch is terminated by an `EndOfBatch` instance.
+        """
 
-                    yield {'X': X,
-                           'y': self.labels_[label],
-                           'y_database': self.domains_['database'][database],
-                           'extra': extra}
+        endOfBatch = EndOfBatch()
+
+        while True:
+
+            # buckets available at current (consumed) epoch
+            bucket = np.random.choice(self.available_buckets_(self.epoch_))
+            table = self.buckets_[bucket]
+
+            # choose 'per_fold' labels among those with long enough segments
+            # (or all of them), and 'per_label' segments for each of them
+            eligible = table['labels']
+            n_labels = len(eligible) if self.per_fold is None \
+                                     else self.per_fold
+            chosen = np.random.choice(eligible, size=n_labels,
+                                      replace=len(eligible) < n_labels)
+            chosen = np.repeat(chosen, self.per_label)
+
+            yield from self.iter_samples_(chosen, table,
+                                          duration=self.durations_[bucket])
+            yield endOfBatch
 
     @property
     def batch_size(self):
@@ -519,9 +802,46 @@ class SpeechSegmentGenerator(object):
             return self.per_label * self.per_fold
         return self.per_label * len(self.data_)
 
+    def available_buckets_(self, epoch):
+        """Buckets available at (fractional) `epoch` (see `curriculum`)"""
+
+        available = self.n_buckets
+        if self.curriculum:
+            available = 1 + int((self.n_buckets - 1) *
+                                min(1., epoch / self.curriculum))
+        buckets = self.nonempty_[self.nonempty_ < available]
+        if not len(buckets):
+            buckets = self.nonempty_[:1]
+        return buckets
+
+    def batches_in_epoch_(self, epoch):
+        """Number of bucketed batches in `epoch`
+
+        Batches of short buckets contain less speech: epochs during which
+        only short buckets are available (see `curriculum`) therefore
+        contain more batches.
+        """
+
+        # duration per epoch
+        duration_per_epoch = self.per_epoch * 24 * 60 * 60
+
+        # (average) duration per batch, knowing that batches may only contain
+        # a subset of speakers
+        per_batch = []
+        for b in self.available_buckets_(epoch):
+            n_labels = len(self.buckets_[b]['labels']) \
+                if self.per_fold is None else self.per_fold
+            per_batch.append(self.durations_[b] * self.per_label * n_labels)
+        duration_per_batch = np.mean(per_batch)
+        return int(np.ceil(duration_per_epoch / duration_per_batch))
+
     @property
     def batches_per_epoch(self):
 
+        # once all buckets are used (i.e. after `curriculum` epochs)
+        if self.n_buckets is not None:
+            return self.batches_in_epoch_(np.inf)
+
         # duration per epoch
         duration_per_epoch = self.per_epoch * 24 * 60 * 60
 
@@ -561,8 +881,13 @@ class SpeechSegmentGenerator(object):
 
         self.initialize(protocol, subset=subset)
 
-        batch_size = self.batch_size
-        batches_per_epoch = self.batches_per_epoch
+        # bucketed batches are delimited by `EndOfBatch`
+        batch_size = -1 if self.n_buckets is not None else self.batch_size
+
+        # background generators choose buckets based on the epoch of the
+        # last batch consumed (see `curriculum`): they must not prefetch
+        # much when it matters.
+        prefetch = 2 if self.curriculum else self.batches_per_epoch
 
         generators = []
         if self.parallel:
@@ -571,7 +896,7 @@ class SpeechSegmentGenerator(object):
                 generator = self.generator()
                 batches = batchify(generator, self.signature,
                                    batch_size=batch_size,
-                                   prefetch=batches_per_epoch)
+                                   prefetch=prefetch)
                 generators.append(batches)
         else:
             generator = self.generator()
@@ -579,11 +904,14 @@ class SpeechSegmentGenerator(object):
                                batch_size=batch_size, prefetch=0)
             generators.append(batches)
 
-        while True:
-            # get `batches_per_epoch` batches from each generator
-            for batches in generators:
-                for _ in range(batches_per_epoch):
-                    yield next(batches)
+        for epoch in itertools.count():
+            # get one epoch worth of batches from each generator in turn
+            batches = generators[epoch % len(generators)]
+            n_batches = self.batches_per_epoch if self.n_buckets is None \
+                        else self.batches_in_epoch_(epoch)
+            for b in range(n_batches):
+                self.epoch_ = epoch + b / n_batches
+                yield next(batches)
 
 
 class SpeechTurnSubSegmentGenerator(SpeechSegmentGenerator):
@@ -201,6 +201,13 @@ class FeatureExtraction(object):
         y = self.raw_audio_.crop(current_file, xsegment, mode='center',
                                  fixed=xsegment.duration)
 
+        return self._crop_features(y, xsegment, segment, mode=mode,
+                                   fixed=fixed)
+
+    def _crop_features(self, y, xsegment, segment, mode='center', fixed=None):
+        """Extract features from `xsegment` waveform and crop them to `segment`
+        """
+
         features = self.get_features(y, self.sample_rate)
 
         # get rid of additional context before returning
@@ -211,3 +218,53 @@ class FeatureExtraction(object):
         (start, end), = shifted_frames.crop(segment, mode=mode, fixed=fixed,
                                             return_ranges=True)
         return features[start:end]
+
+    def crop_batch(self, current_files, segments, mode='center', fixed=None):
+        """Batched version of self.crop(current_file, segment, **kwargs)
+
+        Waveforms are augmented as a whole batch (see `Augmentation.batch`)
+        before features are extracted.
+
+        Parameters
+        ----------
+        current_files : list of dict
+            `pyannote.database` files. Must contain a 'duration' key that
+            provides the duration (in seconds) of the audio file.
+        segments : list of `pyannote.core.Segment`
+            Segments from which to extract features.
+
+        Returns
+        -------
+        features : list of (n_frames, dimension) numpy array
+            Extracted features
+        """
+
+        context = self.get_context_duration()
+        batch = np.array([
+            fixed is not None and segment.start - context >= 0 and
+            segment.end + context <= current_file['duration']
+            for current_file, segment in zip(current_files, segments)],
+            dtype=bool)
+
+        features = [None] * len(segments)
+
+        # segments extended on both sides with requested context share the
+        # same duration (hence can be batched), unless file boundaries are
+        # reached.
+        if np.any(batch):
+            indices = np.where(batch)[0]
+            xsegments = [Segment(segments[i].start - context,
+                                 segments[i].end + context) for i in indices]
+            waveforms = self.raw_audio_._crop_batch(
+                [current_files[i] for i in indices], xsegments,
+                fixed + 2 * context)
+            for i, xsegment, y in zip(indices, xsegments, waveforms):
+                features[i] = self._crop_features(
+                    y[:, np.newaxis], xsegment, segments[i], mode=mode,
+                    fixed=fixed)
+
+        for i in np.where(~batch)[0]:
+            features[i] = self.crop(current_files[i], segments[i], mode=mode,
+                                    fixed=fixed)
+
+        return features
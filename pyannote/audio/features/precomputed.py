@@ -215,6 +215,24 @@ class Precomputed(object):
         del memmap
         return result
 
+    def crop_batch(self, current_files, segments, mode='center', fixed=None):
+        """Batched version of self.crop(current_file, segment, **kwargs)
+
+        Parameters
+        ----------
+        current_files : list of dict
+            `pyannote.database` files.
+        segments : list of `pyannote.core.Segment`
+            Segments from which to extract features.
+
+        Returns
+        -------
+        features : list of (n_frames, dimension) numpy array
+            Extracted features
+        """
+        return [self.crop(current_file, segment, mode=mode, fixed=fixed)
+                for current_file, segment in zip(current_files, segments)]
+
     def shape(self, item):
         """Faster version of precomputed(item).data.shape"""
         memmap = open_memmap(self.get_path(item), mode='r')
@@ -240,7 +240,8 @@ class RawAudio(object):
     def get_context_duration(self):
         return 0.
 
-    def crop(self, current_file, segment, mode='center', fixed=None):
+    def crop(self, current_file, segment, mode='center', fixed=None,
+             augment=True):
         """Fast version of self(current_file).crop(segment, **kwargs)
 
         Parameters
@@ -249,6 +250,8 @@ class RawAudio(object):
             `pyannote.database` file.
         segment : `pyannote.core.Segment`
             Segment from which to extract features.
+        augment : bool, optional
+            Set to False to skip data augmentation. Defaults to True.
 
         Returns
         -------
@@ -321,7 +324,68 @@ class RawAudio(object):
                    f"between {segment.start:.3f}s and {segment.end:.3f}s.")
             raise ValueError(msg)
 
-        if self.augmentation is not None:
+        if self.augmentation is not None and augment:
             data = self.augmentation(data, sample_rate)
 
         return data
+
+    def crop_batch(self, current_files, segments, mode='center', fixed=None):
+        """Batched version of self.crop(current_file, segment, **kwargs)
+
+        When `fixed` is provided, augmentation is applied to the whole batch
+        at once.
+
+        Parameters
+        ----------
+        current_files : list of dict
+            `pyannote.database` files.
+        segments : list of `pyannote.core.Segment`
+            Segments from which to extract waveforms.
+
+        Returns
+        -------
+        waveforms : list of (n_samples, 1) numpy array
+            Waveforms
+        """
+
+        if fixed is None:
+            return [self.crop(current_file, segment, mode=mode)
+                    for current_file, segment in zip(current_files, segments)]
+
+        waveforms = self._crop_batch(current_files, segments, fixed,
+                                     mode=mode)
+        return list(waveforms[:, :, np.newaxis])
+
+    def _crop_batch(self, current_files, segments, fixed, mode='center'):
+        """Extract (and augment) a batch of fixed duration waveforms
+
+        Parameters
+        ----------
+        current_files : list of dict
+            `pyannote.database` files.
+        segments : list of `pyannote.core.Segment`
+            Segments from which to extract waveforms.
+        fixed : float
+            Fixed duration of extracted waveforms.
+
+        Returns
+        -------
+        waveforms : (batch_size, n_samples) numpy array
+            Waveforms
+        """
+
+        waveforms = np.vstack([
+            self.crop(current_file, segment, mode=mode, fixed=fixed,
+                      augment=False)[:, 0]
+            for current_file, segment in zip(current_files, segments)])
+
+        if self.augmentation is not None:
+            waveforms = self.augmentation.batch(waveforms, self.sample_rate)
+
+            try:
+                valid_audio(waveforms.ravel(), mono=True)
+            except ParameterError as e:
+                msg = "Something went wrong when augmenting waveforms."
+                raise ValueError(msg) from e
+
+        return waveforms
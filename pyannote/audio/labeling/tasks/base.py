@@ -26,6 +26,9 @@
 # AUTHORS
 # Hervé BREDIN - http://herve.niderb.fr
 
+import os
+import json
+import hashlib
 import warnings
 import torch
 import numpy as np
@@ -35,16 +38,16 @@ from pyannote.database import get_annotated
 from pyannote.core.utils.numpy import one_hot_encoding
 from pyannote.audio.features import Precomputed
 from pyannote.audio.features.utils import get_audio_duration
+from pathlib import Path
 from pyannote.core import Segment
 from pyannote.core import Timeline
+from pyannote.core import SlidingWindow
 from pyannote.core import SlidingWindowFeature
 
 from pyannote.generators.batch import batchify
-from pyannote.generators.fragment import random_segment
-from pyannote.generators.fragment import random_subsegment
-from pyannote.generators.fragment import SlidingSegments
 
 from pyannote.audio.train.trainer import Trainer
+from pyannote.audio.train.loader import BatchLoader
 
 from .. import TASK_CLASSIFICATION
 from .. import TASK_MULTI_LABEL_CLASSIFICATION
@@ -68,18 +71,30 @@ class LabelingTaskGenerator(object):
         Total audio duration per epoch, in days.
         Defaults to one day (1).
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
     exhaustive : bool, optional
         Ensure training files are covered exhaustively (useful in case of
         non-uniform label distribution).
     shuffle : bool, optional
         Shuffle exhaustive samples. Defaults to False.
+    shuffle_buffer : int, optional
+        When provided, mix exhaustive samples across files using a shuffle
+        buffer of that many samples. Defaults to not mix files.
     """
 
     def __init__(self, feature_extraction, duration=3.2, batch_size=32,
-                 per_epoch=1, parallel=1, exhaustive=False, shuffle=False):
+                 per_epoch=1, parallel=1, prefetch=10, seed=None,
+                 index_dir=None, exhaustive=False, shuffle=False,
+                 shuffle_buffer=0):
 
         super(LabelingTaskGenerator, self).__init__()
 
@@ -88,8 +103,12 @@ class LabelingTaskGenerator(object):
         self.batch_size = batch_size
         self.per_epoch = per_epoch
         self.parallel = parallel
+        self.prefetch = prefetch
+        self.seed = seed
+        self.index_dir = index_dir
         self.exhaustive = exhaustive
         self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
 
     def initialize(self, protocol, subset='train'):
         """Gather the following information about the training subset:
@@ -97,6 +116,8 @@ class LabelingTaskGenerator(object):
         data_ : dict
 
             {'segments': <list of annotated segments>,
+             'starts': <annotated segments start times, as numpy array>,
+             'ends': <annotated segments end times, as numpy array>,
              'duration': <total duration of annotated segments>,
              'current_file': <protocol dictionary>,
              'y': <labels as numpy array>}
@@ -106,67 +127,266 @@ class LabelingTaskGenerator(object):
 
         labels_ : list
             Sorted list of (unique) lables in protocol.
+
+        When `index_dir` is provided, the (costly to compute) list of
+        annotated segments and frame-level labels of every file are stored
+        there once and for all, and simply loaded by subsequent calls.
         """
 
+        if isinstance(self.feature_extraction, Precomputed) and \
+           not self.feature_extraction.use_memmap:
+            msg = ('Loading all precomputed features in memory. '
+                   'Set "use_memmap" to True if you run out of memory.')
+            warnings.warn(msg)
+
+        files = {get_unique_identifier(current_file): current_file
+                 for current_file in getattr(protocol, subset)()}
+
+        index = None
+        if self.index_dir is not None:
+            digest = self._index_digest(files)
+            path = self._index_path(protocol, subset, digest)
+            index = self._load_index(path, list(files), digest)
+
+        if index is None:
+            index = self._build_index(files)
+            if self.index_dir is not None:
+                index['digest'] = np.array(digest)
+                self._save_index(path, index)
+
+        self.databases_ = [str(database) for database in index['databases']]
+        self.labels_ = [str(label) for label in index['labels']]
+
+        sliding_window = self.feature_extraction.sliding_window
+        offsets = index['offsets']
+        bounds = np.searchsorted(index['segment_file'],
+                                 np.arange(len(files) + 1))
+
         self.data_ = {}
-        labels, databases = set(), set()
+        for f, (uri, current_file) in enumerate(files.items()):
+
+            starts = index['segment_start'][bounds[f]:bounds[f + 1]]
+            ends = index['segment_end'][bounds[f]:bounds[f + 1]]
+            current_file['annotated'] = Timeline(
+                segments=[Segment(start, end)
+                          for start, end in zip(starts, ends)],
+                uri=current_file['uri'])
+
+            # crop annotation to actual file duration, as `_build_index` does
+            # (needed when index is loaded from disk rather than built)
+            support = Segment(start=0, end=index['durations'][f])
+            current_file['annotation'] = current_file['annotation'].crop(
+                support, mode='intersection')
+
+            # remove segments shorter than sub-sequences
+            long_enough = ends - starts > self.duration
+
+            # corner case where no segment is long enough
+            # and we removed them all...
+            if not np.any(long_enough):
+                continue
+            starts, ends = starts[long_enough], ends[long_enough]
+
+            # uint8 to int8 view of the original one-hot encoding (no copy)
+            Y = index['y'][offsets[f]:offsets[f + 1]].view(np.int8)
+            y = SlidingWindowFeature(
+                self.postprocess_y(Y),
+                SlidingWindow(start=index['y_start'][f],
+                              duration=sliding_window.duration,
+                              step=sliding_window.step))
+
+            # store all these in data_ dictionary
+            self.data_[uri] = {
+                'segments': [Segment(start, end)
+                             for start, end in zip(starts, ends)],
+                'starts': starts,
+                'ends': ends,
+                'duration': np.sum(ends - starts),
+                'current_file': current_file,
+                'y': y}
+
+    def _index_path(self, protocol, subset, digest):
+        """Path to protocol index (without extension)
+
+        Parameters
+        ----------
+        protocol : `pyannote.database.Protocol`
+        subset : str
+        digest : str
+            Digest of protocol files (see `_index_digest`). Protocols (or
+            subsets) with different files, labels, or annotations therefore
+            get their own index.
+        """
 
-        # loop once on all files
-        for current_file in getattr(protocol, subset)():
+        sliding_window = self.feature_extraction.sliding_window
+        key = {'protocol': f'{type(protocol).__module__}.'
+                           f'{type(protocol).__qualname__}',
+               'subset': subset,
+               'sliding_window': [sliding_window.start,
+                                  sliding_window.duration,
+                                  sliding_window.step],
+               'digest': digest}
+        key = hashlib.sha1(
+            json.dumps(key, sort_keys=True).encode('utf8')).hexdigest()
+        return Path(self.index_dir) / f'{subset}.{key}'
+
+    @staticmethod
+    def _index_digest(files):
+        """Digest of labels, annotations, and annotated regions of files
+
+        Used to detect that protocol files changed since index was built.
+
+        Parameters
+        ----------
+        files : dict
+            Protocol files, indexed by their unique identifier.
+
+        Returns
+        -------
+        digest : str
+            SHA1 hex digest.
+        """
+
+        labels, content = set(), []
+        for uri, current_file in files.items():
+            annotation = current_file['annotation']
+            labels.update(annotation.labels())
+            annotated = current_file.get('annotated', None)
+            content.append({
+                'uri': uri,
+                'annotation': [[segment.start, segment.end, str(label)]
+                               for segment, _, label
+                               in annotation.itertracks(yield_label=True)],
+                'annotated': None if annotated is None else \
+                             [[segment.start, segment.end]
+                              for segment in annotated]})
+
+        key = {'labels': sorted(str(label) for label in labels),
+               'files': content}
+        return hashlib.sha1(
+            json.dumps(key, sort_keys=True).encode('utf8')).hexdigest()
+
+    def _build_index(self, files):
+        """Compute annotated segments and frame-level labels of every file
+
+        Parameters
+        ----------
+        files : dict
+            Protocol files, indexed by their unique identifier.
+
+        Returns
+        -------
+        index : dict
+            {'uris': <files unique identifiers>,
+             'labels': <sorted labels>,
+             'databases': <sorted databases>,
+             'durations': <(n_files, ) actual duration of files>,
+             'segment_file': <(n_segments, ) file index of segments>,
+             'segment_start': <(n_segments, ) start time of segments>,
+             'segment_end': <(n_segments, ) end time of segments>,
+             'y_start': <(n_files, ) start time of labels sliding window>,
+             'offsets': <(n_files + 1, ) labels offsets in 'y'>,
+             'y': <(n_frames, n_labels) concatenated uint8 labels>}
+        """
+
+        labels, databases, durations = set(), set(), []
+
+        for current_file in files.values():
 
             # ensure annotation/annotated are cropped to actual file duration
-            support = Segment(start=0, end=get_audio_duration(current_file))
+            durations.append(get_audio_duration(current_file))
+            support = Segment(start=0, end=durations[-1])
             current_file['annotated'] = get_annotated(current_file).crop(
                 support, mode='intersection')
             current_file['annotation'] = current_file['annotation'].crop(
                 support, mode='intersection')
 
             # keep track of database
-            database = current_file['database']
-            databases.add(database)
+            databases.add(current_file['database'])
 
             # keep track of unique labels
             labels.update(current_file['annotation'].labels())
 
-            if isinstance(self.feature_extraction, Precomputed) and \
-               not self.feature_extraction.use_memmap:
-                msg = ('Loading all precomputed features in memory. '
-                       'Set "use_memmap" to True if you run out of memory.')
-                warnings.warn(msg)
+        labels = sorted(labels)
 
-            segments = [s for s in current_file['annotated']
-                          if s.duration > self.duration]
+        segment_file, segment_start, segment_end = [], [], []
+        y_start, offsets, Y = [], [0], []
 
-            # corner case where no segment is long enough
-            # and we removed them all...
-            if not segments:
-                continue
+        for f, current_file in enumerate(files.values()):
 
-            # total duration of label in current_file (after removal of
-            # short segments).
-            duration = sum(s.duration for s in segments)
+            annotated = get_annotated(current_file)
+            segment_file.extend(f for _ in annotated)
+            segment_start.extend(s.start for s in annotated)
+            segment_end.extend(s.end for s in annotated)
 
-            # store all these in data_ dictionary
-            datum = {'segments': segments,
-                     'duration': duration,
-                     'current_file': current_file}
-            uri = get_unique_identifier(current_file)
-            self.data_[uri] = datum
+            y, _ = one_hot_encoding(current_file['annotation'],
+                                    annotated,
+                                    self.feature_extraction.sliding_window,
+                                    labels=labels, mode='center')
+
+            # -1 (unknown), 0 (inactive), and 1 (active) fit into one byte
+            Y.append(np.int8(y.data).view(np.uint8))
+            y_start.append(y.sliding_window.start)
+            offsets.append(offsets[-1] + len(y.data))
+
+        return {'uris': np.array(list(files), dtype=str),
+                'labels': np.array(labels, dtype=str),
+                'databases': np.array(sorted(databases), dtype=str),
+                'durations': np.array(durations, dtype=np.float64),
+                'segment_file': np.array(segment_file, dtype=np.int64),
+                'segment_start': np.array(segment_start, dtype=np.float64),
+                'segment_end': np.array(segment_end, dtype=np.float64),
+                'y_start': np.array(y_start, dtype=np.float64),
+                'offsets': np.array(offsets, dtype=np.int64),
+                'y': np.vstack(Y) if Y else \
+                     np.zeros((0, len(labels)), dtype=np.uint8)}
+
+    @staticmethod
+    def _save_index(path, index):
+        """Save index to disk"""
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # write to temporary files first so that concurrent trainings never
+        # load a partially written index
+        suffix = f'.{os.getpid()}.tmp'
+        with open(f'{path}.y.npy{suffix}', 'wb') as fp:
+            np.save(fp, index['y'])
+        with open(f'{path}.npz{suffix}', 'wb') as fp:
+            np.savez(fp, **{key: value for key, value in index.items()
+                            if key != 'y'})
+        os.replace(f'{path}.y.npy{suffix}', f'{path}.y.npy')
+        os.replace(f'{path}.npz{suffix}', f'{path}.npz')
+
+    @staticmethod
+    def _load_index(path, uris, digest):
+        """Load index from disk
+
+        Returns None if index does not exist or does not match protocol files
+        (see `_index_digest`)
+        """
 
-        self.databases_ = sorted(databases)
-        self.labels_ = sorted(labels)
+        try:
+            with np.load(f'{path}.npz') as npz:
+                index = dict(npz)
+            index['y'] = np.load(f'{path}.y.npy', mmap_mode='r')
+        except FileNotFoundError:
+            return None
 
-        for current_file in getattr(protocol, subset)():
+        # protocol files changed since index was built
+        if list(index['uris']) != uris:
+            return None
 
-            y, _ = one_hot_encoding(current_file['annotation'],
-                                    get_annotated(current_file),
-                                    self.feature_extraction.sliding_window,
-                                    labels=self.labels_, mode='center')
+        # protocol labels, annotations, or annotated regions changed since
+        # index was built (or index was built by a previous version)
+        if str(index.get('digest', '')) != digest:
+            return None
 
-            uri = get_unique_identifier(current_file)
+        # index was built by a previous version (without file durations)
+        if 'durations' not in index:
+            return None
 
-            self.data_[uri]['y'] = SlidingWindowFeature(
-                self.postprocess_y(y.data), y.sliding_window)
+        return index
 
     def postprocess_y(self, Y):
         """This function does nothing but return its input.
@@ -188,43 +408,74 @@ class LabelingTaskGenerator(object):
             Generator that yields {'X': ..., 'y': ...} samples indefinitely.
         """
 
+        # gather all (file, segment) pairs in one table
         uris = list(self.data_)
-        durations = np.array([self.data_[uri]['duration'] for uri in uris])
-        probabilities = durations / np.sum(durations)
-
-        while True:
-
-            # choose file at random with probability
-            # proportional to its (annotated) duration
-            uri = uris[np.random.choice(len(uris), p=probabilities)]
-
-            datum = self.data_[uri]
-            current_file = datum['current_file']
+        files = np.hstack([np.full(len(self.data_[uri]['starts']), f)
+                           for f, uri in enumerate(uris)])
+        starts = np.hstack([self.data_[uri]['starts'] for uri in uris])
+        ends = np.hstack([self.data_[uri]['ends'] for uri in uris])
+        cumsum = np.cumsum(ends - starts)
 
-            # choose one segment at random with probability
-            # proportional to its duration
-            segment = next(random_segment(datum['segments'], weighted=True))
+        n_samples = self.feature_extraction.sliding_window.samples(
+            self.duration, mode='center')
 
-            # choose fixed-duration subsegment at random
-            sequence = next(random_subsegment(segment, self.duration))
-
-            X = self.feature_extraction.crop(current_file,
-                                      sequence, mode='center',
-                                      fixed=self.duration)
-
-            y = datum['y'].crop(sequence, mode='center', fixed=self.duration)
+        while True:
 
-            yield {'X': X, 'y': np.squeeze(y)}
+            # choose (file, segment) pairs for a whole batch at once, with
+            # probability proportional to segment duration. this is the same
+            # as choosing file at random with probability proportional to its
+            # (annotated) duration, and then segment at random with
+            # probability proportional to its duration.
+            t = np.random.random(self.batch_size) * cumsum[-1]
+            i = np.searchsorted(cumsum, t, side='right')
+            i = np.minimum(i, len(cumsum) - 1)
+
+            # choose fixed-duration subsegments at random
+            t = starts[i] + \
+                np.random.random(self.batch_size) * \
+                (ends[i] - starts[i] - self.duration)
+
+            # group feature extraction by file
+            order = np.argsort(files[i], kind='mergesort')
+            files_, t = files[i][order], t[order]
+
+            # extract features for the whole batch at once (this is where
+            # batched data augmentation happens)
+            sequences = [Segment(t_, t_ + self.duration) for t_ in t]
+            X = self.feature_extraction.crop_batch(
+                [self.data_[uris[f]]['current_file'] for f in files_],
+                sequences, mode='center', fixed=self.duration)
+
+            for f, t, sequence, X in zip(files_, t, sequences, X):
+
+                datum = self.data_[uris[f]]
+
+                # equivalent to datum['y'].crop(sequence, mode='center',
+                # fixed=self.duration) except for (rare) out of bounds
+                # sequences
+                y = datum['y']
+                j = y.sliding_window.closest_frame(t)
+                if j >= 0 and j + n_samples <= len(y.data):
+                    y = y.data[j:j + n_samples]
+                else:
+                    y = y.crop(sequence, mode='center', fixed=self.duration)
+
+                yield {'X': X, 'y': np.squeeze(y)}
 
     def sliding_samples(self):
+        """Exhaustive samples
+
+        Returns
+        -------
+        samples : generator
+            Generator that yields {'X': ..., 'y': ...} samples indefinitely,
+            going through all files (in random order) exhaustively.
+        """
 
         uris = list(self.data_)
-        durations = np.array([self.data_[uri]['duration'] for uri in uris])
-        probabilities = durations / np.sum(durations)
 
-        sliding_segments = SlidingSegments(duration=self.duration,
-                                           step=self.duration,
-                                           source='annotated')
+        # bounded shuffle buffer mixing samples across files
+        buffer = []
 
         while True:
 
@@ -233,43 +484,71 @@ class LabelingTaskGenerator(object):
             # loop on all files
             for uri in uris:
 
-                datum = self.data_[uri]
-
-                # make a copy of current file
-                current_file = dict(datum['current_file'])
-
-                # compute features for the whole file
-                features = self.feature_extraction(current_file)
+                for sample in self._sliding_samples(self.data_[uri]):
 
-                # randomly shift 'annotated' segments start time so that
-                # we avoid generating exactly the same subsequence twice
-                annotated = Timeline(
-                    [Segment(s.start + np.random.random() * self.duration,
-                             s.end) for s in get_annotated(current_file)])
-                current_file['annotated'] = annotated
+                    if len(buffer) < self.shuffle_buffer:
+                        buffer.append(sample)
+                        continue
 
-                if self.shuffle:
-                    samples = []
-
-                for sequence in sliding_segments.from_file(current_file):
-
-                    X = features.crop(sequence, mode='center',
-                                      fixed=self.duration)
+                    if not buffer:
+                        yield sample
+                        continue
 
-                    y = datum['y'].crop(sequence, mode='center',
-                                        fixed=self.duration)
+                    i = np.random.randint(len(buffer))
+                    yield buffer[i]
+                    buffer[i] = sample
 
-                    sample = {'X': X, 'y': np.squeeze(y)}
+    def _sliding_samples(self, datum):
+        """Exhaustive samples of one file
 
-                    if self.shuffle:
-                        samples.append(sample)
-                    else:
-                        yield sample
+        Samples are views of the features (and labels) of the whole file:
+        memory usage is therefore dominated by one features array, whatever
+        the number of samples.
+        """
 
-                if self.shuffle:
-                    np.random.shuffle(samples)
-                    for sample in samples:
-                        yield sample
+        # compute features for the whole file
+        features = self.feature_extraction(datum['current_file'])
+        y = datum['y']
+
+        # sliding windows start times. randomly shift 'annotated' segments
+        # start time so that we avoid generating exactly the same subsequence
+        # twice
+        t = []
+        for segment in get_annotated(datum['current_file']):
+            start = segment.start + np.random.random() * self.duration
+            n = int(np.floor((segment.end - start) / self.duration))
+            t.append(start + self.duration * np.arange(max(0, n)))
+        t = np.hstack(t)
+
+        if self.shuffle:
+            np.random.shuffle(t)
+
+        # equivalent to features.crop(sequence, mode='center',
+        # fixed=self.duration) except for (rare) out of bounds sequences
+        sliding_window = features.sliding_window
+        n_samples = sliding_window.samples(self.duration, mode='center')
+        i = np.rint((t - sliding_window.start - .5 * sliding_window.duration)
+                    / sliding_window.step).astype(np.int64)
+        j = np.rint((t - y.sliding_window.start -
+                     .5 * y.sliding_window.duration)
+                    / y.sliding_window.step).astype(np.int64)
+
+        for t_, i_, j_ in zip(t, i, j):
+
+            sequence = Segment(t_, t_ + self.duration)
+
+            if i_ >= 0 and i_ + n_samples <= len(features.data):
+                X = features.data[i_:i_ + n_samples]
+            else:
+                X = features.crop(sequence, mode='center',
+                                  fixed=self.duration)
+
+            if j_ >= 0 and j_ + n_samples <= len(y.data):
+                y_ = y.data[j_:j_ + n_samples]
+            else:
+                y_ = y.crop(sequence, mode='center', fixed=self.duration)
+
+            yield {'X': X, 'y': np.squeeze(y_)}
 
     @property
     def signature(self):
@@ -287,51 +566,33 @@ class LabelingTaskGenerator(object):
     def labels(self):
         return list(self.labels_)
 
+    def batches(self):
+        """Batch generator
+
+        Returns
+        -------
+        batches : generator
+            Generator that yields batches indefinitely.
+        """
+        return batchify(self.samples(), self.signature,
+                        batch_size=self.batch_size, prefetch=0)
+
     def __call__(self, protocol, subset='train'):
         """(Parallelized) batch generator"""
 
         # pre-load useful information about protocol once and for all
         self.initialize(protocol, subset=subset)
 
-        # number of batches needed to complete an epoch
-        batches_per_epoch = self.batches_per_epoch
+        if not self.parallel:
+            if self.seed is not None:
+                np.random.seed(self.seed)
+            yield from self.batches()
+            return
 
-        generators = []
-
-        if self.parallel:
-            for _ in range(self.parallel):
-
-                # initialize one sample generator
-                samples = self.samples()
-
-                # batchify it and make sure at least
-                # `batches_per_epoch` batches are prefetched.
-                batches = batchify(samples, self.signature,
-                                   batch_size=self.batch_size,
-                                   prefetch=batches_per_epoch)
-
-                # add batch generator to the list of (background) generators
-                generators.append(batches)
-        else:
-
-            # initialize one sample generator
-            samples = self.samples()
-
-            # batchify it without prefetching
-            batches = batchify(samples, self.signature,
-                               batch_size=self.batch_size, prefetch=0)
-
-            # add it to the list of generators
-            # NOTE: this list will only contain one generator
-            generators.append(batches)
-
-        # loop on (background) generators indefinitely
-        while True:
-            for batches in generators:
-                # yield `batches_per_epoch` batches from current generator
-                # so that each epoch is covered by exactly one generator
-                for _ in range(batches_per_epoch):
-                    yield next(batches)
+        # workers are started once initialization is done so that they all
+        # inherit its result
+        yield from BatchLoader(self.batches, n_workers=self.parallel,
+                               prefetch=self.prefetch, seed=self.seed)
 
 
 class LabelingTask(Trainer):
@@ -349,18 +610,28 @@ class LabelingTask(Trainer):
         Total audio duration per epoch, in days.
         Defaults to one day (1).
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
     """
 
     def __init__(self, duration=3.2, batch_size=32, per_epoch=1,
-                 parallel=1):
+                 parallel=1, prefetch=10, seed=None, index_dir=None):
         super(LabelingTask, self).__init__()
         self.duration = duration
         self.batch_size = batch_size
         self.per_epoch = per_epoch
         self.parallel = parallel
+        self.prefetch = prefetch
+        self.seed = seed
+        self.index_dir = index_dir
 
     def get_batch_generator(self, feature_extraction):
         """This method should be overriden by subclass
@@ -376,7 +647,8 @@ class LabelingTask(Trainer):
         return LabelingTaskGenerator(
             feature_extraction, duration=self.duration,
             per_epoch=self.per_epoch, batch_size=self.batch_size,
-            parallel=self.parallel)
+            parallel=self.parallel, prefetch=self.prefetch, seed=self.seed,
+            index_dir=self.index_dir)
 
     @property
     def task_type(self):
@@ -408,7 +680,7 @@ class LabelingTask(Trainer):
 
     def batch_loss(self, batch, model, device, writer=None):
 
-        X = torch.tensor(batch['X'], dtype=torch.float32, device=device)
+        X = self.as_tensor(batch['X'], device)
         fX = model(X)
 
         if self.task_type == TASK_CLASSIFICATION:
@@ -38,6 +38,7 @@ from .base import TASK_CLASSIFICATION
 from pyannote.database.protocol import SpeakerDiarizationProtocol
 from pyannote.audio.labeling.models import StackedRNN
 from pyannote.core.utils.numpy import one_hot_decoding
+from pyannote.audio.signal import viterbi
 from pyannote.database import get_unique_identifier
 from pyannote.database import get_annotated
 from pyannote.audio.labeling.extraction import SequenceLabeling
@@ -57,9 +58,16 @@ class ResegmentationGenerator(LabelingTaskGenerator):
     batch_size : int, optional
         Batch size. Defaults to 32.
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
     """
 
     def __init__(self, precomputed, **kwargs):
@@ -115,14 +123,24 @@ class Resegmentation(LabelingTask):
     linear : list, optional
         List of hidden dimensions of linear layers. Defaults to [16, ], i.e.
         one linear layer with hidden dimension of 16.
+    penalty : float, optional
+        Viterbi decoding speaker change penalty (in log-probability units).
+        Defaults to 0.
+    min_duration : float, optional
+        Viterbi decoding minimum speech turn duration, in seconds.
+        Defaults to 0. Using both default values is equivalent to choosing the
+        most likely class for each frame independently.
     """
 
     def __init__(self, precomputed, epochs=10, ensemble=1, rnn='LSTM',
-                 recurrent=[16, ], bidirectional=True, linear=[16, ], **kwargs):
+                 recurrent=[16, ], bidirectional=True, linear=[16, ],
+                 penalty=0., min_duration=0., **kwargs):
         super(Resegmentation, self).__init__(**kwargs)
         self.precomputed = precomputed
         self.epochs = epochs
         self.ensemble = ensemble
+        self.penalty = penalty
+        self.min_duration = min_duration
 
         self.rnn = rnn
         self.recurrent = recurrent
@@ -132,7 +150,9 @@ class Resegmentation(LabelingTask):
     def get_batch_generator(self, precomputed):
         return ResegmentationGenerator(
             precomputed, duration=self.duration, per_epoch=self.per_epoch,
-            batch_size=self.batch_size, parallel=self.parallel)
+            batch_size=self.batch_size, parallel=self.parallel,
+            prefetch=self.prefetch, seed=self.seed,
+            index_dir=self.index_dir)
 
     @property
     def task_type(self):
@@ -214,8 +234,13 @@ class Resegmentation(LabelingTask):
         # get ensemble scores (average of last self.ensemble epochs)
         avg_scores = sum(s.data for s in scores) / len(scores)
 
-        # TODO. replace argmax by Viterbi decoding
-        self.y_ = np.argmax(avg_scores, axis=1)
+        # class 0 is non-speech: only speaker changes are penalized and
+        # only speech turns have a minimum duration
+        step = self.precomputed.sliding_window.step
+        min_duration = int(np.rint(self.min_duration / step))
+        min_duration = [1] + [min_duration] * (avg_scores.shape[1] - 1)
+        self.y_ = viterbi(avg_scores, penalty=self.penalty,
+                          min_duration=min_duration, non_speech=0)
         return one_hot_decoding(self.y_, self.precomputed,
                                 labels=self.batch_generator_.labels)
 
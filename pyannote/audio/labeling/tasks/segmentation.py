@@ -59,9 +59,16 @@ class SegmentationGenerator(LabelingTaskGenerator):
         Total audio duration per epoch, in days.
         Defaults to one day (1).
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
 
     Usage
     -----
@@ -181,9 +188,16 @@ class Segmentation(LabelingTask):
         Total audio duration per epoch, in days.
         Defaults to one day (1).
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
 
     Usage
     -----
@@ -221,7 +235,8 @@ class Segmentation(LabelingTask):
             overlap=self.overlap > 0., change=self.change > 0.,
             collar=self.collar, duration=self.duration,
             batch_size=self.batch_size, per_epoch=self.per_epoch,
-            parallel=self.parallel)
+            parallel=self.parallel, prefetch=self.prefetch, seed=self.seed,
+            index_dir=self.index_dir)
 
     @property
     def task_type(self):
@@ -52,9 +52,16 @@ class SpeechActivityDetectionGenerator(LabelingTaskGenerator):
         Total audio duration per epoch, in days.
         Defaults to one day (1).
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
 
     Usage
     -----
@@ -127,9 +134,16 @@ class SpeechActivityDetection(LabelingTask):
         Total audio duration per epoch, in days.
         Defaults to one day (1).
     parallel : int, optional
-        Number of prefetching background generators. Defaults to 1.
-        Each generator will prefetch enough batches to cover a whole epoch.
-        Set `parallel` to 0 to not use background generators.
+        Number of background worker processes. Defaults to 1.
+        Set `parallel` to 0 to generate batches in the main process.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+    seed : int, optional
+        Random seed. Defaults to non-deterministic batch generation.
+    index_dir : `Path`, optional
+        Directory where the training set index (annotated segments and
+        frame-level labels) is cached, to be loaded (instead of recomputed)
+        by subsequent trainings. Defaults to not cache anything.
 
     Usage
     -----
@@ -161,7 +175,8 @@ class SpeechActivityDetection(LabelingTask):
         return SpeechActivityDetectionGenerator(
             precomputed, overlap=self.overlap, duration=self.duration,
             per_epoch=self.per_epoch, batch_size=self.batch_size,
-            parallel=self.parallel)
+            parallel=self.parallel, prefetch=self.prefetch, seed=self.seed,
+            index_dir=self.index_dir)
 
     @property
     def task_type(self):
@@ -29,3 +29,5 @@
 from .speech_activity_detection import SpeechActivityDetection
 from .speech_turn_segmentation import SpeechTurnSegmentation
 from .speaker_diarization import SpeakerDiarization
+from .online_speaker_diarization import OnlineSpeakerDiarization
+from .batch import BatchRunner
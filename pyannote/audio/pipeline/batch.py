@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2019 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+import json
+import multiprocessing as mp
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from tqdm import tqdm
+from pyannote.core import Annotation
+from pyannote.core import Segment
+from pyannote.database import get_annotated
+from pyannote.database import get_unique_identifier
+from pyannote.metrics.base import BaseMetric
+from pyannote.metrics.diarization import GreedyDiarizationErrorRate
+from pyannote.pipeline import Pipeline
+
+
+def to_rttm(uri: str, hypothesis: Annotation) -> str:
+    """Convert annotation to RTTM format
+
+    Parameters
+    ----------
+    uri : `str`
+        File identifier.
+    hypothesis : `pyannote.core.Annotation`
+        Annotation.
+
+    Returns
+    -------
+    rttm : `str`
+        One "SPEAKER" line per track.
+    """
+    line = ('SPEAKER {uri} 1 {start:.3f} {duration:.3f} '
+            '<NA> <NA> {label} <NA> <NA>\n')
+    return ''.join(
+        line.format(uri=uri, start=segment.start,
+                    duration=segment.duration, label=label)
+        for segment, _, label in hypothesis.itertracks(yield_label=True))
+
+
+def from_rttm(uri: str, rttm: str) -> Annotation:
+    """Convert RTTM lines (as returned by `to_rttm`) back to annotation
+
+    Parameters
+    ----------
+    uri : `str`
+        File identifier.
+    rttm : `str`
+        "SPEAKER" lines of this file.
+
+    Returns
+    -------
+    hypothesis : `pyannote.core.Annotation`
+        Annotation.
+    """
+    hypothesis = Annotation(uri=uri)
+    for t, line in enumerate(rttm.splitlines()):
+        fields = line.split()
+        start, duration = float(fields[3]), float(fields[4])
+        hypothesis[Segment(start, start + duration), t] = fields[7]
+    return hypothesis
+
+
+# pipeline of current worker process
+_worker = {}
+
+
+def _initialize_worker(pipeline: Pipeline, params: Optional[dict]):
+    if params is not None:
+        pipeline.instantiate(params)
+    _worker['pipeline'] = pipeline
+
+
+def _process_file(item: Tuple[str, dict]) -> Tuple[str, Annotation]:
+    """Apply pipeline of current worker process to a file
+
+    Parameters
+    ----------
+    item : (identifier, current_file) `tuple`
+        Unique file identifier and file as provided by a pyannote.database
+        protocol. `current_file` is None for files already processed.
+
+    Returns
+    -------
+    identifier : `str`
+        Unique file identifier.
+    hypothesis : `pyannote.core.Annotation`
+        Pipeline output. None for files already processed.
+    """
+    identifier, current_file = item
+    if current_file is None:
+        return identifier, None
+    return identifier, _worker['pipeline'](current_file)
+
+
+class BatchRunner(object):
+    """Apply a speaker diarization pipeline to many files in parallel
+
+    Files are processed by a pool of worker processes, each of them
+    instantiating the pipeline once. Hypotheses are appended to a RTTM file
+    as soon as they are available, and progress is checkpointed so that an
+    interrupted run can be resumed where it stopped. The metric is computed
+    by the main process, as hypotheses are received.
+
+    Parameters
+    ----------
+    pipeline : `pyannote.pipeline.Pipeline`
+        Pipeline returning a `pyannote.core.Annotation` for each file.
+    params : `dict`, optional
+        Hyper-parameters used to instantiate the pipeline in each worker.
+        Defaults to using `pipeline` as it is (i.e. already instantiated).
+    n_jobs : `int`, optional
+        Number of worker processes. Defaults to 1 (no worker process).
+    metric : `pyannote.metrics.BaseMetric`, optional
+        Metric accumulated over files that have a reference "annotation".
+        Defaults to `GreedyDiarizationErrorRate`.
+
+    Usage
+    -----
+    >>> pipeline = SpeakerDiarization(sad_scores=..., scd_scores=...,
+    ...                               embedding=...)
+    >>> runner = BatchRunner(pipeline, params=params, n_jobs=8)
+    >>> metric = runner(protocol.test(), 'test.rttm')
+    >>> abs(metric)
+    """
+
+    def __init__(self, pipeline: Pipeline,
+                       params: Optional[dict] = None,
+                       n_jobs: Optional[int] = 1,
+                       metric: Optional[BaseMetric] = None):
+        super().__init__()
+        self.pipeline = pipeline
+        self.params = params
+        self.n_jobs = n_jobs
+        if metric is None:
+            metric = GreedyDiarizationErrorRate(collar=0.0,
+                                                skip_overlap=False)
+        self.metric = metric
+
+    def _accumulate(self, current_file: dict, hypothesis: Annotation):
+        """Accumulate metric over a file (when it has a reference)"""
+        if 'annotation' not in current_file:
+            return
+        self.metric(current_file['annotation'], hypothesis,
+                    uem=get_annotated(current_file))
+
+    def _resume(self, rttm: Path, checkpoint: Path) -> Dict[str, str]:
+        """Reload progress of a previous run
+
+        Both files are truncated to what was done by the previous run: the
+        last checkpoint entry and the hypotheses written after it may have
+        been partially written when it was interrupted.
+
+        Returns
+        -------
+        done : `dict`
+            RTTM lines of files already processed, indexed by their unique
+            identifier.
+        """
+
+        # entries of the checkpoint, and their size in bytes
+        entries, sizes = [], []
+        if checkpoint.exists():
+            with open(checkpoint, 'r') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # last line may have been partially written
+                        break
+                    if not line.endswith('\n'):
+                        break
+                    entries.append(entry)
+                    sizes.append(len(line.encode('utf8')))
+
+        # only keep entries whose hypotheses are actually in the RTTM file
+        rttm_size = rttm.stat().st_size if rttm.exists() else 0
+        while entries and entries[-1]['rttm'][1] > rttm_size:
+            entries.pop()
+            sizes.pop()
+
+        if checkpoint.exists():
+            with open(checkpoint, 'r+') as f:
+                f.truncate(sum(sizes))
+
+        done = dict()
+        if rttm.exists():
+            with open(rttm, 'rb+') as f:
+                for entry in entries:
+                    start, end = entry['rttm']
+                    f.seek(start)
+                    done[entry['identifier']] = \
+                        f.read(end - start).decode('utf8')
+                f.truncate(entries[-1]['rttm'][1] if entries else 0)
+
+        return done
+
+    def __call__(self, files: Iterable[dict], rttm: Path,
+                       checkpoint: Optional[Path] = None) -> BaseMetric:
+        """Apply pipeline to all files
+
+        Parameters
+        ----------
+        files : iterable of `dict`
+            Files as provided by a pyannote.database protocol.
+        rttm : `Path`
+            Path to output RTTM file.
+        checkpoint : `Path`, optional
+            Path to checkpoint file. Defaults to `rttm` with ".done" suffix.
+            When it exists, files it contains are not processed again.
+
+        Returns
+        -------
+        metric : `pyannote.metrics.BaseMetric`
+            Metric accumulated over all files (including those processed by
+            a previous run).
+        """
+
+        rttm = Path(rttm)
+        if checkpoint is None:
+            checkpoint = Path(f'{rttm}.done')
+        checkpoint = Path(checkpoint)
+
+        self.metric.reset()
+        done = self._resume(rttm, checkpoint)
+
+        # files sent to workers, waiting for their hypothesis
+        pending = dict()
+
+        def todo():
+            for current_file in files:
+                identifier = get_unique_identifier(current_file)
+                pending[identifier] = current_file
+                # files already processed are not sent to workers
+                yield identifier, None if identifier in done else current_file
+
+        if self.n_jobs > 1:
+            pool = mp.Pool(self.n_jobs, initializer=_initialize_worker,
+                           initargs=(self.pipeline, self.params))
+            results = pool.imap_unordered(_process_file, todo())
+        else:
+            pool = None
+            _initialize_worker(self.pipeline, self.params)
+            results = map(_process_file, todo())
+
+        try:
+            with open(rttm, 'ab') as f_rttm, \
+                 open(checkpoint, 'a') as f_checkpoint:
+
+                for identifier, hypothesis in tqdm(
+                        results, desc='Processing files', unit='file'):
+
+                    current_file = pending.pop(identifier)
+                    uri = current_file['uri']
+
+                    # file processed by a previous run: only accumulate metric
+                    if hypothesis is None:
+                        hypothesis = from_rttm(uri, done[identifier])
+                        self._accumulate(current_file, hypothesis)
+                        continue
+
+                    # hypothesis first...
+                    start = f_rttm.tell()
+                    f_rttm.write(to_rttm(uri, hypothesis).encode('utf8'))
+                    f_rttm.flush()
+
+                    # ... then mark file as done
+                    entry = {'identifier': identifier,
+                             'uri': uri,
+                             'rttm': [start, f_rttm.tell()]}
+                    f_checkpoint.write(json.dumps(entry) + '\n')
+                    f_checkpoint.flush()
+
+                    self._accumulate(current_file, hypothesis)
+
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+        return self.metric
@@ -0,0 +1,240 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2019 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+from typing import Optional
+
+import numpy as np
+from scipy.cluster.hierarchy import fcluster
+from sklearn.cluster import MiniBatchKMeans
+from pyannote.core.utils.distance import cdist, pdist, l2_normalize
+from scipy.spatial.distance import squareform
+from pyannote.pipeline import Pipeline
+from pyannote.pipeline.parameter import Uniform
+
+
+def weighted_pool_linkage(X: np.ndarray, weights: np.ndarray,
+                          metric: Optional[str] = 'cosine') -> np.ndarray:
+    """'pool' linkage where merged vectors are weighted averages
+
+    Parameters
+    ----------
+    X : (n_samples, dimension) `np.ndarray`
+        Vectors.
+    weights : (n_samples, ) `np.ndarray`
+        Weight of each vector (e.g. speech duration).
+    metric : `str`, optional
+        Distance metric. Defaults to 'cosine'.
+
+    Returns
+    -------
+    Z : (n_samples - 1, 4) `np.ndarray`
+        Linkage matrix, as returned by `scipy.cluster.hierarchy.linkage`.
+    """
+
+    n_samples, dimension = X.shape
+
+    # vector, weight and number of leaves of every (original or merged) cluster
+    C = np.empty((2 * n_samples - 1, dimension))
+    C[:n_samples] = X
+    W = np.empty((2 * n_samples - 1, ))
+    W[:n_samples] = weights
+    S = np.empty((2 * n_samples - 1, ), dtype=int)
+    S[:n_samples] = 1
+
+    # D[i, j] is the distance between ith and jth active clusters,
+    # where active[i] is the cluster index of ith row (and column).
+    # rows (and columns) of merged clusters are set to infinity in place.
+    D = squareform(pdist(X, metric=metric))
+    np.fill_diagonal(D, np.inf)
+    active = np.arange(n_samples)
+    alive = np.ones((n_samples, ), dtype=bool)
+
+    # nearest neighbour of each row (and corresponding distance), so that
+    # finding the two closest clusters does not require scanning D
+    nn = np.argmin(D, axis=1)
+    nn_distance = D[np.arange(n_samples), nn]
+
+    Z = np.empty((n_samples - 1, 4))
+    for k in range(n_samples - 1):
+
+        # merge the two closest clusters...
+        i = np.argmin(nn_distance)
+        i, j = sorted([i, nn[i]])
+        u, v = active[i], active[j]
+        new = n_samples + k
+        W[new] = W[u] + W[v]
+        S[new] = S[u] + S[v]
+        C[new] = (W[u] * C[u] + W[v] * C[v]) / W[new]
+        Z[k] = [u, v, D[i, j], S[new]]
+
+        # ... deactivate jth row
+        alive[j] = False
+        D[j] = np.inf
+        D[:, j] = np.inf
+        nn_distance[j] = np.inf
+
+        # ... and put merged cluster into ith row
+        active[i] = new
+        distance = np.full((n_samples, ), np.inf)
+        distance[alive] = cdist(C[new][np.newaxis], C[active[alive]],
+                                metric=metric)[0]
+        distance[i] = np.inf
+        D[i] = distance
+        D[:, i] = distance
+
+        # nearest neighbour of rows whose nearest neighbour was merged needs
+        # to be looked for again...
+        stale = alive & ((nn == i) | (nn == j))
+        stale[i] = True
+        rows = np.flatnonzero(stale)
+        nn[rows] = np.argmin(D[rows], axis=1)
+        nn_distance[rows] = D[rows, nn[rows]]
+
+        # ... while other rows may only get closer to merged cluster
+        # (ties are broken like np.argmin, i.e. in favor of lower index)
+        closer = alive & ~stale & \
+            ((distance < nn_distance) | ((distance == nn_distance) & (i < nn)))
+        nn[closer] = i
+        nn_distance[closer] = distance[closer]
+
+    return Z
+
+
+class MicroClustering(Pipeline):
+    """Two-stage clustering for large numbers of samples
+
+    Samples are first grouped into (at most) `n_micro` micro-clusters with
+    mini-batch k-means. Micro-clusters are then clustered with
+    duration-weighted 'pool' agglomerative clustering. Memory usage is
+    therefore bounded by the number of micro-clusters. With fewer than
+    `n_micro` samples, first stage is skipped.
+
+    Parameters
+    ----------
+    metric : {'euclidean', 'cosine', 'angular'}, optional
+        Metric used for comparing embeddings. Defaults to 'cosine'.
+    n_micro : `int`, optional
+        Maximum number of micro-clusters. Defaults to 500.
+    batch_size : `int`, optional
+        Mini-batch k-means batch size. Defaults to 1024.
+
+    Hyper-parameters
+    ----------------
+    threshold : `float`
+        Stop merging clusters when their distance is greater than `threshold`.
+    """
+
+    def __init__(self, metric: Optional[str] = 'cosine',
+                       n_micro: Optional[int] = 500,
+                       batch_size: Optional[int] = 1024):
+        super().__init__()
+        self.metric = metric
+        self.n_micro = n_micro
+        self.batch_size = batch_size
+
+        if self.metric == 'angular':
+            self.threshold = Uniform(0., np.pi)
+        else:
+            self.threshold = Uniform(0., 2.)
+
+    def micro(self, X: np.ndarray,
+                    weights: np.ndarray) -> np.ndarray:
+        """Group samples into micro-clusters
+
+        Returns
+        -------
+        y : (n_samples, ) `np.ndarray`
+            Micro-cluster assignment (between 0 and n_micro - 1).
+        """
+
+        n_samples, _ = X.shape
+        if n_samples <= self.n_micro:
+            return np.arange(n_samples)
+
+        # k-means is euclidean: unit-normalize first when comparing angles
+        if self.metric != 'euclidean':
+            X = l2_normalize(X)
+
+        kmeans = MiniBatchKMeans(n_clusters=self.n_micro,
+                                 batch_size=self.batch_size,
+                                 random_state=0)
+        y = kmeans.fit_predict(X, sample_weight=weights)
+
+        # get rid of empty micro-clusters
+        _, y = np.unique(y, return_inverse=True)
+        return y
+
+    def __call__(self, X: np.ndarray,
+                       weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """Apply two-stage clustering
+
+        Parameters
+        ----------
+        X : `np.ndarray`
+            (n_samples, n_dimensions) feature vectors.
+        weights : `np.ndarray`, optional
+            (n_samples, ) weight of each sample (e.g. speech turn duration).
+            Defaults to uniform weights.
+
+        Returns
+        -------
+        y : `np.ndarray`
+            (n_samples, ) cluster assignment (between 1 and n_clusters).
+        """
+
+        n_samples, dimension = X.shape
+
+        if n_samples < 1:
+            msg = "There should be at least one sample in `X`."
+            raise ValueError(msg)
+
+        elif n_samples == 1:
+            # clustering of just one element
+            return np.array([1], dtype=int)
+
+        if weights is None:
+            weights = np.ones((n_samples, ))
+        weights = np.asarray(weights, dtype=np.float64)
+
+        # first stage: micro-clusters
+        micro = self.micro(X, weights)
+        n_micro = np.max(micro) + 1
+        if n_micro < 2:
+            return np.ones((n_samples, ), dtype=int)
+
+        # weighted centroid of each micro-cluster
+        W = np.bincount(micro, weights=weights, minlength=n_micro)
+        C = np.zeros((n_micro, dimension))
+        np.add.at(C, micro, weights[:, np.newaxis] * X)
+        C /= W[:, np.newaxis]
+
+        # second stage: agglomerative clustering of micro-clusters
+        Z = weighted_pool_linkage(C, W, metric=self.metric)
+        clusters = fcluster(Z, self.threshold, criterion='distance')
+
+        return clusters[micro]
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2019 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+from typing import Optional
+from pathlib import Path
+import numpy as np
+
+from pyannote.core import Annotation
+from pyannote.core.utils.distance import cdist
+from pyannote.pipeline import Pipeline
+from pyannote.pipeline.parameter import Uniform
+from pyannote.metrics.diarization import GreedyDiarizationErrorRate
+
+from .speech_turn_segmentation import SpeechTurnSegmentation
+from .utils import pool_embeddings
+from .utils import load_precomputed
+from ..features import Precomputed
+
+
+class OnlineSpeakerDiarization(Pipeline):
+    """Online speaker diarization pipeline
+
+    Speech turns are processed one after the other, in chronological order.
+    Each of them is either assigned to the closest existing speaker (when
+    close enough) or used to create a new speaker. Speakers are described by
+    their (duration-weighted) running centroid so that processing a speech
+    turn only depends on the number of speakers, not on the number of speech
+    turns processed so far.
+
+    Parameters
+    ----------
+    sad_scores : `Path`, optional
+        Path to precomputed SAD scores on disk. Defaults to using
+        current_file['sad_scores'].
+    scd_scores : `Path`, optional
+        Path to precomputed SCD scores on disk. Defaults to using
+        current_file['scd_scores'].
+    embedding : `Path`, optional
+        Path to precomputed embedding on disk.
+        Scores and embeddings are only used when applied offline on a file
+        (i.e. for evaluation or hyper-parameter tuning). Use `update` to
+        process speech turns online.
+    metric : {'euclidean', 'cosine', 'angular'}, optional
+        Metric used for comparing embeddings. Defaults to 'cosine'.
+    recluster : `int`, optional
+        Merge speakers whose centroids became close enough every `recluster`
+        speech turns. Defaults to 0 (i.e. never). Only speakers updated since
+        the previous re-clustering can have moved closer to another one: each
+        re-clustering therefore costs O(recluster x n_speakers), not
+        O(n_speakers ** 2), even in very long sessions.
+
+    Hyper-parameters
+    ----------------
+    threshold : `float`
+        Create a new speaker when the distance between a speech turn and the
+        closest speaker centroid is greater than `threshold`.
+
+    Usage
+    -----
+    >>> pipeline = OnlineSpeakerDiarization(metric='cosine')
+    >>> pipeline.instantiate({'threshold': 0.5})
+    >>> pipeline.reset()
+    >>> for segment, x in incoming_speech_turns:
+    ...     speaker = pipeline.update(x, weight=segment.duration)
+
+    """
+
+    def __init__(self, sad_scores: Optional[Path] = None,
+                       scd_scores: Optional[Path] = None,
+                       embedding: Optional[Path] = None,
+                       metric: Optional[str] = 'cosine',
+                       recluster: Optional[int] = 0):
+
+        super().__init__()
+
+        self.sad_scores = sad_scores
+        self.scd_scores = scd_scores
+        self.speech_turn_segmentation = SpeechTurnSegmentation(
+            sad_scores=self.sad_scores,
+            scd_scores=self.scd_scores)
+
+        self.embedding = embedding
+        if self.embedding is not None:
+            self._precomputed = Precomputed(self.embedding)
+
+        self.metric = metric
+        self.recluster = recluster
+
+        if self.metric == 'angular':
+            self.threshold = Uniform(0., np.pi)
+        else:
+            self.threshold = Uniform(0., 2.)
+
+        self.reset()
+
+    def reset(self):
+        """Forget about all speakers (e.g. before starting a new session)"""
+
+        # running (duration-weighted) sum of embeddings of each speaker.
+        # arrays are allocated by chunks to avoid reallocating them at each
+        # new speaker. only the first n_speakers_ rows are meaningful.
+        self.sums_ = None
+        self.weights_ = np.zeros((0, ))
+        self.n_speakers_ = 0
+
+        # speakers merged by re-clustering are mapped to a common speaker
+        self.parent_ = np.zeros((0, ), dtype=np.int64)
+
+        # speakers updated since last re-clustering
+        self.updated_ = np.zeros((0, ), dtype=bool)
+
+        self.n_updates_ = 0
+
+    def _new_speaker(self, x: np.ndarray, weight: float) -> int:
+
+        k = self.n_speakers_
+
+        # allocate more rows when needed (doubling capacity)
+        if self.sums_ is None or k == len(self.sums_):
+            capacity = max(8, 2 * k)
+            sums = np.zeros((capacity, len(x)), dtype=np.float64)
+            weights = np.zeros((capacity, ))
+            parent = np.arange(capacity, dtype=np.int64)
+            updated = np.zeros((capacity, ), dtype=bool)
+            if k > 0:
+                sums[:k] = self.sums_[:k]
+                weights[:k] = self.weights_[:k]
+                parent[:k] = self.parent_[:k]
+                updated[:k] = self.updated_[:k]
+            self.sums_, self.weights_ = sums, weights
+            self.parent_, self.updated_ = parent, updated
+
+        self.sums_[k] = weight * x
+        self.weights_[k] = weight
+        self.updated_[k] = True
+        self.n_speakers_ += 1
+        return k
+
+    def _merge(self):
+        """Merge speakers whose centroids are closer than threshold
+
+        Closest pairs of speakers are merged one at a time, until no two
+        centroids are closer than threshold. Since the previous call, only
+        centroids of updated speakers have moved: they are the only ones
+        compared to all other speakers.
+        """
+
+        n = self.n_speakers_
+
+        while True:
+
+            speakers = np.flatnonzero(self.parent_[:n] == np.arange(n))
+            updated = speakers[self.updated_[speakers]]
+            if len(speakers) < 2 or len(updated) < 1:
+                break
+
+            centroids = self.sums_[speakers] / \
+                        self.weights_[speakers, np.newaxis]
+            distance = cdist(centroids[self.updated_[speakers]], centroids,
+                             metric=self.metric)
+            distance[updated[:, np.newaxis] == speakers] = np.inf
+            i, j = np.unravel_index(np.argmin(distance), distance.shape)
+            if distance[i, j] > self.threshold:
+                break
+
+            # oldest speaker absorbs the other one
+            target, other = sorted([updated[i], speakers[j]])
+            self.sums_[target] += self.sums_[other]
+            self.weights_[target] += self.weights_[other]
+            self.parent_[:n][self.parent_[:n] == other] = target
+            self.updated_[target] = True
+            self.updated_[other] = False
+
+        self.updated_[:n] = False
+
+    def update(self, x: np.ndarray, weight: Optional[float] = 1.) -> int:
+        """Process a new speech turn
+
+        Parameters
+        ----------
+        x : (dimension, ) `np.ndarray`
+            Speech turn embedding.
+        weight : `float`, optional
+            Speech turn weight in speaker centroid (e.g. its duration).
+            Defaults to 1.
+
+        Returns
+        -------
+        speaker : `int`
+            Speaker index.
+        """
+
+        x = np.asarray(x, dtype=np.float64)
+
+        k = -1
+        if self.n_speakers_ > 0:
+            n = self.n_speakers_
+            speakers = np.flatnonzero(self.parent_[:n] == np.arange(n))
+            centroids = self.sums_[speakers] / \
+                        self.weights_[speakers, np.newaxis]
+            distance = cdist(centroids, x[np.newaxis], metric=self.metric)
+            closest = np.argmin(distance[:, 0])
+            if distance[closest, 0] <= self.threshold:
+                k = speakers[closest]
+
+        if k < 0:
+            k = self._new_speaker(x, weight)
+        else:
+            self.sums_[k] += weight * x
+            self.weights_[k] += weight
+            self.updated_[k] = True
+
+        self.n_updates_ += 1
+        if self.recluster and self.n_updates_ % self.recluster == 0:
+            self._merge()
+
+        return int(self.parent_[k])
+
+    def speaker(self, k: int) -> int:
+        """Map (possibly merged) speaker index to its current index"""
+        return int(self.parent_[k])
+
+    def __call__(self, current_file: dict) -> Annotation:
+        """Simulate online speaker diarization on a whole file
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+
+        Returns
+        -------
+        hypothesis : `pyannote.core.Annotation`
+            Speaker diarization output.
+        """
+
+        if self.embedding is None:
+            msg = ('`embedding` must be provided in order to apply online '
+                   'speaker diarization on a whole file.')
+            raise ValueError(msg)
+
+        self.reset()
+
+        speech_turns = self.speech_turn_segmentation(current_file)
+        embedding = load_precomputed(self._precomputed, current_file)
+
+        # average embedding of each speech turn
+        tracks = list(speech_turns.itertracks())
+        X, found = pool_embeddings(embedding,
+                                   [segment.start for segment, _ in tracks],
+                                   [segment.end for segment, _ in tracks])
+
+        hypothesis = speech_turns.empty()
+        skipped = 0
+        for (segment, track), x, f in zip(tracks, X, found):
+
+            # map speech turns so small we don't have any embedding for it
+            # to their own speaker (between -1 and -N_SKIPPED)
+            if not f:
+                skipped += 1
+                hypothesis[segment, track] = -skipped
+                continue
+
+            hypothesis[segment, track] = self.update(
+                x, weight=segment.duration)
+
+        # take speakers merged by re-clustering into account
+        mapping = {k: self.speaker(k) for k in hypothesis.labels() if k >= 0}
+        return hypothesis.rename_labels(mapping=mapping)
+
+    def get_metric(self) -> GreedyDiarizationErrorRate:
+        """Return new instance of diarization error rate metric"""
+        return GreedyDiarizationErrorRate(collar=0.0, skip_overlap=False)
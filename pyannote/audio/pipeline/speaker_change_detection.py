@@ -27,6 +27,7 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 from typing import Optional
+from typing import List
 from pathlib import Path
 import numpy as np
 
@@ -38,6 +39,7 @@ from pyannote.core import SlidingWindowFeature
 
 from pyannote.audio.signal import Peak
 from pyannote.audio.features import Precomputed
+from .utils import load_precomputed
 
 from pyannote.database import get_annotated
 from pyannote.database import get_unique_identifier
@@ -81,8 +83,8 @@ class SpeakerChangeDetection(Pipeline):
         self._peak = Peak(alpha=self.alpha,
                           min_duration=self.min_duration)
 
-    def __call__(self, current_file: dict) -> Annotation:
-        """Apply change detection
+    def _change_prob(self, current_file: dict) -> SlidingWindowFeature:
+        """Get speaker change probability
 
         Parameters
         ----------
@@ -92,14 +94,17 @@ class SpeakerChangeDetection(Pipeline):
 
         Returns
         -------
-        speech : `pyannote.core.Annotation`
-            Speech regions.
+        change_prob : `pyannote.core.SlidingWindowFeature`
+            Speaker change probability.
         """
 
         # precomputed SCD scores
         scd_scores = current_file.get('scd_scores')
         if scd_scores is None:
-            scd_scores = self._precomputed(current_file)
+            scd_scores = load_precomputed(self._precomputed, current_file)
+            from_cache = True
+        else:
+            from_cache = False
 
         # if this check has not been done yet, do it once and for all
         if not hasattr(self, "log_scale_"):
@@ -109,22 +114,74 @@ class SpeakerChangeDetection(Pipeline):
             else:
                 self.log_scale_ = False
 
+        if from_cache:
+            return load_precomputed(
+                self._precomputed, current_file, derive=self._derive,
+                name=f'change_prob(log_scale={self.log_scale_})')
+
+        return self._derive(scd_scores)
+
+    def _derive(self, scd_scores: SlidingWindowFeature) -> SlidingWindowFeature:
+        """Compute speaker change probability from SCD scores"""
+
         data = np.exp(scd_scores.data) if self.log_scale_ \
                else scd_scores.data
 
         # take the final dimension
         # (in order to support both classification, multi-class classification,
         # and regression scores)
-        change_prob = SlidingWindowFeature(
-            data[:, -1],
-            scd_scores.sliding_window)
+        return SlidingWindowFeature(data[:, -1], scd_scores.sliding_window)
+
+    def __call__(self, current_file: dict) -> Annotation:
+        """Apply change detection
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.  May contain a
+            'scd_scores' key providing precomputed scores.
+
+        Returns
+        -------
+        speech : `pyannote.core.Annotation`
+            Speech regions.
+        """
 
         # peak detection
-        change = self._peak.apply(change_prob)
+        change = self._peak.apply(self._change_prob(current_file))
         change.uri = get_unique_identifier(current_file)
 
         return change.to_annotation(generator='string', modality='audio')
 
+    def apply_batch(self, current_file: dict,
+                          alpha: np.ndarray) -> List[Annotation]:
+        """Apply change detection with many thresholds at once
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.  May contain a
+            'scd_scores' key providing precomputed scores.
+        alpha : `np.ndarray`
+            (n_thresholds, ) peak detection thresholds.
+
+        Returns
+        -------
+        segmentations : `list` of `pyannote.core.Annotation`
+            Segmentation obtained with each threshold. `min_duration` is the
+            one of the instantiated pipeline.
+        """
+
+        change_prob = self._change_prob(current_file)
+        uri = get_unique_identifier(current_file)
+
+        segmentations = []
+        for change in self._peak.apply_batch([change_prob], alpha)[0]:
+            change.uri = uri
+            segmentations.append(
+                change.to_annotation(generator='string', modality='audio'))
+        return segmentations
+
     def loss(self, current_file: dict, hypothesis: Annotation) -> float:
         """Compute (1 - coverage) at target purity
 
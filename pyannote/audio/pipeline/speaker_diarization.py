@@ -36,8 +36,11 @@ from pyannote.metrics.diarization import GreedyDiarizationErrorRate
 from .speech_turn_segmentation import SpeechTurnSegmentation
 from .speech_turn_clustering import SpeechTurnClustering
 from .speech_turn_assignment import SpeechTurnClosestAssignment
+from .utils import MEMO_MAXSIZE
+from .utils import memoize
 
-from typing import Optional
+from typing import Optional, Tuple
+from cachetools import LRUCache
 from pyannote.pipeline import Pipeline
 from pyannote.pipeline.parameter import Uniform
 
@@ -55,10 +58,13 @@ class SpeakerDiarization(Pipeline):
         Path to precomputed embedding on disk
     metric : {'euclidean', 'cosine', 'angular'}, optional
         Metric used for comparing embeddings. Defaults to 'cosine'.
-    method : {'pool', 'affinity_propagation'}
+    method : {'pool', 'affinity_propagation', 'micro_clusters'}
         Clustering method. Defaults to 'pool'.
     evaluation_only : `bool`
         Only process the evaluated regions. Default to False.
+    memo_size : `int`, optional
+        Maximum number of memoized intermediate results (two per file). Set
+        to 0 to disable memoization. Defaults to `MEMO_MAXSIZE`.
 
     Hyper-parameters
     ----------------
@@ -72,7 +78,8 @@ class SpeakerDiarization(Pipeline):
                        embedding: Optional[Path] = None,
                        metric: Optional[str] = 'cosine',
                        method: Optional[str] = 'pool',
-                       evaluation_only: Optional[bool] = False):
+                       evaluation_only: Optional[bool] = False,
+                       memo_size: Optional[int] = MEMO_MAXSIZE):
 
         super().__init__()
 
@@ -80,7 +87,8 @@ class SpeakerDiarization(Pipeline):
         self.scd_scores = scd_scores
         self.speech_turn_segmentation = SpeechTurnSegmentation(
             sad_scores=self.sad_scores,
-            scd_scores=self.scd_scores)
+            scd_scores=self.scd_scores,
+            memo_size=memo_size)
         self.evaluation_only = evaluation_only
 
         self.min_duration = Uniform(0, 10)
@@ -94,6 +102,10 @@ class SpeakerDiarization(Pipeline):
         self.speech_turn_assignment = SpeechTurnClosestAssignment(
             embedding=self.embedding, metric=self.metric)
 
+        # memoized speech turns and embeddings (see `__call__`)
+        self.memo_size = memo_size
+        self._memo = LRUCache(maxsize=self.memo_size)
+
     def __call__(self, current_file: dict) -> Annotation:
         """Apply speaker diarization
 
@@ -108,7 +120,62 @@ class SpeakerDiarization(Pipeline):
             Speaker diarization output.
         """
 
-        # segmentation into speech turns
+        # scores speech turns and embeddings depend on
+        segmentation_scores = {
+            **self.speech_turn_segmentation.sad_scores_,
+            **self.speech_turn_segmentation.scd_scores_}
+        embedding_scores = {
+            **segmentation_scores,
+            'embedding': self.speech_turn_clustering._precomputed}
+
+        speech_turns = memoize(
+            self._memo, 'speech_turns', current_file,
+            {'speech_turn_segmentation':
+                self.speech_turn_segmentation.parameters(instantiated=True)},
+            lambda: self._segment(current_file),
+            scores=segmentation_scores)
+
+        # in case there is one speech turn or less, there is no need to apply
+        # any kind of clustering approach.
+        if len(speech_turns) < 2:
+            return speech_turns.copy()
+
+        # split short/long speech turns and compute their embeddings. this
+        # only depends on segmentation and `min_duration`: it is therefore
+        # shared by all trials only differing by clustering hyper-parameters
+        long_speech_turns, long_embeddings, \
+        shrt_speech_turns, shrt_embeddings = memoize(
+            self._memo, 'embeddings', current_file,
+            {'speech_turn_segmentation':
+                self.speech_turn_segmentation.parameters(instantiated=True),
+             'min_duration': self.min_duration},
+            lambda: self._embed(current_file, speech_turns),
+            scores=embedding_scores)
+
+        # in case there are no long speech turn to cluster, we return the
+        # original speech turns (= shrt_speech_turns)
+        if len(long_speech_turns) < 1:
+            return speech_turns.copy()
+
+        # first: cluster long speech turns
+        long_speech_turns = self.speech_turn_clustering.cluster(
+            long_speech_turns, long_embeddings)
+
+        # then: assign short speech turns to clusters
+        long_speech_turns.rename_labels(generator='string', copy=False)
+
+        if len(shrt_speech_turns) > 0:
+            shrt_speech_turns = self.speech_turn_assignment.assign(
+                current_file, shrt_speech_turns, long_speech_turns,
+                shrt_embeddings)
+        # merge short/long speech turns
+        return long_speech_turns.update(shrt_speech_turns, copy=False)
+
+        # TODO. add GMM-based resegmentation
+
+    def _segment(self, current_file: dict) -> Annotation:
+        """Segment file into speech turns"""
+
         speech_turns = self.speech_turn_segmentation(current_file)
 
         # some files are only partially annotated and therefore one cannot
@@ -120,10 +187,11 @@ class SpeakerDiarization(Pipeline):
             annotated = get_annotated(current_file)
             speech_turns = speech_turns.crop(annotated, mode='intersection')
 
-        # in case there is one speech turn or less, there is no need to apply
-        # any kind of clustering approach.
-        if len(speech_turns) < 2:
-            return speech_turns
+        return speech_turns
+
+    def _embed(self, current_file: dict,
+                     speech_turns: Annotation) -> Tuple:
+        """Split short/long speech turns and compute their embeddings"""
 
         # split short/long speech turns. the idea is to first cluster long
         # speech turns (i.e. those for which we can trust embeddings) and then
@@ -136,27 +204,19 @@ class SpeakerDiarization(Pipeline):
             else:
                 long_speech_turns[segment, track] = label
 
-        # in case there are no long speech turn to cluster, we return the
-        # original speech turns (= shrt_speech_turns)
-        if len(long_speech_turns) < 1:
-            return speech_turns
-
-        # first: cluster long speech turns
-        long_speech_turns = self.speech_turn_clustering(current_file,
-                                                        long_speech_turns)
-
-        # then: assign short speech turns to clusters
-        long_speech_turns.rename_labels(generator='string', copy=False)
+        long_embeddings = None
+        if len(long_speech_turns) > 0:
+            long_embeddings = self.speech_turn_clustering.embed(
+                current_file, long_speech_turns)
 
+        shrt_embeddings = None
         if len(shrt_speech_turns) > 0:
             shrt_speech_turns.rename_labels(generator='int', copy=False)
-            shrt_speech_turns = self.speech_turn_assignment(current_file,
-                                                            shrt_speech_turns,
-                                                            long_speech_turns)
-        # merge short/long speech turns
-        return long_speech_turns.update(shrt_speech_turns, copy=False)
+            shrt_embeddings = self.speech_turn_assignment.embed(
+                current_file, shrt_speech_turns)
 
-        # TODO. add GMM-based resegmentation
+        return (long_speech_turns, long_embeddings,
+                shrt_speech_turns, shrt_embeddings)
 
     def get_metric(self) -> GreedyDiarizationErrorRate:
         """Return new instance of diarization error rate metric"""
@@ -27,6 +27,7 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 from typing import Optional
+from typing import List
 from pathlib import Path
 import numpy as np
 
@@ -38,6 +39,7 @@ from pyannote.core import SlidingWindowFeature
 
 from pyannote.audio.signal import Binarize
 from pyannote.audio.features import Precomputed
+from .utils import load_precomputed
 
 from pyannote.database import get_unique_identifier
 from pyannote.metrics.detection import DetectionErrorRate
@@ -78,8 +80,8 @@ class SpeechActivityDetection(Pipeline):
             pad_onset=self.pad_onset,
             pad_offset=self.pad_offset)
 
-    def __call__(self, current_file: dict) -> Annotation:
-        """Apply speech activity detection
+    def _speech_prob(self, current_file: dict) -> SlidingWindowFeature:
+        """Get speech probability
 
         Parameters
         ----------
@@ -89,14 +91,17 @@ class SpeechActivityDetection(Pipeline):
 
         Returns
         -------
-        speech : `pyannote.core.Annotation`
-            Speech regions.
+        speech_prob : `pyannote.core.SlidingWindowFeature`
+            Speech probability.
         """
 
         # precomputed SAD scores
         sad_scores = current_file.get('sad_scores')
         if sad_scores is None:
-            sad_scores = self._precomputed(current_file)
+            sad_scores = load_precomputed(self._precomputed, current_file)
+            from_cache = True
+        else:
+            from_cache = False
 
         # if this check has not been done yet, do it once and for all
         if not hasattr(self, "log_scale_"):
@@ -106,6 +111,16 @@ class SpeechActivityDetection(Pipeline):
             else:
                 self.log_scale_ = False
 
+        if from_cache:
+            return load_precomputed(
+                self._precomputed, current_file, derive=self._derive,
+                name=f'speech_prob(log_scale={self.log_scale_})')
+
+        return self._derive(sad_scores)
+
+    def _derive(self, sad_scores: SlidingWindowFeature) -> SlidingWindowFeature:
+        """Compute speech probability from SAD scores"""
+
         data = np.exp(sad_scores.data) if self.log_scale_ \
                else sad_scores.data
 
@@ -115,11 +130,61 @@ class SpeechActivityDetection(Pipeline):
         else:
             speech_prob = SlidingWindowFeature(data, sad_scores.sliding_window)
 
-        speech = self._binarize.apply(speech_prob)
+        return speech_prob
+
+    def __call__(self, current_file: dict) -> Annotation:
+        """Apply speech activity detection
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol. May contain a
+            'sad_scores' key providing precomputed scores.
+
+        Returns
+        -------
+        speech : `pyannote.core.Annotation`
+            Speech regions.
+        """
+
+        speech = self._binarize.apply(self._speech_prob(current_file))
 
         speech.uri = get_unique_identifier(current_file)
         return speech.to_annotation(generator='string', modality='speech')
 
+    def apply_batch(self, current_file: dict,
+                          onset: np.ndarray,
+                          offset: Optional[np.ndarray] = None) -> List[Annotation]:
+        """Apply speech activity detection with many thresholds at once
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol. May contain a
+            'sad_scores' key providing precomputed scores.
+        onset : `np.ndarray`
+            (n_thresholds, ) onset thresholds.
+        offset : `np.ndarray`, optional
+            (n_thresholds, ) offset thresholds. Defaults to `onset`.
+
+        Returns
+        -------
+        speech : `list` of `pyannote.core.Annotation`
+            Speech regions obtained with each threshold. Other
+            hyper-parameters are those of the instantiated pipeline.
+        """
+
+        speech_prob = self._speech_prob(current_file)
+        uri = get_unique_identifier(current_file)
+
+        hypotheses = []
+        for speech in self._binarize.apply_batch([speech_prob], onset,
+                                                 offset=offset)[0]:
+            speech.uri = uri
+            hypotheses.append(
+                speech.to_annotation(generator='string', modality='speech'))
+        return hypotheses
+
     def get_metric(self) -> DetectionErrorRate:
         """Return new instance of detection error rate metric"""
         return  DetectionErrorRate(collar=0.0, skip_overlap=False)
@@ -27,7 +27,7 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
-from typing import Optional
+from typing import List, Optional, Tuple
 from pathlib import Path
 import numpy as np
 
@@ -36,6 +36,8 @@ from pyannote.pipeline.blocks.classification import ClosestAssignment
 from pyannote.core import Annotation
 from .utils import assert_int_labels
 from .utils import assert_string_labels
+from .utils import label_embeddings
+from .utils import load_precomputed
 from ..features import Precomputed
 
 
@@ -81,57 +83,75 @@ class SpeechTurnClosestAssignment(Pipeline):
             Assigned speech turns.
         """
 
-        assert_string_labels(targets, 'targets')
-        assert_int_labels(speech_turns, 'speech_turns')
+        return self.assign(current_file, speech_turns, targets,
+                           self.embed(current_file, speech_turns))
 
-        embedding = self.precomputed_(current_file)
+    def embed(self, current_file: dict,
+                    speech_turns: Annotation) -> Tuple[List, np.ndarray,
+                                                       np.ndarray]:
+        """Compute average embedding of each speech turn label
 
-        # gather targets embedding
-        labels = targets.labels()
-        X_targets, targets_labels = [], []
-        for l, label in enumerate(labels):
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+        speech_turns : `Annotation`
+            Speech turns. Should only contain `int` labels.
 
-            timeline = targets.label_timeline(label, copy=False)
+        Returns
+        -------
+        embeddings : `tuple`
+            Labels, average embeddings, and mask of labels with at least one
+            embedding (as returned by `label_embeddings`).
+        """
 
-            # be more and more permissive until we have
-            # at least one embedding for current speech turn
-            for mode in ['strict', 'center', 'loose']:
-                x = embedding.crop(timeline, mode=mode)
-                if len(x) > 0:
-                    break
+        assert_int_labels(speech_turns, 'speech_turns')
 
-            # skip labels so small we don't have any embedding for it
-            if len(x) < 1:
-                continue
+        embedding = load_precomputed(self.precomputed_, current_file)
+        return label_embeddings(embedding, speech_turns)
 
-            targets_labels.append(label)
-            X_targets.append(np.mean(x, axis=0))
+    def assign(self, current_file: dict,
+                     speech_turns: Annotation,
+                     targets: Annotation,
+                     embeddings: Tuple[List, np.ndarray, np.ndarray]) \
+                     -> Annotation:
+        """Assign each speech turn to closest target, given their embedding
 
-        # gather speech turns embedding
-        labels = speech_turns.labels()
-        X, assigned_labels, skipped_labels = [], [], []
-        for l, label in enumerate(labels):
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+        speech_turns : `Annotation`
+            Speech turns. Should only contain `int` labels.
+        targets : `Annotation`
+            Targets. Should only contain `str` labels.
+        embeddings : `tuple`
+            Output of `embed` for `speech_turns`.
+
+        Returns
+        -------
+        assigned : `Annotation`
+            Assigned speech turns.
+        """
 
-            timeline = speech_turns.label_timeline(label, copy=False)
+        assert_string_labels(targets, 'targets')
+
+        embedding = load_precomputed(self.precomputed_, current_file)
 
-            # be more and more permissive until we have
-            # at least one embedding for current speech turn
-            for mode in ['strict', 'center', 'loose']:
-                x = embedding.crop(timeline, mode=mode)
-                if len(x) > 0:
-                    break
+        # gather targets embedding
+        labels, X_targets, found = label_embeddings(embedding, targets)
 
-            # skip labels so small we don't have any embedding for it
-            if len(x) < 1:
-                skipped_labels.append(label)
-                continue
+        # skip labels so small we don't have any embedding for it
+        targets_labels = [l for l, f in zip(labels, found) if f]
+        X_targets = X_targets[found]
 
-            assigned_labels.append(label)
-            X.append(np.mean(x, axis=0))
+        # gather speech turns embedding
+        labels, X, found = embeddings
+        assigned_labels = [l for l, f in zip(labels, found) if f]
+        X = X[found]
 
         # assign speech turns to closest class
-        assignments = self.closest_assignment(np.vstack(X_targets),
-                                              np.vstack(X))
+        assignments = self.closest_assignment(X_targets, X)
         mapping = {label: targets_labels[k]
                    for label, k in zip(assigned_labels, assignments)
                    if not k < 0}
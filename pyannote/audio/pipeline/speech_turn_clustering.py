@@ -28,7 +28,7 @@
 
 import numpy as np
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Tuple
 
 from pyannote.core import Annotation
 from pyannote.pipeline import Pipeline
@@ -37,6 +37,9 @@ from pyannote.pipeline.blocks.clustering import \
     HierarchicalAgglomerativeClustering
 from pyannote.pipeline.blocks.clustering import AffinityPropagationClustering
 from .utils import assert_string_labels
+from .utils import label_embeddings
+from .utils import load_precomputed
+from .clustering import MicroClustering
 
 
 class SpeechTurnClustering(Pipeline):
@@ -48,7 +51,10 @@ class SpeechTurnClustering(Pipeline):
         Path to precomputed embeddings.
     metric : {'euclidean', 'cosine', 'angular'}, optional
         Metric used for comparing embeddings. Defaults to 'cosine'.
-    method : {'pool', 'affinity_propagation'}
+    method : {'pool', 'affinity_propagation', 'micro_clusters'}
+        Clustering method. Use 'micro_clusters' for long recordings with
+        many speech turns: it first groups them into a bounded number of
+        micro-clusters before applying (duration-weighted) 'pool' clustering.
     """
 
     def __init__(self, embedding: Optional[Path],
@@ -77,6 +83,9 @@ class SpeechTurnClustering(Pipeline):
             # have more accurate embeddings, therefore should be prefered for
             # exemplars
 
+        elif self.method == 'micro_clusters':
+            self.clustering = MicroClustering(metric=self.metric)
+
         else:
             self.clustering = HierarchicalAgglomerativeClustering(
                 method=self.method, metric=self.metric, use_threshold=True)
@@ -98,33 +107,65 @@ class SpeechTurnClustering(Pipeline):
             Clustered speech turns.
         """
 
+        return self.cluster(speech_turns,
+                            self.embed(current_file, speech_turns))
+
+    def embed(self, current_file: dict,
+                    speech_turns: Annotation) -> Tuple[List, np.ndarray,
+                                                       np.ndarray]:
+        """Compute average embedding of each speech turn label
+
+        Parameters
+        ----------
+        current_file : `dict`
+            File as provided by a pyannote.database protocol.
+        speech_turns : `Annotation`
+            Speech turns. Should only contain `str` labels.
+
+        Returns
+        -------
+        embeddings : `tuple`
+            Labels, average embeddings, and mask of labels with at least one
+            embedding (as returned by `label_embeddings`).
+        """
+
         assert_string_labels(speech_turns, 'speech_turns')
 
-        embedding = self._precomputed(current_file)
+        embedding = load_precomputed(self._precomputed, current_file)
+        return label_embeddings(embedding, speech_turns)
 
-        labels = speech_turns.labels()
-        X, clustered_labels, skipped_labels = [], [], []
-        for l, label in enumerate(labels):
+    def cluster(self, speech_turns: Annotation,
+                      embeddings: Tuple[List, np.ndarray, np.ndarray]) \
+                      -> Annotation:
+        """Cluster speech turns based on their (precomputed) embedding
 
-            timeline = speech_turns.label_timeline(label, copy=False)
+        Parameters
+        ----------
+        speech_turns : `Annotation`
+            Speech turns. Should only contain `str` labels.
+        embeddings : `tuple`
+            Output of `embed`.
 
-            # be more and more permissive until we have
-            # at least one embedding for current speech turn
-            for mode in ['strict', 'center', 'loose']:
-                x = embedding.crop(timeline, mode=mode)
-                if len(x) > 0:
-                    break
+        Returns
+        -------
+        speech_turns : `pyannote.core.Annotation`
+            Clustered speech turns.
+        """
 
-            # skip labels so small we don't have any embedding for it
-            if len(x) < 1:
-                skipped_labels.append(label)
-                continue
+        labels, X, found = embeddings
 
-            clustered_labels.append(label)
-            X.append(np.mean(x, axis=0))
+        # skip labels so small we don't have any embedding for it
+        clustered_labels = [l for l, f in zip(labels, found) if f]
+        skipped_labels = [l for l, f in zip(labels, found) if not f]
+        X = X[found]
 
         # apply clustering of label embeddings
-        clusters = self.clustering(np.vstack(X))
+        if self.method == 'micro_clusters':
+            durations = [speech_turns.label_duration(label)
+                         for label in clustered_labels]
+            clusters = self.clustering(X, weights=durations)
+        else:
+            clusters = self.clustering(X)
 
         # map each clustered label to its cluster (between 1 and N_CLUSTERS)
         mapping = {label: k for label, k in zip(clustered_labels, clusters)}
@@ -29,8 +29,11 @@
 from typing import Optional
 from pathlib import Path
 
+from cachetools import LRUCache
 from pyannote.core import Annotation
 from pyannote.pipeline import Pipeline
+from .utils import MEMO_MAXSIZE
+from .utils import memoize
 from .speaker_change_detection import SpeakerChangeDetection
 from .speech_activity_detection import SpeechActivityDetection
 
@@ -71,12 +74,17 @@ class SpeechTurnSegmentation(Pipeline):
         Mark non-speech regions as speaker change. Defaults to True.
     purity : `float`, optional
         Target purity. Defaults to 0.95
+    memo_size : `int`, optional
+        Maximum number of memoized speech activity and speaker change
+        detection outputs (two per file). Set to 0 to disable memoization.
+        Defaults to `MEMO_MAXSIZE`.
     """
 
     def __init__(self, sad_scores: Optional[Path] = None,
                        scd_scores: Optional[Path] = None,
                        non_speech: Optional[bool] = True,
-                       purity: Optional[float] = 0.95):
+                       purity: Optional[float] = 0.95,
+                       memo_size: Optional[int] = MEMO_MAXSIZE):
         super().__init__()
 
         self.sad_scores = sad_scores
@@ -90,6 +98,11 @@ class SpeechTurnSegmentation(Pipeline):
         self.non_speech = non_speech
         self.purity = purity
 
+        # speech activity and speaker change detection outputs only depend on
+        # their own hyper-parameters: no need to recompute them every time
+        # the other one changes during tuning.
+        self.memo_size = memo_size
+        self._memo = LRUCache(maxsize=self.memo_size)
 
     def __call__(self, current_file: dict) -> Annotation:
         """Apply speech turn segmentation
@@ -106,9 +119,17 @@ class SpeechTurnSegmentation(Pipeline):
         """
 
         # speech regions
-        sad = self.speech_activity_detection(current_file).get_timeline()
-
-        scd = self.speaker_change_detection(current_file)
+        sad = memoize(
+            self._memo, 'sad', current_file,
+            self.speech_activity_detection.parameters(instantiated=True),
+            lambda: self.speech_activity_detection(current_file).get_timeline(),
+            scores=self.sad_scores_)
+
+        scd = memoize(
+            self._memo, 'scd', current_file,
+            self.speaker_change_detection.parameters(instantiated=True),
+            lambda: self.speaker_change_detection(current_file),
+            scores=self.scd_scores_)
         speech_turns = scd.crop(sad, mode='intersection')
 
         # at this point, consecutive speech turns separated by non-speech
@@ -122,6 +143,18 @@ class SpeechTurnSegmentation(Pipeline):
         speech_turns.modality = 'speaker'
         return speech_turns
 
+    @property
+    def sad_scores_(self) -> dict:
+        """Speech activity detection scores (see `memoize`)"""
+        return {'sad_scores': getattr(self.speech_activity_detection,
+                                      '_precomputed', None)}
+
+    @property
+    def scd_scores_(self) -> dict:
+        """Speaker change detection scores (see `memoize`)"""
+        return {'scd_scores': getattr(self.speaker_change_detection,
+                                      '_precomputed', None)}
+
     def loss(self, current_file: dict, hypothesis: Annotation) -> float:
         """Compute (1 - coverage) at target purity
 
@@ -27,7 +27,26 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from cachetools import LRUCache
 from pyannote.core import Annotation
+from pyannote.core import SlidingWindow
+from pyannote.core import SlidingWindowFeature
+from pyannote.core.segment import SEGMENT_PRECISION
+from pyannote.database import get_unique_identifier
+from ..features import Precomputed
+
+# maximum size (in bytes) of the cache of precomputed arrays
+CACHE_MAXSIZE = 2 ** 30
+
+# default maximum number of memoized intermediate results (per pipeline).
+# pipelines memoize a few intermediate results per file: this should be
+# (at least) a few times larger than the number of files they are tuned on.
+MEMO_MAXSIZE = 1024
 
 
 def assert_string_labels(annotation: Annotation, name: str):
@@ -58,3 +77,357 @@ def assert_int_labels(annotation: Annotation, name: str):
     if any(not isinstance(label, int) for label in annotation.labels()):
         msg = f'{name} must contain `int` labels only.'
         raise ValueError(msg)
+
+
+def _ranges(sliding_window: SlidingWindow, starts: np.ndarray,
+            ends: np.ndarray, mode: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Vectorized equivalent of `SlidingWindow.crop(Segment, mode=mode)`
+
+    Returns
+    -------
+    first, last : np.ndarray
+        Frames [first[i], last[i]) are those of ith segment.
+    """
+
+    start = sliding_window.start
+    duration = sliding_window.duration
+    step = sliding_window.step
+
+    if mode == 'loose':
+        first = np.ceil((starts - duration - start) / step)
+        last = np.floor((ends - start) / step) + 1
+    elif mode == 'strict':
+        first = np.ceil((starts - start) / step)
+        last = np.floor((ends - duration - start) / step) + 1
+    elif mode == 'center':
+        first = np.rint((starts - start - .5 * duration) / step)
+        last = np.rint((ends - start - .5 * duration) / step) + 1
+    else:
+        msg = "'mode' must be one of {'loose', 'strict', 'center'}."
+        raise ValueError(msg)
+
+    return first.astype(np.int64), last.astype(np.int64)
+
+
+def _group_cummax(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Cumulative maximum of values, restarted for each (sorted) group"""
+
+    # work on ranks so that groups can be offset without loss of precision
+    order = np.argsort(values, kind='mergesort')
+    rank = np.empty(len(values), dtype=np.int64)
+    rank[order] = np.arange(len(values))
+    offset = groups * len(values)
+    rank = np.maximum.accumulate(rank + offset) - offset
+    return values[order[rank]]
+
+
+def pool_embeddings(embedding: SlidingWindowFeature,
+                    starts: np.ndarray, ends: np.ndarray,
+                    groups: Optional[np.ndarray] = None,
+                    n_groups: Optional[int] = None) \
+                    -> Tuple[np.ndarray, np.ndarray]:
+    """Average embeddings over groups of segments
+
+    Vectorized equivalent of the following loop, over all groups at once:
+
+    >>> for mode in ['strict', 'center', 'loose']:
+    ...     x = embedding.crop(timeline, mode=mode)
+    ...     if len(x) > 0:
+    ...         break
+    >>> mean = np.mean(x, axis=0)
+
+    Parameters
+    ----------
+    embedding : `SlidingWindowFeature`
+        Precomputed embeddings.
+    starts, ends : (n_segments, ) `np.ndarray`
+        Segments start and end times.
+    groups : (n_segments, ) `np.ndarray`, optional
+        Index of the group (e.g. label) each segment belongs to. Defaults to
+        one group per segment.
+    n_groups : `int`, optional
+        Number of groups. Defaults to `max(groups) + 1`.
+
+    Returns
+    -------
+    X : (n_groups, dimension) `np.ndarray`
+        Average embedding of each group.
+    found : (n_groups, ) `np.ndarray`
+        Boolean mask of groups with at least one embedding, even in 'loose'
+        mode. X is NaN for other groups.
+    """
+
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    if groups is None:
+        groups = np.arange(len(starts))
+    groups = np.asarray(groups, dtype=np.int64)
+    if n_groups is None:
+        n_groups = int(np.max(groups)) + 1 if len(groups) else 0
+
+    data = embedding.data
+    n_samples, dimension = data.shape
+
+    # sort segments by group, then by start time
+    order = np.lexsort((starts, groups))
+    starts, ends, groups = starts[order], ends[order], groups[order]
+
+    # merge overlapping (or adjacent) segments of a group, as cropping a
+    # timeline actually crops its support
+    if len(starts) > 0:
+        new_group = np.hstack([[True], groups[1:] != groups[:-1]])
+        running_end = _group_cummax(ends, groups)
+        new_support = new_group.copy()
+        new_support[1:] |= starts[1:] - running_end[:-1] > SEGMENT_PRECISION
+        index = np.flatnonzero(new_support)
+        starts = starts[index]
+        ends = np.maximum.reduceat(ends, index)
+        groups = groups[index]
+
+    # segment sums as differences of cumulative sums
+    cumsum = np.zeros((n_samples + 1, dimension), dtype=np.float64)
+    np.cumsum(data, axis=0, out=cumsum[1:])
+
+    X = np.full((n_groups, dimension), np.nan)
+    found = np.zeros((n_groups, ), dtype=bool)
+
+    # be more and more permissive until we have at least one embedding
+    for mode in ['strict', 'center', 'loose']:
+
+        first, last = _ranges(embedding.sliding_window, starts, ends, mode)
+        first = np.clip(first, 0, n_samples)
+        last = np.clip(last, 0, n_samples)
+
+        # do not count twice frames shared by consecutive segments of a group
+        if len(first) > 0:
+            previous = np.hstack([[0], last[:-1]])
+            previous[np.hstack([[True], groups[1:] != groups[:-1]])] = 0
+            first = np.maximum(first, _group_cummax(previous, groups))
+            last = np.maximum(first, last)
+
+        count = np.bincount(groups, weights=last - first, minlength=n_groups)
+        total = np.zeros((n_groups, dimension), dtype=np.float64)
+        np.add.at(total, groups, cumsum[last] - cumsum[first])
+
+        todo = ~found & (count > 0)
+        X[todo] = total[todo] / count[todo, np.newaxis]
+        found |= todo
+
+    return X, found
+
+
+def label_embeddings(embedding: SlidingWindowFeature,
+                     annotation: Annotation) \
+                     -> Tuple[List, np.ndarray, np.ndarray]:
+    """Average embeddings over each label of an annotation
+
+    Parameters
+    ----------
+    embedding : `SlidingWindowFeature`
+        Precomputed embeddings.
+    annotation : `Annotation`
+        Annotation.
+
+    Returns
+    -------
+    labels : `list`
+        Sorted labels.
+    X : (n_labels, dimension) `np.ndarray`
+        Average embedding of each label.
+    found : (n_labels, ) `np.ndarray`
+        Boolean mask of labels with at least one embedding.
+
+    See also
+    --------
+    `pool_embeddings`
+    """
+
+    labels = annotation.labels()
+    index = {label: l for l, label in enumerate(labels)}
+
+    starts, ends, groups = [], [], []
+    for segment, _, label in annotation.itertracks(yield_label=True):
+        starts.append(segment.start)
+        ends.append(segment.end)
+        groups.append(index[label])
+
+    X, found = pool_embeddings(embedding, starts, ends, groups=groups,
+                               n_groups=len(labels))
+    return labels, X, found
+
+
+# precomputed scores and embeddings (and arrays derived from them) shared by
+# all pipelines of current process, so that they are not loaded from disk
+# again and again (e.g. during hyper-parameter optimization)
+_CACHE = LRUCache(maxsize=CACHE_MAXSIZE,
+                  getsizeof=lambda features: features.data.nbytes)
+
+
+def load_precomputed(precomputed: Precomputed, current_file: dict,
+                     derive: Optional[Callable] = None,
+                     name: Optional[str] = None) -> SlidingWindowFeature:
+    """Load precomputed features (or arrays derived from them) through cache
+
+    Parameters
+    ----------
+    precomputed : `Precomputed`
+        Precomputed scores or embeddings.
+    current_file : `dict`
+        File as provided by a pyannote.database protocol.
+    derive : callable, optional
+        Function that takes precomputed `SlidingWindowFeature` as input and
+        returns a derived one (e.g. speech probability from raw scores).
+    name : `str`, optional
+        Unique name of `derive` function, used as part of cache key. Must
+        describe everything `derive` depends on.
+
+    Returns
+    -------
+    features : `SlidingWindowFeature`
+        Precomputed (or derived) features. Data is read-only as it is shared
+        with other callers.
+
+    Notes
+    -----
+    Cache entries are invalidated when underlying file changes.
+    """
+
+    path = precomputed.get_path(current_file)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        # let `precomputed` raise the appropriate exception
+        return precomputed(current_file)
+
+    key = (str(precomputed.root_dir), get_unique_identifier(current_file),
+           stat.st_mtime_ns, stat.st_size)
+
+    features = _CACHE.get(key)
+    if features is None:
+        data = np.array(precomputed(current_file).data)
+        data.flags.writeable = False
+        features = SlidingWindowFeature(data, precomputed.sliding_window)
+        _cache(key, features)
+
+    if derive is None:
+        return features
+
+    derived_key = key + (name, )
+    derived = _CACHE.get(derived_key)
+    if derived is None:
+        derived = derive(features)
+        derived.data.flags.writeable = False
+        _cache(derived_key, derived)
+
+    return derived
+
+
+def _cache(key, features: SlidingWindowFeature):
+    try:
+        _CACHE[key] = features
+    except ValueError:
+        # too large to be cached
+        pass
+
+
+def _scores_key(current_file: dict, key: str,
+                precomputed: Optional[Precomputed]) -> Tuple:
+    """Identify scores an intermediate result depends on
+
+    Parameters
+    ----------
+    current_file : `dict`
+        File as provided by a pyannote.database protocol.
+    key : `str`
+        Key of `current_file` providing in-memory scores (e.g. 'sad_scores').
+    precomputed : `Precomputed`, optional
+        Precomputed scores, used when `current_file` has no `key`.
+
+    Returns
+    -------
+    scores_key : `tuple`
+        Hashable description of scores location and version.
+    scores : object or None
+        In-memory scores, if any. They are compared by identity (rather than
+        by their `id`, which could be reused once they are garbage collected).
+    """
+
+    if key in current_file:
+        return (key, 'memory'), current_file[key]
+
+    if precomputed is None:
+        return (key, None), None
+
+    path = precomputed.get_path(current_file)
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return (key, str(path), None), None
+    return (key, str(path), stat.st_mtime_ns, stat.st_size), None
+
+
+def memoize(memo: LRUCache, name: str, current_file: dict,
+            params: Dict, compute: Callable[[], Any],
+            scores: Optional[Dict[str, Optional[Precomputed]]] = None) -> Any:
+    """Memoize intermediate result of a pipeline
+
+    During hyper-parameter tuning, pipelines are applied over and over to the
+    same files, with only some of their hyper-parameters changing from one
+    trial to the next. This helper makes sure that intermediate results only
+    depending on hyper-parameters that did not change are not recomputed.
+
+    Parameters
+    ----------
+    memo : `LRUCache`
+        Pipeline-specific memo.
+    name : `str`
+        Name of intermediate result (e.g. 'speech_turns').
+    current_file : `dict`
+        File as provided by a pyannote.database protocol.
+    params : `dict`
+        Hyper-parameters the intermediate result depends on.
+    compute : callable
+        Called without argument to compute the intermediate result when it is
+        not already available.
+    scores : `dict`, optional
+        Scores the intermediate result depends on, as {key: precomputed}
+        dictionary (e.g. {'sad_scores': Precomputed('/path/to/sad')}).
+        In-memory scores provided by `current_file[key]` take precedence over
+        `precomputed` ones (which may be None). The intermediate result is
+        recomputed whenever those in-memory scores are replaced, or when the
+        precomputed scores file is modified.
+
+    Returns
+    -------
+    result :
+        Intermediate result. Callers must not modify it in place.
+    """
+
+    if scores is None:
+        scores = dict()
+
+    scores_keys, in_memory = [], []
+    for key, precomputed in sorted(scores.items()):
+        scores_key, in_memory_ = _scores_key(current_file, key, precomputed)
+        scores_keys.append(scores_key)
+        in_memory.append(in_memory_)
+
+    key = (name, get_unique_identifier(current_file),
+           json.dumps(params, sort_keys=True, default=str),
+           tuple(scores_keys))
+
+    try:
+        dependencies, result = memo[key]
+    except KeyError:
+        pass
+    else:
+        if all(d is m for d, m in zip(dependencies, in_memory)):
+            return result
+
+    result = compute()
+    try:
+        memo[key] = (in_memory, result)
+    except ValueError:
+        # memoization is disabled (maxsize = 0)
+        pass
+    return result
@@ -27,14 +27,368 @@
 # Hervé BREDIN - http://herve.niderb.fr
 
 
+import hashlib
+import multiprocessing as mp
 import numpy as np
 import scipy.signal
+import scipy.special
+from cachetools import LRUCache
 from pyannote.core import Segment, Timeline
-from pyannote.core.utils.generators import pairwise
+from pyannote.core.segment import SEGMENT_PRECISION
 from sklearn.mixture import GaussianMixture
 from pyannote.core.utils.numpy import one_hot_decoding
 
 
+def hysteresis(y, onset, offset, initial=False):
+    """Onset/offset hysteresis thresholding
+
+    Parameters
+    ----------
+    y : (n_samples, ) np.ndarray
+        Scores.
+    onset : float or (n_thresholds, ) np.ndarray
+        Samples strictly greater than `onset` switch to active state.
+    offset : float or (n_thresholds, ) np.ndarray
+        Samples strictly smaller than `offset` switch to inactive state.
+    initial : bool or (n_thresholds, ) np.ndarray, optional
+        State before the first sample (e.g. final state of previous chunk
+        when processing a stream). Defaults to False (inactive).
+
+    Returns
+    -------
+    active : (n_samples, ) or (n_thresholds, n_samples) np.ndarray
+        Boolean state after each sample. When `onset`, `offset` or `initial`
+        are arrays, all thresholds are processed at once.
+
+    Notes
+    -----
+    This is a vectorized equivalent of the following loop:
+    >>> for i, y_ in enumerate(y):
+    ...     if active:
+    ...         active = not (y_ < offset)
+    ...     else:
+    ...         active = y_ > onset
+    """
+
+    y = np.asarray(y)
+    n_samples = y.shape[-1]
+
+    onset = np.asarray(onset)[..., np.newaxis]
+    offset = np.asarray(offset)[..., np.newaxis]
+    initial = np.asarray(initial, dtype=bool)[..., np.newaxis]
+
+    up = y > onset
+    down = y < offset
+    up, down = np.broadcast_arrays(up, down)
+    shape = np.broadcast(up, initial).shape
+
+    # samples that are either above onset or below offset (but not both)
+    # set the state regardless of the previous one. samples that are both
+    # (only possible when onset < offset) flip the previous state, while
+    # remaining samples (including NaNs) keep it unchanged.
+    decisive = up != down
+    flip = up & down
+
+    # index of the last decisive sample so far (-1 if none)
+    last = np.where(decisive, np.arange(n_samples), -1)
+    last = np.maximum.accumulate(last, axis=-1) if n_samples else last
+    has_last = last > -1
+    last = np.maximum(last, 0)
+
+    base = np.where(has_last, np.take_along_axis(up, last, axis=-1), initial)
+    base = np.broadcast_to(base, shape)
+
+    if not np.any(flip):
+        return base
+
+    n_flips = np.cumsum(flip, axis=-1)
+    n_flips = n_flips - np.where(
+        has_last, np.take_along_axis(n_flips, last, axis=-1), 0)
+    return base ^ (n_flips % 2 == 1)
+
+
+def transitions(active, initial=False):
+    """Get indices of state transitions
+
+    Parameters
+    ----------
+    active : (n_samples, ) np.ndarray
+        Boolean state after each sample (e.g. as returned by `hysteresis`).
+    initial : bool, optional
+        State before the first sample. Defaults to False (inactive).
+
+    Returns
+    -------
+    onsets : np.ndarray
+        Indices of samples switching from inactive to active state.
+    offsets : np.ndarray
+        Indices of samples switching from active to inactive state.
+    """
+
+    active = np.asarray(active, dtype=bool)
+    previous = np.hstack([[bool(initial)], active[:-1]])
+    onsets = np.flatnonzero(active & ~previous)
+    offsets = np.flatnonzero(previous & ~active)
+    return onsets, offsets
+
+
+def _merge(starts, ends, merge):
+    """Merge consecutive segments
+
+    Parameters
+    ----------
+    starts, ends : (n_segments, ) np.ndarray
+        Sorted segments start and end times.
+    merge : (n_segments - 1, ) np.ndarray
+        merge[i] is True when ith and (i+1)th segments should be merged.
+
+    Returns
+    -------
+    starts, ends : np.ndarray
+        Merged segments start and end times.
+    """
+    if len(starts) < 2:
+        return starts, ends
+    first = np.flatnonzero(np.hstack([[True], ~merge]))
+    last = np.hstack([first[1:] - 1, [len(starts) - 1]])
+    return starts[first], ends[last]
+
+
+def middles(sliding_window, indices):
+    """Vectorized equivalent of [sliding_window[i].middle for i in indices]
+
+    Parameters
+    ----------
+    sliding_window : SlidingWindow
+    indices : np.ndarray
+        Frame indices.
+
+    Returns
+    -------
+    middles : np.ndarray
+        Middle time of each frame, in seconds.
+    """
+    start = sliding_window.start + np.asarray(indices) * sliding_window.step
+    return .5 * (start + (start + sliding_window.duration))
+
+
+class _ViterbiGraph(object):
+    """Expanded state graph used by `viterbi`
+
+    Each state k is expanded into a left-to-right chain of min_duration[k]
+    sub-states, so that entering state k implies staying there for at least
+    min_duration[k] frames.
+    """
+
+    def __init__(self, n_states, penalty=0., min_duration=1,
+                 non_speech=None):
+        durations = np.broadcast_to(np.asarray(min_duration, dtype=int),
+                                    (n_states, ))
+        durations = np.maximum(durations, 1)
+
+        self.n_states = n_states
+        self.penalty = penalty
+        self.non_speech = non_speech
+
+        self.state = np.repeat(np.arange(n_states), durations)
+        self.first = np.cumsum(durations) - durations
+        self.last = self.first + durations - 1
+
+        # transitions from/to non-speech are not penalized
+        self.penalties = np.full(n_states, penalty, dtype=np.float64)
+        if non_speech is not None:
+            self.penalties[non_speech] = 0.
+
+        # sub-states reached by moving forward along a chain come from the
+        # previous sub-state
+        self.backpointer = np.arange(len(self.state), dtype=np.int32) - 1
+
+    def step(self, delta, scores, backpointer):
+        """One step of the forward pass
+
+        Parameters
+        ----------
+        delta : (n_sub_states, ) numpy array
+            Best path log-score ending in each sub-state at previous frame.
+        scores : (n_sub_states, ) numpy array
+            Log-scores of current frame, for each sub-state.
+        backpointer : (n_sub_states, ) numpy array
+            Initialized with `self.backpointer`. Updated in place with the
+            previous sub-state of best path.
+
+        Returns
+        -------
+        delta : (n_sub_states, ) numpy array
+            Best path log-score ending in each sub-state at current frame.
+        """
+
+        exit = delta[self.last]
+
+        # with non-negative penalty, leaving a state to enter it again is
+        # never better than staying in it. therefore, the best state to come
+        # from is the same for all (speech) states: no need to look at
+        # every pair of states.
+        penalized = exit - self.penalties
+        source = np.argmax(penalized)
+        entry = penalized[source]
+
+        new_delta = np.empty_like(delta)
+
+        # move forward along each chain...
+        new_delta[1:] = delta[:-1]
+
+        # ... enter a new state...
+        new_delta[self.first] = entry
+        backpointer[self.first] = self.last[source]
+        if self.non_speech is not None:
+            source = np.argmax(exit)
+            new_delta[self.first[self.non_speech]] = exit[source]
+            backpointer[self.first[self.non_speech]] = self.last[source]
+
+        # ... or stay in the same state
+        stay = exit >= new_delta[self.last]
+        new_delta[self.last] = np.maximum(exit, new_delta[self.last])
+        backpointer[self.last[stay]] = self.last[stay]
+
+        new_delta += scores
+        return new_delta
+
+    def forward(self, scores, delta=None):
+        """Forward pass
+
+        Parameters
+        ----------
+        scores : (n_frames, n_states) numpy array
+        delta : (n_sub_states, ) numpy array, optional
+            Output of the forward pass on the previous frames. Defaults to
+            starting a new sequence.
+
+        Returns
+        -------
+        delta : (n_sub_states, ) numpy array
+            Output of the forward pass on the last frame.
+        backpointers : (n_frames, n_sub_states) numpy array
+            backpointers[0] is undefined when starting a new sequence.
+        """
+        scores = np.asarray(scores, dtype=np.float64)[:, self.state]
+        n_frames, n_sub_states = scores.shape
+        backpointers = np.empty((n_frames, n_sub_states), dtype=np.int32)
+        backpointers[:] = self.backpointer
+
+        t = 0
+        if delta is None:
+            # first segment may be shorter than its minimum duration, as it
+            # is cut by the beginning of the sequence
+            delta = scores[0]
+            t = 1
+
+        for t in range(t, n_frames):
+            delta = self.step(delta, scores[t], backpointers[t])
+
+        return delta, backpointers
+
+    @staticmethod
+    def backward(backpointers, sub_state):
+        """Backtracking
+
+        Parameters
+        ----------
+        backpointers : (n_frames, n_sub_states) numpy array
+        sub_state : int
+            Sub-state at last frame.
+
+        Returns
+        -------
+        path : (n_frames, ) numpy array
+            Best sub-state sequence.
+        sub_state : int
+            Sub-state at the frame preceding the first one.
+        """
+        n_frames, _ = backpointers.shape
+        path = np.empty(n_frames, dtype=np.int32)
+        for t in range(n_frames - 1, -1, -1):
+            path[t] = sub_state
+            sub_state = backpointers[t, sub_state]
+        return path, sub_state
+
+
+def viterbi(scores, penalty=0., min_duration=1, non_speech=None,
+            chunk_size=None):
+    """Viterbi decoding of frame-level scores
+
+    Parameters
+    ----------
+    scores : (n_frames, n_states) numpy array
+        Log-scores (e.g. log-probabilities or log-likelihoods).
+    penalty : float, optional
+        Cost of switching from one state to another. Defaults to 0.
+    min_duration : int or (n_states, ) array-like, optional
+        Minimum number of consecutive frames in each state. Defaults to 1.
+        First and last segments may be shorter as they are cut by the
+        sequence boundaries.
+    non_speech : int, optional
+        Index of the non-speech state. Transitions from or to this state are
+        not penalized, i.e. `penalty` only applies to speaker changes.
+    chunk_size : int, optional
+        Decode very long sequences `chunk_size` frames at a time. Results are
+        the same but memory footprint no longer grows with the number of
+        frames, at the cost of running the forward pass twice.
+
+    Returns
+    -------
+    states : (n_frames, ) numpy array
+        Most likely state sequence. When state 0 is non-speech, it can be
+        passed as is to `one_hot_decoding` to get the corresponding annotation
+        (otherwise, use `states + 1`).
+
+    Usage
+    -----
+    >>> y = viterbi(log_probs, penalty=10., min_duration=50, non_speech=0)
+    >>> hypothesis = one_hot_decoding(y, sliding_window, labels=labels)
+    """
+
+    if penalty < 0:
+        raise ValueError('"penalty" must be non-negative.')
+
+    n_frames, n_states = scores.shape
+    if n_frames == 0:
+        return np.zeros((0, ), dtype=np.int64)
+
+    graph = _ViterbiGraph(n_states, penalty=penalty,
+                          min_duration=min_duration, non_speech=non_speech)
+
+    if chunk_size is None or chunk_size >= n_frames:
+        delta, backpointers = graph.forward(scores)
+        path, _ = graph.backward(backpointers, np.argmax(delta))
+        return graph.state[path]
+
+    # forward pass only keeps track of delta at the end of each chunk...
+    starts = np.arange(0, n_frames, chunk_size)
+    deltas = [None]
+    for start in starts[:-1]:
+        delta, _ = graph.forward(scores[start:start + chunk_size],
+                                 delta=deltas[-1])
+        deltas.append(delta)
+
+    # ... so that chunks can then be processed again, from last to first,
+    # this time keeping track of backpointers
+    states = np.empty(n_frames, dtype=np.int64)
+    sub_state = None
+    for start, delta in zip(starts[::-1], deltas[::-1]):
+        chunk = scores[start:start + chunk_size]
+        delta, backpointers = graph.forward(chunk, delta=delta)
+        if sub_state is None:
+            sub_state = np.argmax(delta)
+        path, sub_state = graph.backward(backpointers, sub_state)
+        states[start:start + chunk_size] = graph.state[path]
+
+    return states
+
+
+# local maxima indices, shared by all Peak instances
+_PEAKS_CACHE = LRUCache(maxsize=1024)
+
+
 class Peak(object):
     """Peak detection
 
@@ -61,19 +415,7 @@ class Peak(object):
         self.min_duration = min_duration
         self.log_scale = log_scale
 
-    def apply(self, predictions, dimension=0):
-        """Peak detection
-
-        Parameter
-        ---------
-        predictions : SlidingWindowFeature
-            Predictions returned by segmentation approaches.
-
-        Returns
-        -------
-        segmentation : Timeline
-            Partition.
-        """
+    def _scores(self, predictions, dimension=0):
 
         if len(predictions.data.shape) == 1:
             y = predictions.data
@@ -85,11 +427,29 @@ class Peak(object):
         if self.log_scale:
             y = np.exp(y)
 
-        sw = predictions.sliding_window
+        return y
 
-        precision = sw.step
+    def _peaks(self, y, sliding_window):
+        """Indices of local maxima
+
+        Local maxima only depend on scores and `min_duration` (not on `alpha`)
+        so they are cached, as they are usually needed over and over again
+        (e.g. when looking for the best value of `alpha`)
+        """
+
+        precision = sliding_window.step
         order = max(1, int(np.rint(self.min_duration / precision)))
-        indices = scipy.signal.argrelmax(y, order=order)[0]
+
+        y = np.ascontiguousarray(y)
+        key = (hashlib.sha1(y).digest(), y.dtype.str, y.shape, order)
+        indices = _PEAKS_CACHE.get(key)
+        if indices is None:
+            indices = scipy.signal.argrelmax(y, order=order)[0]
+            indices.flags.writeable = False
+            _PEAKS_CACHE[key] = indices
+        return indices
+
+    def _threshold(self, y, alpha):
 
         if self.scale == 'absolute':
             mini = 0
@@ -103,21 +463,87 @@ class Peak(object):
             mini = np.nanpercentile(y, 1)
             maxi = np.nanpercentile(y, 99)
 
-        threshold = mini + self.alpha * (maxi - mini)
+        return mini + alpha * (maxi - mini)
+
+    def _segmentation(self, sw, n_windows, indices):
 
-        peak_time = np.array([sw[i].middle for i in indices if y[i] > threshold])
+        peak_time = middles(sw, indices)
 
-        n_windows = len(y)
         start_time = sw[0].start
         end_time = sw[n_windows].end
 
         boundaries = np.hstack([[start_time], peak_time, [end_time]])
-        segmentation = Timeline()
-        for i, (start, end) in enumerate(pairwise(boundaries)):
-            segment = Segment(start, end)
-            segmentation.add(segment)
+        starts, ends = boundaries[:-1], boundaries[1:]
+
+        # empty segments would not be added to the timeline anyway
+        keep = (ends - starts) > SEGMENT_PRECISION
+        return Timeline(segments=[Segment(start, end) for start, end
+                                  in zip(starts[keep].tolist(),
+                                         ends[keep].tolist())])
+
+    def apply(self, predictions, dimension=0):
+        """Peak detection
+
+        Parameter
+        ---------
+        predictions : SlidingWindowFeature
+            Predictions returned by segmentation approaches.
+
+        Returns
+        -------
+        segmentation : Timeline
+            Partition.
+        """
+
+        y = self._scores(predictions, dimension=dimension)
+        sw = predictions.sliding_window
+
+        indices = self._peaks(y, sw)
+        threshold = self._threshold(y, self.alpha)
+        indices = indices[y[indices] > threshold]
+
+        return self._segmentation(sw, len(y), indices)
+
+    def apply_batch(self, predictions, alpha, dimension=0):
+        """Peak detection for many files and many thresholds at once
+
+        Local maxima are only looked for once per file, whatever the number
+        of thresholds.
+
+        Parameters
+        ----------
+        predictions : iterable of SlidingWindowFeature
+            Predictions returned by segmentation approaches.
+        alpha : (n_thresholds, ) array-like
+            Adaptative threshold coefficients (overrides `self.alpha`).
+        dimension : int, optional
+            Which dimension to process
+
+        Returns
+        -------
+        segmentations : list of list of Timeline
+            segmentations[f][t] is the partition of fth file obtained with
+            tth threshold.
+        """
+
+        alpha = np.asarray(alpha, dtype=np.float64)
+
+        segmentations = []
+        for prediction in predictions:
 
-        return segmentation
+            y = self._scores(prediction, dimension=dimension)
+            sw = prediction.sliding_window
+
+            indices = self._peaks(y, sw)
+
+            # (n_thresholds, n_peaks) boolean mask
+            threshold = self._threshold(y, alpha)
+            keep = y[indices] > threshold[:, np.newaxis]
+
+            segmentations.append([self._segmentation(sw, len(y), indices[k])
+                                  for k in keep])
+
+        return segmentations
 
 
 class Binarize(object):
@@ -160,15 +586,7 @@ class Binarize(object):
         self.min_duration_on = min_duration_on
         self.min_duration_off = min_duration_off
 
-    def apply(self, predictions, dimension=0):
-        """
-        Parameters
-        ----------
-        predictions : SlidingWindowFeature
-            Must be mono-dimensional
-        dimension : int, optional
-            Which dimension to process
-        """
+    def _scores(self, predictions, dimension=0):
 
         if len(predictions.data.shape) == 1:
             data = predictions.data
@@ -180,13 +598,9 @@ class Binarize(object):
         if self.log_scale:
             data = np.exp(data)
 
-        n_samples = predictions.getNumber()
-        window = predictions.sliding_window
-        timestamps = [window[i].middle for i in range(n_samples)]
+        return data
 
-        # initial state
-        start = timestamps[0]
-        label = data[0] > self.onset
+    def _thresholds(self, data, onset, offset):
 
         if self.scale == 'absolute':
             mini = 0
@@ -200,53 +614,311 @@ class Binarize(object):
             mini = np.nanpercentile(data, 1)
             maxi = np.nanpercentile(data, 99)
 
-        onset = mini + self.onset * (maxi - mini)
-        offset = mini + self.offset * (maxi - mini)
+        onset = mini + onset * (maxi - mini)
+        offset = mini + offset * (maxi - mini)
 
-        # timeline meant to store 'active' segments
-        active = Timeline()
+        return onset, offset
 
-        for t, y in zip(timestamps[1:], data[1:]):
+    def _timeline(self, window, n_samples, label, states):
+        """Build 'active' timeline
 
-            # currently active
-            if label:
-                # switching from active to inactive
-                if y < offset:
-                    segment = Segment(start - self.pad_onset,
-                                      t + self.pad_offset)
-                    active.add(segment)
-                    start = t
-                    label = False
+        Parameters
+        ----------
+        window : SlidingWindow
+        n_samples : int
+            Number of frames.
+        label : bool
+            Initial state.
+        states : (n_samples - 1, ) np.ndarray
+            State of every other frame.
+        """
+
+        # switching from inactive to active (onsets)
+        # and from active to inactive (offsets)
+        onsets, offsets = transitions(states, initial=label)
+        return self._segments(window, n_samples, label,
+                              onsets + 1, offsets + 1)
 
-            # currently inactive
-            else:
-                # switching from inactive to active
-                if y > onset:
-                    start = t
-                    label = True
+    def _segments(self, window, n_samples, label, onsets, offsets):
+        """Build 'active' timeline from state transitions
+
+        Parameters
+        ----------
+        window : SlidingWindow
+        n_samples : int
+            Number of frames.
+        label : bool
+            Initial state.
+        onsets, offsets : np.ndarray
+            Sorted indices of frames switching from inactive to active state
+            (and the other way around).
+        """
 
-        # if active at the end, add final segment
+        # if active at the beginning, first segment starts with first frame
         if label:
-            segment = Segment(start - self.pad_onset, t + self.pad_offset)
-            active.add(segment)
+            onsets = np.hstack([[0], onsets])
+
+        # if active at the end, last segment ends with last frame
+        if len(onsets) > len(offsets):
+            offsets = np.hstack([offsets, [n_samples - 1]])
+
+        # 'active' segments, as (start, end) arrays
+        starts = middles(window, onsets) - self.pad_onset
+        ends = middles(window, offsets) + self.pad_offset
+
+        # NOTE: below operations mimic (and are meant to give the exact same
+        # results as) their Timeline counterparts, on start/end arrays.
+        # segments are sorted and so are their end times (they share the same
+        # padding) so merging consecutive segments boils down to keeping the
+        # start time of the first one and the end time of the last one.
+
+        # empty segments (e.g. because of negative padding) are skipped
+        keep = (ends - starts) > SEGMENT_PRECISION
+        starts, ends = starts[keep], ends[keep]
 
         # because of padding, some 'active' segments might be overlapping
-        # therefore, we merge those overlapping segments
-        active = active.support()
+        # therefore, we merge those overlapping segments (~ Timeline.support)
+        starts, ends = _merge(starts, ends,
+                              starts[1:] - ends[:-1] <= SEGMENT_PRECISION)
 
         # remove short 'active' segments
-        active = Timeline(
-            [s for s in active if s.duration > self.min_duration_on])
+        keep = (ends - starts) > self.min_duration_on
+        starts, ends = starts[keep], ends[keep]
+
+        # fill short 'inactive' segments (~ Timeline.gaps)
+        starts, ends = _merge(starts, ends,
+                              starts[1:] - ends[:-1] < self.min_duration_off)
+
+        return Timeline(segments=[Segment(start, end) for start, end
+                                  in zip(starts.tolist(), ends.tolist())])
+
+    def apply(self, predictions, dimension=0):
+        """
+        Parameters
+        ----------
+        predictions : SlidingWindowFeature
+            Must be mono-dimensional
+        dimension : int, optional
+            Which dimension to process
+        """
+
+        data = self._scores(predictions, dimension=dimension)
+        onset, offset = self._thresholds(data, self.onset, self.offset)
+
+        # initial state
+        label = data[0] > self.onset
+
+        states = hysteresis(data[1:], onset, offset, initial=label)
+
+        return self._timeline(predictions.sliding_window,
+                              predictions.getNumber(), label, states)
+
+    def apply_batch(self, predictions, onset, offset=None, dimension=0):
+        """Binarize many files with many thresholds at once
+
+        Parameters
+        ----------
+        predictions : iterable of SlidingWindowFeature
+            Must be mono-dimensional
+        onset : (n_thresholds, ) array-like
+            Relative onset thresholds (overrides `self.onset`).
+        offset : (n_thresholds, ) array-like, optional
+            Relative offset thresholds (overrides `self.offset`).
+            Defaults to `onset`.
+        dimension : int, optional
+            Which dimension to process
+
+        Returns
+        -------
+        active : list of list of Timeline
+            active[f][t] is the result of binarizing fth file with tth
+            thresholds. It is the same as what `apply` would return with
+            `onset[t]` and `offset[t]`.
+        """
+
+        onset = np.asarray(onset, dtype=np.float64)
+        offset = onset if offset is None \
+                 else np.asarray(offset, dtype=np.float64)
+
+        active = []
+        for prediction in predictions:
+
+            data = self._scores(prediction, dimension=dimension)
+            onset_, offset_ = self._thresholds(data, onset, offset)
 
-        # fill short 'inactive' segments
-        inactive = active.gaps()
-        for s in inactive:
-            if s.duration < self.min_duration_off:
-                active.add(s)
-        active = active.support()
+            # initial state
+            label = data[0] > onset
+
+            window = prediction.sliding_window
+            n_samples = prediction.getNumber()
+
+            crossings = self._crossings(data[1:], onset_, offset_, label)
+            if crossings is not None:
+                active.append([
+                    self._segments(window, n_samples, l, on + 1, off + 1)
+                    for l, (on, off) in zip(label, crossings)])
+                continue
+
+            # (n_thresholds, n_samples - 1) states, in one vectorized pass
+            states = hysteresis(data[1:], onset_, offset_, initial=label)
+
+            active.append([self._timeline(window, n_samples, l, s)
+                           for l, s in zip(label, states)])
 
         return active
 
+    @staticmethod
+    def _crossings(y, onset, offset, initial):
+        """Threshold crossings for many (onset = offset) thresholds at once
+
+        Consecutive samples y[i - 1] and y[i] are on both sides of threshold
+        t when min(y[i - 1], y[i]) <= t < max(y[i - 1], y[i]). Sorting
+        thresholds once makes it possible to find all crossings of all
+        thresholds in time proportional to their number, instead of
+        thresholding every sample with every threshold.
+
+        Parameters
+        ----------
+        y : (n_samples, ) np.ndarray
+            Scores.
+        onset, offset : (n_thresholds, ) np.ndarray
+            Thresholds.
+        initial : (n_thresholds, ) np.ndarray
+            State before the first sample.
+
+        Returns
+        -------
+        crossings : list of (onsets, offsets) tuples
+            Same as `transitions(hysteresis(y, onset[t], offset[t],
+            initial=initial[t]), initial=initial[t])` for every threshold t.
+            None when this shortcut does not apply, i.e. when onset and
+            offset differ, when `y` contains NaNs, or when a threshold is
+            equal to one of the samples (these keep the previous state).
+        """
+
+        n_samples, n_thresholds = len(y), len(onset)
+
+        if n_samples < 1 or np.ndim(onset) != 1 or \
+           not np.array_equal(onset, offset) or \
+           np.any(np.isnan(y)) or np.any(np.isin(onset, y)):
+            return None
+
+        # sorted thresholds
+        order = np.argsort(onset, kind='mergesort')
+        thresholds = onset[order]
+
+        # consecutive samples i - 1 and i are on both sides of thresholds
+        # thresholds[first[i]:last[i]]
+        lower = np.minimum(y[:-1], y[1:])
+        upper = np.maximum(y[:-1], y[1:])
+        first = np.searchsorted(thresholds, lower, side='left')
+        last = np.searchsorted(thresholds, upper, side='left')
+
+        # all (threshold, sample) crossings, grouped by threshold
+        counts = last - first
+        sample = np.repeat(np.arange(1, n_samples), counts)
+        threshold = np.repeat(first - np.cumsum(counts) + counts, counts) + \
+                    np.arange(len(sample))
+        by_threshold = np.argsort(threshold, kind='mergesort')
+        sample = sample[by_threshold]
+        bounds = np.searchsorted(threshold[by_threshold],
+                                 np.arange(n_thresholds + 1))
+
+        # crossings are onsets when scores increase
+        rising = y[sample] > y[sample - 1]
+
+        crossings = [None] * n_thresholds
+        for k, t in enumerate(order):
+
+            samples = sample[bounds[k]:bounds[k + 1]]
+            onsets = samples[rising[bounds[k]:bounds[k + 1]]]
+            offsets = samples[~rising[bounds[k]:bounds[k + 1]]]
+
+            # first sample is compared to initial state
+            if y[0] > onset[t] and not initial[t]:
+                onsets = np.hstack([[0], onsets])
+            elif y[0] < onset[t] and initial[t]:
+                offsets = np.hstack([[0], offsets])
+
+            crossings[t] = (onsets, offsets)
+
+        return crossings
+
+
+def _fit_gmm(data, n_components=128, n_iter=10):
+    """Train a diagonal GMM with k-means initialization
+
+    Returns
+    -------
+    weights : (n_components, ) numpy array
+    means, covariances : (n_components, dimension) numpy arrays
+    """
+    gmm = GaussianMixture(n_components=n_components,
+                          covariance_type='diag',
+                          tol=0.001, reg_covar=1e-06,
+                          max_iter=n_iter, n_init=1,
+                          init_params='kmeans',
+                          weights_init=None,
+                          means_init=None,
+                          precisions_init=None,
+                          random_state=None,
+                          warm_start=False,
+                          verbose=0,
+                          verbose_interval=10).fit(data)
+    return gmm.weights_, gmm.means_, gmm.covariances_
+
+
+def _log_gaussians(X, means, covariances):
+    """Log-likelihood of X under each diagonal Gaussian
+
+    Parameters
+    ----------
+    X : (n_samples, dimension) numpy array
+    means, covariances : (n_components, dimension) numpy arrays
+
+    Returns
+    -------
+    log_prob : (n_samples, n_components) numpy array
+    """
+    precisions = 1. / covariances
+    _, dimension = means.shape
+    constant = -.5 * (dimension * np.log(2 * np.pi) +
+                      np.sum(np.log(covariances), axis=1) +
+                      np.sum(means ** 2 * precisions, axis=1))
+    # (x - m)^2 / c = x^2 / c - 2 x m / c + m^2 / c, as matrix products
+    return constant + X @ (means * precisions).T \
+                    - .5 * (X ** 2) @ precisions.T
+
+
+def _map_adapt(data, weights, means, covariances, relevance_factor=16.):
+    """MAP adaptation of UBM means to data
+
+    Parameters
+    ----------
+    data : (n_samples, dimension) numpy array
+    weights : (n_components, ) numpy array
+    means, covariances : (n_components, dimension) numpy arrays
+        Universal background model.
+    relevance_factor : float, optional
+        Defaults to 16.
+
+    Returns
+    -------
+    means : (n_components, dimension) numpy array
+        Adapted means.
+    """
+    log_prob = _log_gaussians(data, means, covariances) + np.log(weights)
+    log_prob -= scipy.special.logsumexp(log_prob, axis=1, keepdims=True)
+    posteriors = np.exp(log_prob)
+
+    # zeroth and first order statistics
+    n = np.sum(posteriors, axis=0)
+    f = posteriors.T @ data
+
+    alpha = (n / (n + relevance_factor))[:, np.newaxis]
+    return alpha * f / np.maximum(n, 1e-10)[:, np.newaxis] + \
+           (1. - alpha) * means
+
 
 class GMMResegmentation(object):
     """
@@ -258,6 +930,26 @@ class GMMResegmentation(object):
         Number of EM iterations to train the models. Defaults to 10.
     window : float, optional
         Duration of the smoothing window. Defaults to 1 second.
+    ubm : bool, optional
+        Train one universal background model on the whole speech of the file
+        and derive each label model from it by MAP adaptation of its means.
+        Defaults to training one model per label from scratch (with k-means
+        initialization).
+    relevance_factor : float, optional
+        MAP adaptation relevance factor. Defaults to 16. Has no effect unless
+        `ubm` is True.
+    n_jobs : int, optional
+        Number of processes used to train per-label models in parallel.
+        Defaults to 1. Has no effect when `ubm` is True.
+    block_size : int, optional
+        Number of frames scored at once. Defaults to 10000.
+    penalty : float, optional
+        When provided, use Viterbi decoding with this speaker change penalty
+        (in log-likelihood units) instead of smoothing log-likelihoods over a
+        `window`-long sliding window.
+    min_duration : float, optional
+        Minimum speech turn duration, in seconds, used by Viterbi decoding.
+        Defaults to 0. Has no effect unless `penalty` is provided.
 
     Note
     ----
@@ -271,12 +963,81 @@ class GMMResegmentation(object):
     TODO: add option to also resegment speech/non-speech
 
     """
-    def __init__(self, n_components=128, n_iter=10, window=1.):
+    def __init__(self, n_components=128, n_iter=10, window=1., ubm=False,
+                 relevance_factor=16., n_jobs=1, block_size=10000,
+                 penalty=None, min_duration=0.):
         super().__init__()
         self.n_components = n_components
         self.n_iter = n_iter
         self.window = window
+        self.ubm = ubm
+        self.relevance_factor = relevance_factor
+        self.n_jobs = n_jobs
+        self.block_size = block_size
+        self.penalty = penalty
+        self.min_duration = min_duration
+
+    def _models(self, annotation, features, labels):
+        """Train one GMM per label
+
+        Returns
+        -------
+        weights : (n_labels, n_components) numpy array
+        means, covariances : (n_labels, n_components, dimension) numpy arrays
+        """
+
+        # gather all features for each label
+        data = [features.crop(annotation.label_timeline(label), mode='center')
+                for label in labels]
+
+        if self.ubm:
+            speech = annotation.get_timeline().support()
+            weights, means, covariances = _fit_gmm(
+                features.crop(speech, mode='center'),
+                n_components=self.n_components, n_iter=self.n_iter)
+            models = [(weights,
+                       _map_adapt(d, weights, means, covariances,
+                                  relevance_factor=self.relevance_factor),
+                       covariances) for d in data]
+
+        elif self.n_jobs > 1:
+            with mp.Pool(min(self.n_jobs, len(labels))) as pool:
+                models = pool.starmap(
+                    _fit_gmm, [(d, self.n_components, self.n_iter)
+                               for d in data])
+
+        else:
+            models = [_fit_gmm(d, n_components=self.n_components,
+                               n_iter=self.n_iter) for d in data]
 
+        weights, means, covariances = zip(*models)
+        return np.stack(weights), np.stack(means), np.stack(covariances)
+
+    def _score(self, X, weights, means, covariances):
+        """Log-likelihood of every frame under every label model
+
+        Returns
+        -------
+        log_probs : (n_labels, n_samples) numpy array
+        """
+
+        n_labels, n_components, dimension = means.shape
+
+        # all components of all models are scored at once
+        means = means.reshape(-1, dimension)
+        covariances = covariances.reshape(-1, dimension)
+        log_weights = np.log(weights)
+
+        n_samples, _ = X.shape
+        log_probs = np.empty((n_labels, n_samples))
+        for i in range(0, n_samples, self.block_size):
+            block = X[i:i + self.block_size]
+            log_prob = _log_gaussians(block, means, covariances)
+            log_prob = log_prob.reshape(len(block), n_labels, n_components)
+            log_probs[:, i:i + self.block_size] = scipy.special.logsumexp(
+                log_prob + log_weights, axis=2).T
+
+        return log_probs
 
     def apply(self, annotation, features):
         """
@@ -296,45 +1057,33 @@ class GMMResegmentation(object):
         """
 
         sliding_window = features.sliding_window
-        window = np.ones((1, sliding_window.samples(self.window)))
 
-        log_probs = []
         labels = annotation.labels()
 
-        # FIXME: embarrasingly parallel
-        for label in labels:
-
-            # gather all features for current label
-            span = annotation.label_timeline(label)
-            data = features.crop(span, mode='center')
-
-            # train a GMM
-            gmm = GaussianMixture(n_components=self.n_components,
-                                  covariance_type='diag',
-                                  tol=0.001, reg_covar=1e-06,
-                                  max_iter=self.n_iter, n_init=1,
-                                  init_params='kmeans',
-                                  weights_init=None,
-                                  means_init=None,
-                                  precisions_init=None,
-                                  random_state=None,
-                                  warm_start=False,
-                                  verbose=0,
-                                  verbose_interval=10).fit(data)
-
-            # compute log-probability across the whole file
-            log_prob = gmm.score_samples(features.data)
-            log_probs.append(log_prob)
-
-        # smooth log-probability using a sliding window
-        log_probs = scipy.signal.convolve(np.vstack(log_probs),
-                                          window, mode='same')
-
-        # assign each frame to the most likely label
-        y = np.argmax(log_probs, axis=0)
-
-        # reconstruct the annotation
-        hypothesis = one_hot_decoding(y, sliding_window, labels=labels)
+        # train one model per label
+        weights, means, covariances = self._models(annotation, features,
+                                                   labels)
+
+        # compute log-probability across the whole file
+        log_probs = self._score(features.data, weights, means, covariances)
+
+        if self.penalty is None:
+
+            # smooth log-probability using a sliding window
+            window = np.ones((1, sliding_window.samples(self.window)))
+            log_probs = scipy.signal.convolve(log_probs, window, mode='same')
+
+            # assign each frame to the most likely label
+            y = np.argmax(log_probs, axis=0)
+
+        else:
+            min_duration = int(np.rint(self.min_duration /
+                                       sliding_window.step))
+            y = viterbi(log_probs.T, penalty=self.penalty,
+                        min_duration=min_duration)
+
+        # reconstruct the annotation (one_hot_decoding expects 0 for "no label")
+        hypothesis = one_hot_decoding(y + 1, sliding_window, labels=labels)
 
         # remove original non-speech regions
         return hypothesis.crop(annotation.get_timeline().support())
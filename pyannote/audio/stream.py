@@ -26,10 +26,13 @@
 # AUTHORS
 # Hervé BREDIN - http://herve.niderb.fr
 
+import time
 import dask
 import numpy as np
+import scipy.signal
 from .features.utils import read_audio
-from pyannote.core import Segment, Timeline
+from .signal import hysteresis, transitions, middles
+from pyannote.core import Segment, Timeline, Annotation
 from pyannote.core import SlidingWindow, SlidingWindowFeature
 
 
@@ -69,7 +72,8 @@ def stream_audio(current_file, sample_rate=None, mono=True, duration=1.):
     Notes
     -----
     In case `current_file` contains a `channel` key, data of this (1-indexed)
-    channel will be yielded.
+    channel will be yielded. Otherwise, when `mono` is False, yielded data is
+    (n_samples, n_channels). Use `StreamSplit` to process channels separately.
 
     """
 
@@ -80,8 +84,11 @@ def stream_audio(current_file, sample_rate=None, mono=True, duration=1.):
     n_samples_total = len(y)
     n_samples_buffer = int(duration * sample_rate)
 
+    if y.ndim == 1:
+        y = y[:, np.newaxis]
+
     for i in range(0, n_samples_total, n_samples_buffer):
-        data = y[i: i + n_samples_buffer, np.newaxis]
+        data = y[i: i + n_samples_buffer]
         sw = SlidingWindow(start=i / sample_rate,
                            duration=1 / sample_rate,
                            step=1 / sample_rate)
@@ -91,7 +98,8 @@ def stream_audio(current_file, sample_rate=None, mono=True, duration=1.):
         yield Stream.EndOfStream
 
 
-def stream_features(feature_extraction, current_file, duration=1.):
+def stream_features(feature_extraction, current_file, duration=1.,
+                    channels=None):
     """Simulate online feature extraction
 
     Parameters
@@ -102,11 +110,15 @@ def stream_features(feature_extraction, current_file, duration=1.):
         Dictionary given by pyannote.database.
     duration : float, optional
         Buffer duration, in seconds. Defaults to 1.
+    channels : iterable, optional
+        Extract features from these (1-indexed) channels, separately.
+        Defaults to extracting features from `current_file` as is.
 
     Returns
     -------
     buffer : iterable
-        Yields SlidingWindowFeature instances
+        Yields SlidingWindowFeature instances. When `channels` is provided,
+        data is (n_samples, n_channels, n_features).
 
     Usage
     -----
@@ -115,9 +127,17 @@ def stream_features(feature_extraction, current_file, duration=1.):
 
     """
 
-    features = feature_extraction(current_file)
+    if channels is None:
+        features = feature_extraction(current_file)
+        data = features.data
+
+    else:
+        features = [feature_extraction(dict(current_file, channel=channel))
+                    for channel in channels]
+        data = np.stack([f.data for f in features], axis=1)
+        features = features[0]
+
     sliding_window = features.sliding_window
-    data = features.data
 
     n_samples_total = len(data)
     n_samples_buffer = sliding_window.samples(duration, mode='center')
@@ -154,6 +174,11 @@ class StreamBuffer(object):
         self.incomplete = incomplete
         self.initialized_ = False
 
+    @property
+    def delay(self):
+        """Algorithmic delay (in seconds) added by this module"""
+        return self.duration
+
     def initialize(self, sequence):
 
         # common time base
@@ -320,16 +345,16 @@ class StreamBinarize(object):
         if not self.initialized_:
             self.initialize(sequence)
 
-        sw = sequence.sliding_window
-        binarized = np.NAN * np.ones(sequence.data.shape, dtype=np.bool)
-        for i, y in enumerate(sequence.data):
-            if self.active_:
-                self.active_ = ~(y < self.offset)
-            else:
-                self.active_ = y > self.onset
-            binarized[i] = self.active_
+        # each dimension is thresholded independently (hysteresis expects
+        # time as last axis)
+        binarized = hysteresis(sequence.data.T, self.onset, self.offset,
+                               initial=self.active_).T
+
+        # carry (per dimension) state over to next chunk
+        if len(binarized):
+            self.active_ = binarized[-1]
 
-        return SlidingWindowFeature(binarized, sw)
+        return SlidingWindowFeature(binarized, sequence.sliding_window)
 
 
 class StreamToTimeline(object):
@@ -347,31 +372,405 @@ class StreamToTimeline(object):
         if sequence in [Stream.EndOfStream, Stream.NoNewData]:
             return sequence
 
+        data = np.asarray(sequence.data, dtype=bool)
+        if data.ndim > 1:
+            if data.shape[1] != 1:
+                msg = (f'StreamToTimeline only supports one-dimensional '
+                       f'sequences (got {data.shape[1]} dimensions).')
+                raise ValueError(msg)
+            data = data[:, 0]
+        sw = sequence.sliding_window
+
+        onsets, offsets = transitions(data, initial=data[0])
+        if data[0]:
+            onsets = np.hstack([[0], onsets])
+        if data[-1]:
+            offsets = np.hstack([offsets, [len(data) - 1]])
+
+        timeline = Timeline()
+        timeline.start = sw[0].middle
+
+        for start, end in zip(middles(sw, onsets), middles(sw, offsets)):
+            timeline.add(Segment(start, end))
+
+        timeline.end = sw[len(data) - 1].middle
+
+        return timeline
+
+
+class _Reservoir(object):
+    """Fixed-size uniform sample of a (possibly infinite) stream of values
+
+    Used to estimate percentiles of a stream with bounded memory.
+
+    Parameters
+    ----------
+    size : int, optional
+        Reservoir size. Defaults to 10000.
+    """
+
+    def __init__(self, size=10000):
+        super(_Reservoir, self).__init__()
+        self.size = size
+        self.data_ = np.empty((size, ), dtype=np.float64)
+        self.n_seen_ = 0
+
+    def update(self, values):
+
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+
+        # fill reservoir first
+        n_free = max(0, self.size - self.n_seen_)
+        n_fill = min(n_free, len(values))
+        self.data_[self.n_seen_:self.n_seen_ + n_fill] = values[:n_fill]
+        self.n_seen_ += n_fill
+        values = values[n_fill:]
+
+        # t-th value replaces a random one with probability size / t
+        if len(values):
+            t = self.n_seen_ + np.arange(1, len(values) + 1)
+            j = (np.random.rand(len(values)) * t).astype(np.int64)
+            keep = j < self.size
+            self.data_[j[keep]] = values[keep]
+            self.n_seen_ += len(values)
+
+    def percentile(self, q):
+        n = min(self.n_seen_, self.size)
+        if n == 0:
+            return np.NAN
+        return np.percentile(self.data_[:n], q)
+
+
+class StreamPeak(object):
+    """This module detects peaks in input score sequence
+
+    Online counterpart of `pyannote.audio.signal.Peak`: local maxima are
+    confirmed as soon as `min_duration` seconds of look-ahead are available,
+    hence change points are emitted with a delay bounded by `min_duration`.
+
+    Parameters
+    ----------
+    alpha : float, optional
+        Adaptative threshold coefficient. Defaults to 0.5
+    min_duration : float, optional
+        Defaults to 1 second.
+    scale : {'absolute', 'relative', 'percentile'}
+        Set to 'relative' to make threshold relative to min/max of scores
+        observed so far. Set to 'percentile' to make it relative to (streaming
+        estimates of) 1% and 99% percentiles. Defaults to 'absolute'.
+    log_scale : bool, optional
+        Set to True to indicate that scores are log scaled.
+        Defaults to False.
+    dimension : int, optional
+        Which dimension to process. Defaults to 0.
+
+    Returns
+    -------
+    segmentation : Timeline
+        Segments ending at newly confirmed peaks (and, on "end-of-stream",
+        the final segment ending at the end of the stream).
+    """
+
+    def __init__(self, alpha=0.5, min_duration=1.0, scale='absolute',
+                 log_scale=False, dimension=0):
+        super(StreamPeak, self).__init__()
+        self.alpha = alpha
+        self.min_duration = min_duration
+        self.scale = scale
+        self.log_scale = log_scale
+        self.dimension = dimension
+        self.initialized_ = False
+
+    @property
+    def delay(self):
+        """Algorithmic delay (in seconds) added by this module"""
+        return self.min_duration
+
+    def initialize(self, sequence):
+
+        # common time base
+        sw = sequence.sliding_window
+        self.frames_ = SlidingWindow(start=sw.start,
+                                     duration=sw.duration,
+                                     step=sw.step)
+        self.order_ = max(1, int(np.rint(self.min_duration / sw.step)))
+
+        # scores of (global) frames [buffer_start_, n_samples_[
+        self.buffer_ = np.empty((0, ))
+        self.buffer_start_ = 0
+        self.n_samples_ = 0
+
+        # index of first frame that has not been checked for peak yet
+        self.next_ = 0
+
+        # time of last boundary
+        self.boundary_ = sw[0].start
+
+        self.mini_ = np.inf
+        self.maxi_ = -np.inf
+        if self.scale == 'percentile':
+            self.reservoir_ = _Reservoir()
+
+        self.initialized_ = True
+
+    def _threshold(self):
+
+        if self.scale == 'absolute':
+            mini = 0
+            maxi = 1
+
+        elif self.scale == 'relative':
+            mini = self.mini_
+            maxi = self.maxi_
+
+        elif self.scale == 'percentile':
+            mini = self.reservoir_.percentile(1)
+            maxi = self.reservoir_.percentile(99)
+
+        return mini + self.alpha * (maxi - mini)
+
+    def _peaks(self, final=False):
+        """Detect peaks among frames whose look-ahead is complete"""
+
+        # local maxima within buffer (global index 0 has no left context:
+        # it is handled the same way by argrelmax clipping)
+        indices = scipy.signal.argrelmax(self.buffer_, order=self.order_)[0]
+        indices = indices + self.buffer_start_
+
+        last = self.n_samples_ if final else self.n_samples_ - self.order_
+        indices = indices[(indices >= self.next_) & (indices < last)]
+        self.next_ = max(self.next_, last)
+
+        y = self.buffer_[indices - self.buffer_start_]
+        indices = indices[y > self._threshold()]
+
+        # only keep what is needed to check remaining frames
+        first = max(0, self.next_ - self.order_)
+        self.buffer_ = self.buffer_[first - self.buffer_start_:]
+        self.buffer_start_ = first
+
+        return indices
+
+    def _segmentation(self, boundaries):
+
+        segmentation = Timeline()
+        for end in boundaries:
+            segmentation.add(Segment(self.boundary_, end))
+            self.boundary_ = end
+        return segmentation
+
+    def __call__(self, sequence=Stream.NoNewData):
+
+        if isinstance(sequence, More):
+            sequence = sequence.output
+
+        if sequence is Stream.NoNewData:
+            return Stream.NoNewData
+
+        if sequence is Stream.EndOfStream:
+
+            if not self.initialized_:
+                return Stream.EndOfStream
+            self.initialized_ = False
+
+            peak_time = middles(self.frames_, self._peaks(final=True))
+            end_time = self.frames_[self.n_samples_].end
+            return self._segmentation(np.hstack([peak_time, [end_time]]))
+
+        if not self.initialized_:
+            self.initialize(sequence)
+
+        # check that feature sequence uses the common time base
+        sw = sequence.sliding_window
+        assert sw.duration == self.frames_.duration
+        assert sw.step == self.frames_.step
+
+        # check that first frame is exactly the one that is expected
+        expected = self.frames_[self.n_samples_]
+        assert np.isclose(expected.start, sw[0].start)
+        assert np.isclose(expected.end, sw[0].end)
+
         data = sequence.data
-        active = data[0]
+        if len(data.shape) == 1:
+            y = data
+        elif data.shape[1] == 1:
+            y = data[:, 0]
+        else:
+            y = data[:, self.dimension]
+
+        if self.log_scale:
+            y = np.exp(y)
+
+        if self.scale == 'relative' and len(y):
+            self.mini_ = min(self.mini_, np.nanmin(y))
+            self.maxi_ = max(self.maxi_, np.nanmax(y))
+        elif self.scale == 'percentile':
+            self.reservoir_.update(y)
 
+        self.buffer_ = np.hstack([self.buffer_, y])
+        self.n_samples_ += len(y)
+
+        indices = self._peaks()
+        if len(indices) == 0:
+            return Stream.NoNewData
+
+        return self._segmentation(middles(self.frames_, indices))
+
+
+class StreamSpeakerDiarization(object):
+    """This module assigns incoming speech turns to speakers
+
+    Parameters
+    ----------
+    diarization : `pyannote.audio.pipeline.OnlineSpeakerDiarization`
+        Instantiated online speaker diarization pipeline.
+
+    Usage
+    -----
+    This module expects two inputs: speech turns (`Timeline` instances, e.g.
+    as returned by `StreamPeak` or `StreamToTimeline`) and embeddings
+    (`SlidingWindowFeature` instances). Speech turns are assigned as soon as
+    embeddings covering them are available.
+
+    >>> dsk = {..., 'diarization': (StreamSpeakerDiarization(pipeline),
+    ...                             'speech_turns', 'embedding')}
+
+    Returns
+    -------
+    diarization : `Annotation`
+        Newly assigned speech turns.
+    """
+
+    def __init__(self, diarization):
+        super(StreamSpeakerDiarization, self).__init__()
+        self.diarization = diarization
+        self.initialized_ = False
+
+    def initialize(self):
+        self.diarization.reset()
+        self.pending_ = []
+        self.last_ = -np.inf
+        self.frames_ = None
+        self.buffer_ = None
+        self.eos_turns_ = False
+        self.eos_embedding_ = False
+        self.n_skipped_ = 0
+        self.initialized_ = True
+
+    def _append(self, sequence):
+
+        if self.frames_ is None:
+            sw = sequence.sliding_window
+            self.frames_ = SlidingWindow(start=sw.start,
+                                         duration=sw.duration,
+                                         step=sw.step)
+            self.buffer_ = np.array(sequence.data)
+            return
+
+        # check that embedding sequence uses the common time base
         sw = sequence.sliding_window
-        start = sw[0].middle
+        assert sw.duration == self.frames_.duration
+        assert sw.step == self.frames_.step
 
-        timeline = Timeline()
-        timeline.start = start
+        # check that first window is exactly the one that is expected
+        expected = self.frames_[len(self.buffer_)]
+        assert np.isclose(expected.start, sw[0].start)
+        assert np.isclose(expected.end, sw[0].end)
+
+        self.buffer_ = np.concatenate([self.buffer_, sequence.data], axis=0)
+
+    def _assign(self):
+
+        assigned = Annotation()
+
+        while self.pending_:
+
+            segment = self.pending_[0]
+
+            # wait for embeddings covering the whole speech turn
+            if not self.eos_embedding_:
+                if self.frames_ is None:
+                    break
+                last = self.frames_[len(self.buffer_) - 1]
+                if last.end < segment.end:
+                    break
+
+            self.pending_.pop(0)
+            self.last_ = segment.end
+
+            x = []
+            if self.frames_ is not None:
+                embedding = SlidingWindowFeature(self.buffer_, self.frames_)
+
+                # be more and more permissive until we have
+                # at least one embedding for current speech turn
+                for mode in ['strict', 'center', 'loose']:
+                    x = embedding.crop(segment, mode=mode)
+                    if len(x) > 0:
+                        break
+
+            # speech turns so small we don't have any embedding for them
+            # are mapped to their own speaker (between -1 and -N_SKIPPED)
+            if len(x) < 1:
+                self.n_skipped_ += 1
+                assigned[segment] = -self.n_skipped_
+                continue
+
+            assigned[segment] = self.diarization.update(
+                np.mean(x, axis=0), weight=segment.duration)
+
+        # forget about embeddings that cannot overlap upcoming speech turns
+        # (speech turns are expected to come in chronological order)
+        if self.frames_ is not None:
+            start = self.pending_[0].start if self.pending_ else self.last_
+            first = 0
+            while first < len(self.buffer_) and \
+                  self.frames_[first].end < start:
+                first += 1
+            self.buffer_ = self.buffer_[first:]
+            self.frames_ = SlidingWindow(start=self.frames_[first].start,
+                                         duration=self.frames_.duration,
+                                         step=self.frames_.step)
+
+        if not assigned:
+            return Stream.NoNewData
+        return assigned
 
-        for i, y in enumerate(data):
-            if active and not y:
-                segment = Segment(start, sw[i].middle)
-                timeline.add(segment)
-                active = False
-            elif not active and y:
-                active = True
-                start = sw[i].middle
+    def __call__(self, speech_turns=Stream.NoNewData,
+                       embedding=Stream.NoNewData):
 
-        if active:
-            segment = Segment(start, sw[i].middle)
-            timeline.add(segment)
+        if isinstance(speech_turns, More):
+            speech_turns = speech_turns.output
 
-        timeline.end = sw[i].middle
+        if isinstance(embedding, More):
+            embedding = embedding.output
 
-        return timeline
+        if not self.initialized_:
+            if speech_turns is Stream.EndOfStream and \
+               embedding is Stream.EndOfStream:
+                return Stream.EndOfStream
+            self.initialize()
+
+        if speech_turns is Stream.EndOfStream:
+            self.eos_turns_ = True
+        elif speech_turns is not Stream.NoNewData:
+            self.pending_.extend(speech_turns)
+
+        if embedding is Stream.EndOfStream:
+            self.eos_embedding_ = True
+        elif embedding is not Stream.NoNewData:
+            self._append(embedding)
+
+        output = self._assign()
+
+        # both input streams have ended and all speech turns were assigned
+        if self.eos_turns_ and self.eos_embedding_ and not self.pending_:
+            self.initialized_ = False
+            if output is Stream.NoNewData:
+                return Stream.EndOfStream
+
+        return output
 
 
 class StreamAggregate(object):
@@ -463,6 +862,51 @@ class StreamAggregate(object):
         return output
 
 
+class StreamSplit(object):
+    """This module extracts one channel of multi-channel sequences
+
+    Parameters
+    ----------
+    channel : int
+        Channel (1-indexed, as `current_file['channel']`).
+
+    Usage
+    -----
+    Multi-channel sequences are (n_samples, n_channels, ...) arrays. Process
+    them jointly for as long as possible (e.g. `StreamPredict` uses channels
+    as batch dimension, hence one model call per window for all channels) and
+    only then split them into as many streams as there are channels:
+
+    >>> dsk = {'buffer': (StreamBuffer(duration=3.2, step=0.8), 'input'),
+    ...        'predict': (StreamPredict(model), 'buffer'),
+    ...        'aggregate': (StreamAggregate(), 'predict')}
+    >>> for c in [1, 2]:
+    ...     dsk[f'split_{c}'] = (StreamSplit(c), 'aggregate')
+    ...     dsk[f'binarize_{c}'] = (StreamBinarize(), f'split_{c}')
+    ...     dsk[f'timeline_{c}'] = (StreamToTimeline(), f'binarize_{c}')
+    >>> pipeline = Pipeline(dsk)
+    >>> for outputs in pipeline(stream_features(feature_extraction,
+    ...                                         current_file,
+    ...                                         channels=[1, 2])):
+    ...     do_something_with(outputs['timeline_1'], outputs['timeline_2'])
+    """
+
+    def __init__(self, channel):
+        super(StreamSplit, self).__init__()
+        self.channel = channel
+
+    def __call__(self, sequence=Stream.NoNewData):
+
+        if isinstance(sequence, More):
+            sequence = sequence.output
+
+        if sequence in [Stream.NoNewData, Stream.EndOfStream]:
+            return sequence
+
+        return SlidingWindowFeature(sequence.data[:, self.channel - 1],
+                                    sequence.sliding_window)
+
+
 class StreamPassthrough(object):
 
     def __init__(self):
@@ -510,11 +954,22 @@ class StreamPredict(object):
         if sequence in [Stream.NoNewData, Stream.EndOfStream]:
             return sequence
 
-        X = sequence.data[np.newaxis, :, :]
+        data = sequence.data
 
-        predicted = self.model.predict(X, batch_size=1)[0, :, :]
-        if self.dimension is not None:
-            predicted = predicted[:, self.dimension]
+        # multi-channel sequences (n_samples, n_channels, n_features)
+        # are processed in one single pass using channels as batch dimension
+        if data.ndim == 3:
+            X = np.swapaxes(data, 0, 1)
+            predicted = self.model.predict(X, batch_size=len(X))
+            predicted = np.swapaxes(predicted, 0, 1)
+            if self.dimension is not None:
+                predicted = predicted[:, :, self.dimension]
+
+        else:
+            X = data[np.newaxis, :, :]
+            predicted = self.model.predict(X, batch_size=1)[0, :, :]
+            if self.dimension is not None:
+                predicted = predicted[:, self.dimension]
 
         return SlidingWindowFeature(predicted, sequence.sliding_window)
 
@@ -558,11 +1013,185 @@ class StreamEmbed(object):
         # return SlidingWindowFeature(data, ew)
 
 
+class StreamStats(object):
+    """In-memory statistics about stream modules
+
+    Collects number of calls and wall time histogram of each module, as well
+    as gauges (e.g. number of buffered samples, algorithmic delay, real-time
+    factor) reported by `Pipeline`.
+
+    Parameters
+    ----------
+    buckets : iterable, optional
+        Upper bounds (in seconds) of wall time histogram buckets.
+        Defaults to logarithmically spaced buckets between 100µs and 10s.
+
+    Usage
+    -----
+    >>> stats = StreamStats()
+    >>> pipeline = Pipeline(dsk, stats=stats)
+    >>> for outputs in pipeline(stream_audio(current_file)):
+    ...     pass
+    >>> print(stats.to_prometheus())
+    """
+
+    def __init__(self, buckets=None):
+        super(StreamStats, self).__init__()
+        if buckets is None:
+            buckets = np.logspace(-4, 1, num=11)
+        self.buckets = np.array(sorted(buckets))
+        self.calls_ = dict()
+        self.wall_time_ = dict()
+        self.histogram_ = dict()
+        self.gauges_ = dict()
+
+    def observe(self, module, wall_time):
+        """Record one call to `module` that took `wall_time` seconds"""
+        if module not in self.calls_:
+            self.calls_[module] = 0
+            self.wall_time_[module] = 0.
+            self.histogram_[module] = np.zeros(len(self.buckets) + 1,
+                                               dtype=np.int64)
+        self.calls_[module] += 1
+        self.wall_time_[module] += wall_time
+        bucket = np.searchsorted(self.buckets, wall_time, side='left')
+        self.histogram_[module][bucket] += 1
+
+    def gauge(self, module, name, value):
+        """Record current `value` of `module`'s `name` gauge"""
+        self.gauges_.setdefault(module, dict())[name] = value
+
+    def to_prometheus(self, prefix='pyannote_stream'):
+        """Dump statistics using Prometheus text exposition format
+
+        Parameters
+        ----------
+        prefix : str, optional
+            Metric name prefix. Defaults to 'pyannote_stream'.
+
+        Returns
+        -------
+        text : str
+        """
+
+        lines = []
+
+        name = f'{prefix}_wall_time_seconds'
+        lines.append(f'# TYPE {name} histogram')
+        for module in sorted(self.calls_):
+            counts = np.cumsum(self.histogram_[module])
+            for le, count in zip(self.buckets, counts):
+                lines.append(
+                    f'{name}_bucket{{module="{module}",le="{le:g}"}} {count}')
+            lines.append(
+                f'{name}_bucket{{module="{module}",le="+Inf"}} {counts[-1]}')
+            lines.append(
+                f'{name}_sum{{module="{module}"}} {self.wall_time_[module]:g}')
+            lines.append(
+                f'{name}_count{{module="{module}"}} {self.calls_[module]}')
+
+        names = sorted(set(n for g in self.gauges_.values() for n in g))
+        for gauge in names:
+            name = f'{prefix}_{gauge}'
+            lines.append(f'# TYPE {name} gauge')
+            for module in sorted(self.gauges_):
+                if gauge in self.gauges_[module]:
+                    value = self.gauges_[module][gauge]
+                    lines.append(f'{name}{{module="{module}"}} {value:g}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class TensorboardStats(object):
+    """Send statistics about stream modules to tensorboard
+
+    Parameters
+    ----------
+    writer : tensorboardX.SummaryWriter
+        Tensorboard writer.
+    """
+
+    def __init__(self, writer):
+        super(TensorboardStats, self).__init__()
+        self.writer = writer
+        self.steps_ = dict()
+
+    def _step(self, tag):
+        step = self.steps_.get(tag, 0)
+        self.steps_[tag] = step + 1
+        return step
+
+    def observe(self, module, wall_time):
+        tag = f'stream/{module}/wall_time'
+        self.writer.add_scalar(tag, wall_time, global_step=self._step(tag))
+
+    def gauge(self, module, name, value):
+        tag = f'stream/{module}/{name}'
+        self.writer.add_scalar(tag, value, global_step=self._step(tag))
+
+
+def _buffered(module):
+    """Number of samples currently buffered by `module`"""
+
+    if not getattr(module, 'initialized_', False):
+        return 0
+
+    buffer_ = getattr(module, 'buffer_', None)
+    if buffer_ is None:
+        return 0
+
+    # StreamAggregate buffers are (n_sequences, n_samples, ...)
+    if isinstance(module, StreamAggregate):
+        return buffer_.shape[1]
+
+    return len(buffer_)
+
+
+class _Instrumented(object):
+    """Wrap stream module to report its statistics"""
+
+    def __init__(self, module, name, stats):
+        super(_Instrumented, self).__init__()
+        self.module = module
+        self.name = name
+        self.stats = stats
+
+        delay = getattr(module, 'delay', None)
+        if delay is not None:
+            self.stats.gauge(self.name, 'delay_seconds', delay)
+
+    def __call__(self, *args):
+        t = time.perf_counter()
+        output = self.module(*args)
+        self.stats.observe(self.name, time.perf_counter() - t)
+        if hasattr(self.module, 'buffer_'):
+            self.stats.gauge(self.name, 'buffered_samples',
+                             _buffered(self.module))
+        return output
+
+
 class Pipeline(object):
+    """Stream processing pipeline
 
-    def __init__(self, dsk):
+    Parameters
+    ----------
+    dsk : dict
+        Dask graph of stream modules. Must depend on the 'input' key.
+    stats : `StreamStats` or `TensorboardStats`, optional
+        When provided, each module reports its number of calls, wall time and
+        (when relevant) number of buffered samples and algorithmic delay to
+        `stats`. The pipeline itself reports its real-time factor.
+    """
+
+    def __init__(self, dsk, stats=None):
         super(Pipeline, self).__init__()
         # TODO -- check that at least one input depends on 'input'
+        self.stats = stats
+        if self.stats is not None:
+            dsk = {key: (_Instrumented(task[0], key, self.stats), ) + task[1:]
+                        if isinstance(task, tuple) and callable(task[0])
+                        else task
+                   for key, task in dsk.items()}
         self.dsk = dsk
         self.t_ = Segment(0, 0)
 
@@ -575,6 +1204,8 @@ class Pipeline(object):
         keys = sorted(['input'] + list(self.dsk.keys()))
         more = False
 
+        start = time.perf_counter()
+
         while True:
 
             if more:
@@ -589,12 +1220,21 @@ class Pipeline(object):
             outputs = {key: output
                        for key, output in zip(keys, dask.get(self.dsk, keys))}
 
+            if self.stats is not None:
+                wall_time = time.perf_counter() - start
+                audio_time = self.t_.duration
+                self.stats.gauge('pipeline', 'elapsed_seconds', wall_time)
+                self.stats.gauge('pipeline', 'audio_time_seconds', audio_time)
+                if audio_time > 0:
+                    self.stats.gauge('pipeline', 'real_time_factor',
+                                     wall_time / audio_time)
+
             for key in keys:
                 if isinstance(outputs[key], More):
                     more = True
                     outputs[key] = outputs[key].output
 
-            if all(Stream.EndOfStream == o for o in outputs.values()):
+            if all(o is Stream.EndOfStream for o in outputs.values()):
                 return
 
             outputs['t'] = self.t_.end
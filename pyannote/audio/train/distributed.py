@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2019 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Data-parallel multi-process training"""
+
+import random
+import socket
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+
+
+def is_distributed():
+    """Check whether current process belongs to a process group"""
+    return dist.is_available() and dist.is_initialized()
+
+
+def get_rank():
+    """Rank of current process (0 when not distributed)"""
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size():
+    """Number of processes (1 when not distributed)"""
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def barrier():
+    """Wait for all processes (e.g. until rank 0 is done saving to disk)"""
+    if is_distributed():
+        dist.barrier()
+
+
+def broadcast(values, src=0):
+    """Share (numerical) values of process `src` with all processes
+
+    Parameters
+    ----------
+    values : list of float
+        Values.
+    src : int, optional
+        Rank of process sending values. Defaults to 0.
+
+    Returns
+    -------
+    values : list of float
+        Values of process `src`.
+    """
+
+    if not is_distributed():
+        return list(values)
+
+    buffer = torch.tensor([float(value) for value in values],
+                          dtype=torch.float64)
+    dist.broadcast(buffer, src=src)
+    return buffer.tolist()
+
+
+def broadcast_parameters(tensors, src=0):
+    """Overwrite tensors (in place) with those of process `src`
+
+    Parameters
+    ----------
+    tensors : iterable of `torch.Tensor`
+        Tensors (e.g. `model.state_dict().values()`).
+    src : int, optional
+        Defaults to 0.
+    """
+
+    if not is_distributed():
+        return
+
+    with torch.no_grad():
+        for tensor in tensors:
+            dist.broadcast(tensor.data, src=src)
+
+
+def average_gradients(optimizer, loss):
+    """Average gradients (and loss) over all processes
+
+    All gradients are packed into one single buffer so that only one
+    all-reduce operation is needed.
+
+    Parameters
+    ----------
+    optimizer : `torch.optim.Optimizer`
+        Optimizer whose parameters gradients are averaged in place.
+    loss : float
+        Loss of current process.
+
+    Returns
+    -------
+    loss : float
+        Loss averaged over all processes.
+    """
+
+    if not is_distributed():
+        return loss
+
+    parameters = [p for group in optimizer.param_groups
+                    for p in group['params']]
+    if not parameters:
+        return loss
+
+    # parameters that were not used by this process still have to take part
+    # in the all-reduce operation.
+    gradients = [torch.zeros_like(p).view(-1) if p.grad is None
+                 else p.grad.detach().view(-1) for p in parameters]
+    loss = torch.tensor([loss], dtype=gradients[0].dtype,
+                        device=gradients[0].device)
+    buffer = torch.cat(gradients + [loss])
+
+    dist.all_reduce(buffer)
+    buffer /= get_world_size()
+
+    offset = 0
+    for p in parameters:
+        gradient = buffer[offset:offset + p.numel()].view_as(p)
+        offset += p.numel()
+        if p.grad is not None:
+            p.grad.copy_(gradient)
+        # do not create gradients for parameters unused by all processes
+        elif torch.any(gradient != 0):
+            p.grad = gradient.clone()
+
+    return buffer[-1].item()
+
+
+def _get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _init(rank, world_size, port, backend):
+    dist.init_process_group(backend, init_method=f'tcp://127.0.0.1:{port}',
+                            rank=rank, world_size=world_size)
+
+
+def _worker(iterations, rank, world_size, port, backend):
+
+    # forked processes inherit the random state of their parent
+    np.random.seed()
+    random.seed()
+    torch.manual_seed(torch.initial_seed() + rank)
+
+    _init(rank, world_size, port, backend)
+    for _ in iterations():
+        pass
+    dist.destroy_process_group()
+
+
+def launch(iterations, world_size, backend='gloo'):
+    """Run `iterations()` generator in `world_size` processes
+
+    Current process is rank 0 while other processes are forked from it,
+    which means that `iterations` does not need to be picklable.
+
+    Parameters
+    ----------
+    iterations : callable
+        Function returning a generator (e.g. `Trainer.fit_iter`). It is
+        called once the process group is initialized.
+    world_size : int
+        Number of processes.
+    backend : str, optional
+        `torch.distributed` backend. Defaults to 'gloo' (CPU).
+
+    Yields
+    ------
+    iteration :
+        Whatever is yielded by `iterations()` in process with rank 0.
+    """
+
+    port = _get_free_port()
+
+    # workers are not daemonic as they might have to start their own batch
+    # generation worker processes
+    context = mp.get_context('fork')
+    workers = [context.Process(target=_worker,
+                               args=(iterations, rank, world_size, port,
+                                     backend))
+               for rank in range(1, world_size)]
+    for worker in workers:
+        worker.start()
+
+    completed = False
+    try:
+        _init(0, world_size, port, backend)
+        yield from iterations()
+        completed = True
+
+    finally:
+        if completed:
+            for worker in workers:
+                worker.join()
+            dist.destroy_process_group()
+        else:
+            for worker in workers:
+                worker.terminate()
+                worker.join()
+            if is_distributed():
+                dist.destroy_process_group()
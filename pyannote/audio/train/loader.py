@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+# The MIT License (MIT)
+
+# Copyright (c) 2019 CNRS
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# AUTHORS
+# Hervé BREDIN - http://herve.niderb.fr
+
+"""Multi-process batch loading"""
+
+import random
+from queue import Empty
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+
+def _share(batch):
+    """Convert numpy arrays to torch tensors (to be sent in shared memory)"""
+
+    if isinstance(batch, dict):
+        return {key: _share(value) for key, value in batch.items()}
+
+    if isinstance(batch, (list, tuple)):
+        return type(batch)(_share(value) for value in batch)
+
+    if isinstance(batch, np.ndarray):
+        try:
+            return torch.from_numpy(batch)
+        # unsupported dtype: fall back to pickling
+        except TypeError:
+            return batch
+
+    return batch
+
+
+def _unshare(batch):
+    """Convert torch tensors back to numpy arrays (without copy)"""
+
+    if isinstance(batch, dict):
+        return {key: _unshare(value) for key, value in batch.items()}
+
+    if isinstance(batch, (list, tuple)):
+        return type(batch)(_unshare(value) for value in batch)
+
+    if isinstance(batch, torch.Tensor):
+        return batch.numpy()
+
+    return batch
+
+
+def _worker(batches, queue, seed):
+    """Worker main loop: put batches into (bounded) queue forever"""
+
+    # forked workers inherit the random state of their parent, hence the need
+    # to re-seed them (with fresh entropy when no seed is provided)
+    np.random.seed(seed)
+    random.seed(seed)
+
+    for batch in batches():
+        # blocks as long as the queue is full
+        queue.put(_share(batch))
+
+
+class BatchLoader(object):
+    """Generate batches in background worker processes
+
+    Each worker runs its own batch generator and sends batches to the main
+    process through a bounded queue. Numpy arrays are sent as torch tensors,
+    whose data is transferred through shared memory rather than pickled.
+
+    Parameters
+    ----------
+    batches : callable
+        Called without argument (in each worker) to get a generator that
+        yields batches indefinitely.
+    n_workers : int, optional
+        Number of worker processes. Defaults to 1.
+    prefetch : int, optional
+        Maximum number of batches prefetched by each worker. Defaults to 10.
+        Memory usage is therefore bounded by `n_workers` x `prefetch` batches.
+    seed : int, optional
+        When provided, worker #i sets its random seed to `seed` + i. Since
+        batches are consumed from workers in round-robin order, the sequence
+        of batches is then deterministic.
+
+    Usage
+    -----
+    >>> loader = BatchLoader(generator.batches, n_workers=4)
+    >>> for batch in loader:
+    ...     # do something with batch
+    ...     pass
+    """
+
+    def __init__(self, batches, n_workers=1, prefetch=10, seed=None):
+        super(BatchLoader, self).__init__()
+        self.batches = batches
+        self.n_workers = n_workers
+        self.prefetch = prefetch
+        self.seed = seed
+
+    def __iter__(self):
+
+        # "fork" so that workers inherit (and do not need to pickle) the
+        # possibly large state of the batch generator
+        context = mp.get_context('fork')
+
+        queues, workers = [], []
+        for i in range(self.n_workers):
+            queue = context.Queue(maxsize=self.prefetch)
+            seed = None if self.seed is None else self.seed + i
+            worker = context.Process(target=_worker,
+                                     args=(self.batches, queue, seed),
+                                     daemon=True)
+            worker.start()
+            queues.append(queue)
+            workers.append(worker)
+
+        try:
+            while True:
+                for i, (queue, worker) in enumerate(zip(queues, workers)):
+                    yield _unshare(self._get(queue, worker, i))
+
+        # stop workers as soon as the loader is exhausted, closed or
+        # garbage collected
+        finally:
+            for worker in workers:
+                worker.terminate()
+            for worker in workers:
+                worker.join()
+
+    @staticmethod
+    def _get(queue, worker, i):
+        while True:
+            try:
+                return queue.get(timeout=5.)
+            except Empty:
+                if not worker.is_alive():
+                    raise RuntimeError(BatchLoader._died(worker, i))
+            # tensors are shared through file descriptors served by the worker
+            # itself: those of a batch put into the queue right before the
+            # worker died can no longer be received
+            except (EOFError, ConnectionError) as e:
+                worker.join(timeout=5.)
+                raise RuntimeError(BatchLoader._died(worker, i)) from e
+
+    @staticmethod
+    def _died(worker, i):
+        return (f'Batch loading worker #{i} died unexpectedly '
+                f'(exit code {worker.exitcode}).')
@@ -29,7 +29,9 @@
 import time
 import torch
 import tempfile
+import contextlib
 import numpy as np
+from functools import partial
 from tqdm import tqdm
 from collections import deque
 from torch.optim import SGD
@@ -38,6 +40,7 @@ from abc import ABCMeta, abstractmethod
 from torch.nn.utils.rnn import pack_sequence
 from pyannote.audio.train.schedulers import ConstantScheduler
 from pyannote.audio.train.checkpoint import Checkpoint
+from pyannote.audio.train import distributed
 from tensorboardX import SummaryWriter
 from dlib import probability_that_sequence_is_increasing
 from pyannote.audio.features import Precomputed
@@ -177,14 +180,11 @@ class Trainer:
         if variable_lengths:
             _, sort = torch.sort(torch.tensor(lengths), descending=True)
             _, unsort = torch.sort(sort)
-            sequences = [torch.tensor(batch['X'][i],
-                                      dtype=torch.float32,
-                                      device=device) for i in sort]
+            sequences = [self.as_tensor(batch['X'][i], device)
+                         for i in sort]
             batch['X'] = pack_sequence(sequences)
         else:
-            batch['X'] = torch.tensor(np.stack(batch['X']),
-                                      dtype=torch.float32,
-                                      device=device)
+            batch['X'] = self.as_tensor(np.stack(batch['X']), device)
 
         # forward pass
         fX = model(batch['X'])
@@ -217,10 +217,88 @@ class Trainer:
         cpu = torch.device('cpu')
         return tensor.detach().to(cpu).numpy()
 
+    @staticmethod
+    def as_tensor(X, device, dtype=np.float32):
+        """Convert numpy array to (contiguous) torch.Tensor
+
+        Unlike torch.tensor, this does not copy (C-contiguous) arrays that
+        already have the expected type and are meant to stay on CPU.
+        """
+        X = np.ascontiguousarray(X, dtype=dtype)
+        return torch.from_numpy(X).to(device)
+
+    @staticmethod
+    def autocast(device, mixed_precision=False):
+        """Context manager for (bfloat16) automatic mixed precision
+
+        Parameters
+        ----------
+        device : torch.device
+        mixed_precision : bool, optional
+            Defaults to False (i.e. do nothing).
+        """
+
+        if not mixed_precision:
+            return contextlib.ExitStack()
+
+        if not hasattr(torch, 'autocast'):
+            msg = ('Mixed precision training requires a version of pytorch '
+                   'that supports "torch.autocast".')
+            raise ValueError(msg)
+
+        return torch.autocast(device.type, dtype=torch.bfloat16)
+
+    def backward(self, batches, model, device, accumulate=1,
+                 mixed_precision=False, writer=None):
+        """Accumulate gradients over `accumulate` consecutive batches
+
+        Parameters
+        ----------
+        batches : generator
+            Batch generator. `next(batches)` will be called `accumulate` times.
+        model : `torch.nn.Module`
+            Model currently being trained.
+        device : `torch.device`
+            Device used by model parameters.
+        accumulate : int, optional
+            Number of batches. Defaults to 1.
+        mixed_precision : bool, optional
+            Use bfloat16 automatic mixed precision. Defaults to False.
+        writer : `tensorboardX.SummaryWriter`, optional
+            Tensorboard writer (only used for the first batch).
+
+        Returns
+        -------
+        loss : float
+            Average loss over `accumulate` batches.
+        generation_time : float
+            Time spent waiting for batches.
+        """
+
+        loss, generation_time = 0., 0.
+
+        for a in range(accumulate):
+
+            start_time = time.time()
+            batch = next(batches)
+            generation_time += time.time() - start_time
+
+            with self.autocast(device, mixed_precision=mixed_precision):
+                batch_loss = self.batch_loss(
+                    batch, model, device,
+                    writer=writer if a == 0 else None)
+
+            # scale loss so that accumulated gradients are averaged
+            (batch_loss.float() / accumulate).backward()
+            loss += batch_loss.item() / accumulate
+
+        return loss, generation_time
+
     def fit(self, model, feature_extraction, protocol, subset='train',
             restart=0, epochs=1000,
             get_optimizer=None, get_scheduler=None, learning_rate='auto',
-            log_dir=None, device=None):
+            log_dir=None, device=None, accumulate=1, mixed_precision=False,
+            world_size=1):
         """Train model
 
         Parameters
@@ -251,6 +329,18 @@ class Trainer:
             Defaults to not store anything.
         device : torch.device, optional
             Defaults to torch.device('cpu')
+        accumulate : int, optional
+            Accumulate gradients over that many batches before each model
+            update (i.e. effective batch size is `accumulate` times larger).
+            Defaults to 1.
+        mixed_precision : bool, optional
+            Use bfloat16 automatic mixed precision. Defaults to float32.
+        world_size : int, optional
+            Train with that many data-parallel processes (using gloo backend
+            of torch.distributed). Each process generates its own batches
+            and gradients are averaged over all processes before each model
+            update (i.e. effective batch size is `world_size` times larger).
+            Defaults to 1 (i.e. single process).
 
         Returns
         -------
@@ -263,7 +353,9 @@ class Trainer:
             protocol, subset=subset,
             restart=restart, epochs=epochs,
             get_optimizer=get_optimizer, get_scheduler=get_scheduler,
-            learning_rate=learning_rate, log_dir=log_dir, device=device)
+            learning_rate=learning_rate, log_dir=log_dir, device=device,
+            accumulate=accumulate, mixed_precision=mixed_precision,
+            world_size=world_size)
 
         for iteration in iterations:
             pass
@@ -332,7 +424,8 @@ class Trainer:
 
     def auto_lr(self, model, optimizer, batches, labels=None,
                 min_lr=1e-6, max_lr=1e3, n_batches=500,
-                device=None, writer=None):
+                device=None, writer=None, accumulate=1,
+                mixed_precision=False):
         """Automagically find a "good" learning rate upper bound
 
         Parameters
@@ -346,11 +439,17 @@ class Trainer:
             Learning rate will be increased exponentially from `min_lr` to
             `max_lr`.
         n_batches : int, optional
-            Number of batches needed to increase from `min_lr` to `max_lr`.
+            Number of model updates needed to increase from `min_lr` to
+            `max_lr`.
         writer : tensorboardX.SummaryWriter, optional
             When provided, log learning rate and loss to tensorboard.
         device : torch.Device, optional
             Device to use. Defaults to `torch.device('cpu')`.
+        accumulate : int, optional
+            Accumulate gradients over that many batches before each model
+            update. Defaults to 1.
+        mixed_precision : bool, optional
+            Use bfloat16 automatic mixed precision. Defaults to False.
 
         Returns
         -------
@@ -370,7 +469,7 @@ class Trainer:
         if device is None:
             device = torch.device('cpu')
 
-        self.on_train_start(model, batches_per_epoch=n_batches,
+        self.on_train_start(model, batches_per_epoch=n_batches * accumulate,
                             labels=labels, device=device)
 
         # initialize optimizer with a low learning rate
@@ -383,21 +482,23 @@ class Trainer:
 
         # progress bar
         pbar = tqdm(desc='Auto LR', total=n_batches,
-                    postfix={'loss': '...', 'lr': '...'})
+                    postfix={'loss': '...', 'lr': '...'},
+                    disable=distributed.get_rank() > 0)
 
         losses, lrs = [], []
 
         # loop on n_batches batches
         for i in range(n_batches):
 
-            batch = next(batches)
             model.zero_grad()
-            loss = self.batch_loss(batch, model, device)
-            loss.backward()
+            loss, _ = self.backward(batches, model, device,
+                                    accumulate=accumulate,
+                                    mixed_precision=mixed_precision)
+            loss = distributed.average_gradients(optimizer, loss)
             optimizer.step()
 
             lrs.append(optimizer.param_groups[0]['lr'])
-            losses.append(loss.item())
+            losses.append(loss)
 
             # update progress bar
             pbar.update(1)
@@ -423,7 +524,8 @@ class Trainer:
                  protocol, subset='train',
                  restart=0, epochs=1000,
                  get_optimizer=None, get_scheduler=None, learning_rate='auto',
-                 log_dir=None, device=None):
+                 log_dir=None, device=None, accumulate=1,
+                 mixed_precision=False, world_size=1):
         """Train model
 
         Parameters
@@ -454,6 +556,19 @@ class Trainer:
             Defaults to not store anything.
         device : torch.device, optional
             Defaults to torch.device('cpu')
+        accumulate : int, optional
+            Accumulate gradients over that many batches before each model
+            update (i.e. effective batch size is `accumulate` times larger).
+            Epochs still contain the same number of batches but `accumulate`
+            times less model (and scheduler) updates. Defaults to 1.
+        mixed_precision : bool, optional
+            Use bfloat16 automatic mixed precision. Defaults to float32.
+        world_size : int, optional
+            Train with that many data-parallel processes (using gloo backend
+            of torch.distributed). Each process generates its own batches
+            and gradients are averaged over all processes before each model
+            update (i.e. effective batch size is `world_size` times larger).
+            Defaults to 1 (i.e. single process).
 
         Yields
         ------
@@ -472,8 +587,37 @@ class Trainer:
         if log_dir is None:
             log_dir = tempfile.mkdtemp()
 
+        if accumulate < 1:
+            msg = f'"accumulate" must be strictly positive (is {accumulate}).'
+            raise ValueError(msg)
+
+        # start `world_size` data-parallel processes (current one being the
+        # one with rank 0) that will then run the code below
+        if world_size > 1:
+            yield from distributed.launch(
+                partial(self.fit_iter, model, feature_extraction, protocol,
+                        subset=subset, restart=restart, epochs=epochs,
+                        get_optimizer=get_optimizer,
+                        get_scheduler=get_scheduler,
+                        learning_rate=learning_rate, log_dir=log_dir,
+                        device=device, accumulate=accumulate,
+                        mixed_precision=mixed_precision),
+                world_size)
+            return
+
+        rank = distributed.get_rank()
+        world_size = distributed.get_world_size()
+
         # initialize batch generator
         batch_generator = self.get_batch_generator(feature_extraction)
+
+        # make sure each process (and each of its batch generation workers)
+        # uses its own random seed
+        seed = getattr(batch_generator, 'seed', None)
+        if seed is not None:
+            batch_generator.seed = \
+                seed + rank * max(1, getattr(batch_generator, 'parallel', 1))
+
         batches = batch_generator(protocol, subset=subset)
         batch = next(batches)
 
@@ -481,9 +625,15 @@ class Trainer:
         batches_per_epoch = getattr(batch_generator, 'batches_per_epoch', None)
         labels = getattr(batch_generator, 'labels', None)
 
-        # initialize loggers
-        checkpoint = Checkpoint(log_dir, restart=restart > 0)
-        writer = SummaryWriter(log_dir=log_dir)
+        # number of model updates per epoch (each one of them processes
+        # accumulate x world_size batches)
+        steps_per_epoch = int(np.ceil(
+            batches_per_epoch / (accumulate * world_size)))
+
+        # initialize loggers. only process with rank 0 writes to disk (other
+        # processes only need checkpoint paths).
+        checkpoint = Checkpoint(log_dir, restart=restart > 0 or rank > 0)
+        writer = SummaryWriter(log_dir=log_dir) if rank == 0 else None
 
         # send model to device
         device = torch.device('cpu') if device is None else device
@@ -512,24 +662,32 @@ class Trainer:
                 map_location=lambda storage, loc: storage)
             optimizer.load_state_dict(optimizer_state)
 
+        # make sure all processes start from the same (rank 0) model
+        distributed.broadcast_parameters(
+            list(model.state_dict().values()) + list(extra_parameters))
+
         # find optimal learning rate automagically
         if learning_rate == 'auto':
 
             # save model and optimizer states before "auto_lr"
-            if restart == 0:
+            if restart == 0 and rank == 0:
                 checkpoint.on_epoch_end(0, model, optimizer)
                 self.on_epoch_end(0, checkpoint, writer=None)
+            distributed.barrier()
 
             auto_lr = self.auto_lr(model, optimizer, batches,
                                    labels=labels, writer=writer,
-                                   device=device)
-            min_lr = auto_lr['min_lr']
-            max_lr = auto_lr['max_lr']
+                                   device=device, accumulate=accumulate,
+                                   mixed_precision=mixed_precision)
+            # all processes use learning rates chosen by process with rank 0
+            min_lr, max_lr = distributed.broadcast(
+                [auto_lr['min_lr'], auto_lr['max_lr']])
 
             # dump learning rates and losses to disk for debugging purposes
-            with open(f'{log_dir}/auto_lr_log.csv', mode='w') as fp:
-                for lr, loss in zip(auto_lr['lrs'], auto_lr['losses']):
-                    fp.write(f'{np.log10(lr):g} {loss:g}\n')
+            if rank == 0:
+                with open(f'{log_dir}/auto_lr_log.csv', mode='w') as fp:
+                    for lr, loss in zip(auto_lr['lrs'], auto_lr['losses']):
+                        fp.write(f'{np.log10(lr):g} {loss:g}\n')
 
             # reload model and optimizer states after "auto_lr"
             model_state = torch.load(
@@ -548,7 +706,8 @@ class Trainer:
         else:
             min_lr, max_lr = None, learning_rate
 
-        scheduler = get_scheduler(optimizer, batches_per_epoch,
+        # schedulers are updated once per model update
+        scheduler = get_scheduler(optimizer, steps_per_epoch,
                                   min_lr=min_lr, max_lr=max_lr)
 
         self.on_train_start(model,
@@ -563,7 +722,7 @@ class Trainer:
         # backtracking is triggered to revert the model back
         # to a previous state where it was still going fine.
         backtrack_patience = 2
-        batch_losses = deque([], backtrack_patience * batches_per_epoch)
+        batch_losses = deque([], backtrack_patience * steps_per_epoch)
 
         while True:
 
@@ -583,36 +742,40 @@ class Trainer:
                 break
 
             # tensorboard: backtracking
-            writer.add_scalar('train/backtracking/epoch',
-                              epoch, global_step=iteration)
+            if writer is not None:
+                writer.add_scalar('train/backtracking/epoch',
+                                  epoch, global_step=iteration)
 
             loss_avg = 0.
 
-            pbar = tqdm(desc=f'Iteration #{iteration}', total=batches_per_epoch,
-                        unit='batch', postfix={'loss': '...', 'lr': ...})
+            pbar = tqdm(desc=f'Iteration #{iteration}', total=steps_per_epoch,
+                        unit='batch', postfix={'loss': '...', 'lr': ...},
+                        disable=rank > 0)
 
             batch_generation_time = []
             batch_processing_time = []
-            for i in range(batches_per_epoch):
+            for i in range(steps_per_epoch):
 
-                # get next batch (and measure how long it takes)
-                start_time = time.time()
-                batch = next(batches)
-                batch_generation_time.append(time.time() - start_time)
-
-                # process batch (and measure how long it takes)
-                # this includes: loss computation and backpropagation
+                # get next batch(es) and process them (and measure how long
+                # it takes). this includes: loss computation, (accumulated)
+                # backpropagation, and model update
                 start_time = time.time()
                 model.zero_grad()
-                loss = self.batch_loss(batch, model, device,
-                                       writer=writer if log else None)
-                loss.backward()
+                loss, generation_time = self.backward(
+                    batches, model, device, accumulate=accumulate,
+                    mixed_precision=mixed_precision,
+                    writer=writer if log else None)
+                # so that all processes end up with the same model and the
+                # same scheduler state
+                loss = distributed.average_gradients(optimizer, loss)
                 optimizer.step()
-                batch_processing_time.append(time.time() - start_time)
+                batch_generation_time.append(generation_time)
+                batch_processing_time.append(
+                    time.time() - start_time - generation_time)
 
                 # keep track of loss
-                batch_losses.append(loss.item())
-                loss_avg += loss.item()
+                batch_losses.append(loss)
+                loss_avg += loss
 
                 # send loss of current batch to scheduler
                 # 'scheduler_state' is a dictionary that is logged to
@@ -626,30 +789,38 @@ class Trainer:
                 pbar.update(1)
 
             # tensorboard: average loss
-            loss_avg /= batches_per_epoch
-            writer.add_scalar('train/loss', loss_avg, global_step=iteration)
-
-            # tensorboard: profiling
-            writer.add_histogram('profiling/batch_generation',
-                                 np.array(batch_generation_time),
-                                 global_step=iteration)
-            writer.add_histogram('profiling/batch_processing',
-                                 np.array(batch_processing_time),
-                                 global_step=iteration)
-
-            # tensorboard: scheduler
-            if isinstance(scheduler_state, dict):
-                for name, value in scheduler_state.items():
-                    writer.add_scalar(
-                        f'train/scheduler/{name}', value,
-                        global_step=iteration)
+            loss_avg /= steps_per_epoch
+
+            if writer is not None:
+
+                writer.add_scalar('train/loss', loss_avg,
+                                  global_step=iteration)
+
+                # tensorboard: profiling
+                writer.add_histogram('profiling/batch_generation',
+                                     np.array(batch_generation_time),
+                                     global_step=iteration)
+                writer.add_histogram('profiling/batch_processing',
+                                     np.array(batch_processing_time),
+                                     global_step=iteration)
+
+                # tensorboard: scheduler
+                if isinstance(scheduler_state, dict):
+                    for name, value in scheduler_state.items():
+                        writer.add_scalar(
+                            f'train/scheduler/{name}', value,
+                            global_step=iteration)
 
             # save model to disk
-            checkpoint.on_epoch_end(epoch, model, optimizer)
-            # TODO. save scheduler state as well
+            if rank == 0:
+                checkpoint.on_epoch_end(epoch, model, optimizer)
+                # TODO. save scheduler state as well
 
-            self.on_epoch_end(iteration, checkpoint,
-                              writer=writer if log else None)
+                self.on_epoch_end(iteration, checkpoint,
+                                  writer=writer if log else None)
+
+            # make sure other processes can reload it when backtracking
+            distributed.barrier()
 
             yield {'epoch': epoch, 'iteration': iteration, 'model': model}
 
@@ -658,8 +829,12 @@ class Trainer:
 
             # tensorboard: backtracking probability
             backtrack_p = probability_that_sequence_is_increasing(batch_losses)
-            writer.add_scalar('train/backtracking/probability',
-                              backtrack_p, global_step=iteration)
+            if writer is not None:
+                writer.add_scalar('train/backtracking/probability',
+                                  backtrack_p, global_step=iteration)
+
+            # all processes follow the decision of process with rank 0
+            backtrack_p, = distributed.broadcast([backtrack_p])
 
             # backtrack to previous epoch when loss has been increasing
             if backtrack_p > 0.99:
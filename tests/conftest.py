@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import soundfile as sf
+from pyannote.core import Annotation, Segment, Timeline
+
+
+SAMPLE_RATE = 16000
+
+
+class DummyProtocol(object):
+    """Protocol-like object with a training set made of random audio files"""
+
+    def __init__(self, files):
+        self.files_ = files
+
+    def train(self):
+        for current_file in self.files_:
+            yield dict(current_file)
+
+    def files(self):
+        return self.train()
+
+
+@pytest.fixture
+def protocol(tmp_path):
+    """Three (20s long) audio files annotated with 3 speakers"""
+
+    rng = np.random.RandomState(0)
+
+    files = []
+    for f in range(3):
+
+        uri = f'file{f}'
+        duration = 20.
+        audio = tmp_path / f'{uri}.wav'
+        sf.write(str(audio),
+                 0.1 * rng.randn(int(duration * SAMPLE_RATE)),
+                 SAMPLE_RATE)
+
+        annotation = Annotation(uri=uri)
+        t = 0.
+        while t < duration - 1.:
+            end = min(duration, t + rng.uniform(1., 4.))
+            annotation[Segment(t, end)] = f'speaker{rng.randint(3)}'
+            t = end + rng.uniform(0., 0.5)
+
+        files.append({'uri': uri,
+                      'database': 'Dummy',
+                      'audio': str(audio),
+                      'duration': duration,
+                      'annotation': annotation,
+                      'annotated': Timeline([Segment(0, duration)])})
+
+    return DummyProtocol(files)
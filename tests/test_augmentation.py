@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from pyannote.core import Segment
+from pyannote.audio.features import RawAudio
+from pyannote.audio.augmentation.base import Augmentation
+from pyannote.audio.augmentation.noise import AddNoise
+import pyannote.audio.augmentation.noise
+from conftest import SAMPLE_RATE
+
+
+@pytest.fixture
+def add_noise(monkeypatch, protocol):
+    """AddNoise instance using `protocol` as noise collection"""
+    monkeypatch.setattr(pyannote.audio.augmentation.noise, 'FileFinder',
+                        lambda config_yml=None: None)
+    monkeypatch.setattr(pyannote.audio.augmentation.noise, 'get_protocol',
+                        lambda collection, preprocessors=None: protocol)
+    return AddNoise(collection='Dummy', snr_min=10, snr_max=10)
+
+
+def test_augmentation_batch():
+    class Flip(Augmentation):
+        def __call__(self, waveform, sample_rate):
+            return waveform[::-1]
+
+    waveforms = np.random.randn(4, 100)
+    np.testing.assert_array_equal(Flip().batch(waveforms, SAMPLE_RATE),
+                                  waveforms[:, ::-1])
+
+
+def test_add_noise_pool(add_noise, protocol):
+    pool, offsets = add_noise.load_pool(SAMPLE_RATE)
+    assert offsets[0] == 0 and offsets[-1] == len(pool)
+    assert len(offsets) == len(protocol.files_) + 1
+    # each noise file is RMS-normalized
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        rms = np.sqrt(np.mean(pool[start:end] ** 2))
+        np.testing.assert_allclose(rms, 1., rtol=1e-4)
+    # pool is only loaded once
+    assert add_noise.load_pool(SAMPLE_RATE)[0] is pool
+
+
+def test_add_noise_batch(add_noise):
+    np.random.seed(0)
+    pool, _ = add_noise.load_pool(SAMPLE_RATE)
+
+    waveforms = np.random.randn(8, 1000)
+    augmented = add_noise.batch(waveforms, SAMPLE_RATE)
+    assert augmented.shape == waveforms.shape
+
+    # snr_min == snr_max == 10 dB
+    alpha = 10 ** (-10 / 20)
+    noise = (augmented - add_noise.normalize(waveforms, axis=1)) / alpha
+    for row in noise:
+        # every noise is a contiguous excerpt of the pool
+        starts = np.where(np.abs(pool - row[0]) < 1e-5)[0]
+        assert any(np.allclose(row, pool.take(start + np.arange(len(row)),
+                                              mode='wrap'), atol=1e-5)
+                   for start in starts)
+
+
+def test_add_noise_call(add_noise):
+    waveform = np.random.randn(1000, 1)
+    assert add_noise(waveform, SAMPLE_RATE).shape == (1000, 1)
+
+
+def test_raw_audio_crop_batch_augmentation(protocol, add_noise):
+    raw_audio = RawAudio(sample_rate=SAMPLE_RATE, augmentation=add_noise)
+    clean = RawAudio(sample_rate=SAMPLE_RATE)
+    current_file = next(protocol.train())
+    segments = [Segment(0., 1.), Segment(2., 3.)]
+
+    batch = raw_audio.crop_batch([current_file] * 2, segments, fixed=1.)
+    for segment, waveform in zip(segments, batch):
+        expected = clean.crop(current_file, segment, fixed=1.)
+        assert waveform.shape == expected.shape
+        assert not np.allclose(waveform, expected)
+
+
+def test_add_noise_bank(add_noise, tmp_path):
+    bank = tmp_path / 'bank'
+    add_noise.save_bank(bank, SAMPLE_RATE)
+    expected_pool, expected_offsets = add_noise.load_pool(SAMPLE_RATE)
+
+    augmentation = AddNoise(bank=bank, snr_min=10, snr_max=10)
+    assert augmentation.collection == ['Dummy']
+    pool, offsets = augmentation.load_pool(SAMPLE_RATE)
+    assert isinstance(pool, np.memmap)
+    np.testing.assert_array_equal(offsets, expected_offsets)
+    np.testing.assert_allclose(pool, expected_pool, atol=1e-6)
+
+    # same random draws lead to the same augmented waveforms
+    waveforms = np.random.randn(4, 1000)
+    np.random.seed(0)
+    expected = add_noise.batch(waveforms, SAMPLE_RATE)
+    np.random.seed(0)
+    np.testing.assert_allclose(augmentation.batch(waveforms, SAMPLE_RATE),
+                               expected, atol=1e-5)
+
+
+def test_add_noise_bank_checks(add_noise, protocol, tmp_path):
+    bank = tmp_path / 'bank'
+
+    # bank must be built beforehand
+    with pytest.raises(ValueError):
+        AddNoise(bank=bank)
+
+    add_noise.save_bank(bank, SAMPLE_RATE)
+    AddNoise.load_bank(bank, SAMPLE_RATE, collection=['Dummy'],
+                       uris=[f['uri'] for f in protocol.files_])
+
+    with pytest.raises(ValueError):
+        AddNoise(collection='Other', bank=bank)
+    with pytest.raises(ValueError):
+        AddNoise.load_bank(bank, 2 * SAMPLE_RATE)
+    with pytest.raises(ValueError):
+        AddNoise.load_bank(bank, SAMPLE_RATE, collection=['Other'])
+    with pytest.raises(ValueError):
+        AddNoise.load_bank(bank, SAMPLE_RATE, uris=['file0'])
+
+    # instances created from a bank cannot overwrite it with an empty one
+    waveform = (bank / 'waveform.npy').read_bytes()
+    with pytest.raises(ValueError):
+        AddNoise(bank=bank).save_bank(bank, SAMPLE_RATE)
+    assert (bank / 'waveform.npy').read_bytes() == waveform
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+from pyannote.core import Annotation, Segment
+from pyannote.pipeline import Pipeline
+from pyannote.metrics.diarization import GreedyDiarizationErrorRate
+from pyannote.audio.pipeline.batch import BatchRunner, to_rttm, from_rttm
+
+
+class ShiftPipeline(Pipeline):
+    """Shift reference by 0.5s (and count processed files)"""
+
+    def __init__(self):
+        super().__init__()
+        self.processed = []
+
+    def __call__(self, current_file):
+        self.processed.append(current_file['uri'])
+        hypothesis = Annotation(uri=current_file['uri'])
+        for segment, track, label in current_file['annotation'].itertracks(
+                yield_label=True):
+            hypothesis[Segment(segment.start + 0.5, segment.end + 0.5),
+                       track] = label
+        return hypothesis
+
+
+def get_files(protocol):
+    files = list(protocol.train())
+    # same uri, different database
+    other = dict(files[0])
+    other['database'] = 'Other'
+    other['annotation'] = files[1]['annotation'].copy()
+    return files + [other]
+
+
+def expected_metric(files):
+    metric = GreedyDiarizationErrorRate(collar=0.0, skip_overlap=False)
+    pipeline = ShiftPipeline()
+    for current_file in files:
+        hypothesis = from_rttm(current_file['uri'],
+                               to_rttm(current_file['uri'],
+                                       pipeline(current_file)))
+        metric(current_file['annotation'], hypothesis,
+               uem=current_file['annotated'])
+    return abs(metric)
+
+
+def test_rttm():
+    hypothesis = Annotation(uri='file')
+    hypothesis[Segment(0., 1.5), 'a'] = 'A'
+    hypothesis[Segment(0., 1.5), 'b'] = 'B'
+    hypothesis[Segment(2., 3.25), 'c'] = 'A'
+    reloaded = from_rttm('file', to_rttm('file', hypothesis))
+    assert reloaded.uri == 'file'
+    assert sorted(reloaded.itertracks(yield_label=True)) == \
+        sorted((s, t, l) for t, (s, _, l) in enumerate(
+            sorted(hypothesis.itertracks(yield_label=True))))
+
+
+def test_batch_runner(protocol, tmp_path):
+    files = get_files(protocol)
+    rttm = tmp_path / 'output.rttm'
+
+    pipeline = ShiftPipeline()
+    metric = BatchRunner(pipeline)(files, rttm)
+    assert len(pipeline.processed) == len(files)
+    assert len(metric.results_) == len(files)
+    np.testing.assert_allclose(abs(metric), expected_metric(files),
+                               rtol=1e-3)
+
+    # nothing left to do: metric is computed from existing hypotheses
+    pipeline = ShiftPipeline()
+    metric = BatchRunner(pipeline)(files, rttm)
+    assert len(pipeline.processed) == 0
+    np.testing.assert_allclose(abs(metric), expected_metric(files),
+                               rtol=1e-3)
+
+
+def test_batch_runner_resume(protocol, tmp_path):
+    files = get_files(protocol)
+    rttm = tmp_path / 'output.rttm'
+    checkpoint = tmp_path / 'output.rttm.done'
+
+    BatchRunner(ShiftPipeline())(files[:-1], rttm)
+    complete = rttm.read_bytes()
+    BatchRunner(ShiftPipeline())(files[-1:], rttm)
+
+    # simulate a run interrupted while writing last checkpoint entry...
+    with open(checkpoint, 'rb+') as f:
+        f.truncate(len(checkpoint.read_bytes()) - 5)
+    # ... and a partially written hypothesis
+    with open(rttm, 'a') as f:
+        f.write('SPEAKER file0 1 0.000')
+
+    pipeline = ShiftPipeline()
+    metric = BatchRunner(pipeline)(files, rttm)
+
+    # only the last file (that shares its uri with the first one) is
+    # processed again
+    assert pipeline.processed == [files[-1]['uri']]
+    assert rttm.read_bytes().startswith(complete)
+    assert len(rttm.read_text().splitlines()) == \
+        sum(len(f['annotation']) for f in files)
+    np.testing.assert_allclose(abs(metric), expected_metric(files),
+                               rtol=1e-3)
+
+    # checkpoint can still be appended to
+    pipeline = ShiftPipeline()
+    BatchRunner(pipeline)(files, rttm)
+    assert pipeline.processed == []
+
+
+@pytest.mark.parametrize('n_jobs', [2])
+def test_batch_runner_parallel(protocol, tmp_path, n_jobs):
+    files = get_files(protocol)
+    metric = BatchRunner(ShiftPipeline(), n_jobs=n_jobs)(
+        files, tmp_path / 'output.rttm')
+    np.testing.assert_allclose(abs(metric), expected_metric(files),
+                               rtol=1e-3)
@@ -0,0 +1,70 @@
+import numpy as np
+import pytest
+from scipy.cluster.hierarchy import linkage
+from scipy.spatial.distance import squareform
+from pyannote.core.utils.distance import cdist, pdist
+from pyannote.audio.pipeline.clustering import weighted_pool_linkage
+
+
+def weighted_pool_linkage_baseline(X, weights, metric='cosine'):
+    """Straightforward (full matrix scan at each merge) implementation"""
+
+    n_samples, dimension = X.shape
+
+    C = np.empty((2 * n_samples - 1, dimension))
+    C[:n_samples] = X
+    W = np.empty((2 * n_samples - 1, ))
+    W[:n_samples] = weights
+    S = np.empty((2 * n_samples - 1, ), dtype=int)
+    S[:n_samples] = 1
+
+    D = squareform(pdist(X, metric=metric))
+    np.fill_diagonal(D, np.inf)
+    active = np.arange(n_samples)
+
+    Z = np.empty((n_samples - 1, 4))
+    for k in range(n_samples - 1):
+        i, j = sorted(np.unravel_index(np.argmin(D), D.shape))
+        u, v = active[i], active[j]
+        new = n_samples + k
+        W[new] = W[u] + W[v]
+        S[new] = S[u] + S[v]
+        C[new] = (W[u] * C[u] + W[v] * C[v]) / W[new]
+        Z[k] = [u, v, D[i, j], S[new]]
+        active[i] = new
+        D[i] = cdist(C[new][np.newaxis], C[active], metric=metric)[0]
+        D[i, i] = np.inf
+        D[:, i] = D[i]
+        D = np.delete(np.delete(D, j, axis=0), j, axis=1)
+        active = np.delete(active, j)
+
+    return Z
+
+
+@pytest.mark.parametrize('metric', ['cosine', 'euclidean', 'angular'])
+@pytest.mark.parametrize('n_samples', [2, 3, 50, 200])
+def test_weighted_pool_linkage(metric, n_samples):
+    rng = np.random.RandomState(n_samples)
+    X = rng.randn(n_samples, 16)
+    weights = rng.uniform(0.1, 10., size=n_samples)
+    np.testing.assert_array_equal(
+        weighted_pool_linkage(X, weights, metric=metric),
+        weighted_pool_linkage_baseline(X, weights, metric=metric))
+
+
+def test_weighted_pool_linkage_ties():
+    # many equal distances
+    X = np.repeat(np.eye(4), 5, axis=0)
+    weights = np.ones(len(X))
+    np.testing.assert_array_equal(
+        weighted_pool_linkage(X, weights, metric='euclidean'),
+        weighted_pool_linkage_baseline(X, weights, metric='euclidean'))
+
+
+def test_weighted_pool_linkage_centroid():
+    # with uniform weights and euclidean distance, 'pool' is 'centroid'
+    rng = np.random.RandomState(0)
+    X = rng.randn(100, 8)
+    Z = weighted_pool_linkage(X, np.ones(len(X)), metric='euclidean')
+    expected = linkage(X, method='centroid', metric='euclidean')
+    np.testing.assert_allclose(Z[:, 2:], expected[:, 2:])
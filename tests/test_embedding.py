@@ -0,0 +1,161 @@
+import itertools
+import numpy as np
+import pytest
+from pyannote.audio.features import RawAudio
+from pyannote.core import Annotation
+from pyannote.audio.embedding.generators import SpeechSegmentGenerator
+from pyannote.audio.embedding.generators import \
+    SessionWiseSpeechSegmentGenerator
+from pyannote.audio.embedding.generators import random_sub_segments
+from conftest import SAMPLE_RATE
+
+
+def get_generator(**kwargs):
+    feature_extraction = RawAudio(sample_rate=SAMPLE_RATE)
+    return SpeechSegmentGenerator(feature_extraction, per_label=2,
+                                  min_duration=0.5, max_duration=3.5,
+                                  n_buckets=3, **kwargs)
+
+
+def durations(batch):
+    return {len(X) / SAMPLE_RATE for X in batch['X']}
+
+
+def test_bucketed_batches(protocol):
+    np.random.seed(0)
+    generator = get_generator(per_epoch=1e-3, parallel=0)
+    batches = generator(protocol)
+    seen = set()
+    for batch in itertools.islice(batches, 30):
+        # all segments of a batch share the same duration
+        duration, = durations(batch)
+        seen.add(duration)
+        assert len(batch['X']) == len(batch['y'])
+    np.testing.assert_allclose(sorted(seen), generator.durations_, atol=1e-3)
+
+
+@pytest.mark.parametrize('parallel', [0, 2])
+def test_curriculum(protocol, parallel):
+    np.random.seed(0)
+    generator = get_generator(per_epoch=1e-3, curriculum=2,
+                              parallel=parallel)
+    generator.initialize(protocol)
+
+    # epochs are shorter (in batches) once longer buckets are available
+    n_batches = [generator.batches_in_epoch_(epoch) for epoch in range(3)]
+    assert n_batches[0] > n_batches[1] > n_batches[2]
+    assert n_batches[2] == generator.batches_per_epoch
+
+    batches = generator(protocol)
+    for epoch in range(4):
+        seen = set()
+        for b in range(n_batches[min(epoch, 2)]):
+            duration, = durations(next(batches))
+            seen.add(round(duration, 3))
+            np.testing.assert_allclose(generator.epoch_,
+                                       epoch + b / n_batches[min(epoch, 2)])
+
+        # only the shortest bucket during first epoch
+        if epoch == 0:
+            assert seen == {round(generator.durations_[0], 3)}
+        # no bucket is used before it becomes available
+        assert max(seen) <= round(generator.durations_[
+            generator.available_buckets_(epoch + 1)[-1]], 3)
+
+
+@pytest.mark.parametrize('params', [
+    {'duration': 1.}, {'min_duration': 1., 'max_duration': 2.},
+    {'max_duration': 2.}, {}])
+def test_random_sub_segments(params):
+    np.random.seed(0)
+    starts = np.random.uniform(0., 100., size=1000)
+    ends = starts + np.random.uniform(1., 4., size=1000)
+
+    sub_starts, sub_ends = random_sub_segments(starts, ends, **params)
+    durations = sub_ends - sub_starts
+
+    # sub-segments lie within their segment
+    assert np.all(sub_starts >= starts - 1e-9)
+    assert np.all(sub_ends <= ends + 1e-9)
+
+    if 'duration' in params:
+        np.testing.assert_allclose(durations, 1.)
+    elif 'min_duration' in params:
+        assert np.all(durations >= 1. - 1e-9)
+        assert np.all(durations <= np.minimum(ends - starts, 2.) + 1e-9)
+    elif 'max_duration' in params:
+        np.testing.assert_allclose(durations,
+                                   np.minimum(ends - starts, 2.))
+    else:
+        np.testing.assert_array_equal(sub_starts, starts)
+        np.testing.assert_array_equal(sub_ends, ends)
+
+
+class CropRecorder(object):
+    """Feature extraction that returns what it was asked to crop"""
+
+    def crop(self, current_file, segment, mode='center', fixed=None):
+        return current_file['uri'], segment
+
+
+@pytest.mark.parametrize('params', [{'duration': 1.},
+                                    {'min_duration': 1.5, 'max_duration': 3.}])
+def test_session_wise_samples(protocol, params):
+    np.random.seed(0)
+    generator = SessionWiseSpeechSegmentGenerator(
+        CropRecorder(), per_fold=2, per_label=3, parallel=0, **params)
+
+    # sessions without any usable speech turn are skipped
+    protocol.files_.append(dict(protocol.files_[0], uri='empty',
+                                annotation=Annotation(uri='empty')))
+    generator.initialize(protocol)
+    assert len(generator.sessions_) == 3
+
+    annotations = {f['uri']: f['annotation'] for f in protocol.files_}
+    samples = generator.samples()
+    for _ in range(20):
+        batch = [next(samples) for _ in range(generator.batch_size)]
+
+        # all samples of a batch come from the same session...
+        uris = {sample['X'][0] for sample in batch}
+        assert len(uris) == 1
+        annotation = annotations[uris.pop()]
+
+        for sample in batch:
+            _, segment = sample['X']
+            label = sample['extra']['label']
+
+            # ... and lie within a speech turn of their label
+            assert any(turn.start - 1e-6 <= segment.start and
+                       segment.end <= turn.end + 1e-6
+                       for turn in annotation.label_timeline(label))
+
+            if 'duration' in params:
+                assert np.isclose(segment.duration, params['duration'])
+            else:
+                assert params['min_duration'] - 1e-6 <= segment.duration
+                assert segment.duration <= params['max_duration'] + 1e-6
+
+        # per_label samples per label
+        ys = [sample['y'] for sample in batch]
+        assert ys == list(np.repeat(ys[::3], 3))
+
+
+def test_session_wise_batches(protocol):
+    feature_extraction = RawAudio(sample_rate=SAMPLE_RATE)
+
+    def first_batches(seed):
+        generator = SessionWiseSpeechSegmentGenerator(
+            feature_extraction, per_fold=2, per_label=2, duration=1.,
+            parallel=0, seed=seed)
+        return list(itertools.islice(generator(protocol), 3))
+
+    batches = first_batches(0)
+    for batch in batches:
+        assert np.array(batch['X']).shape == (4, SAMPLE_RATE, 1)
+        assert len(batch['y']) == 4
+        np.testing.assert_array_equal(batch['y_database'], 0)
+
+    # seeded generation is deterministic
+    for batch, same in zip(batches, first_batches(0)):
+        np.testing.assert_array_equal(batch['X'], same['X'])
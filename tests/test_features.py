@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from pyannote.core import Segment
+from pyannote.audio.features import RawAudio
+from pyannote.audio.features import LibrosaMFCC
+from pyannote.audio.augmentation.base import Augmentation
+from pyannote.audio.labeling.tasks.base import LabelingTaskGenerator
+from conftest import SAMPLE_RATE
+
+
+SEGMENTS = [Segment(0., 2.), Segment(1.3, 3.3), Segment(17.99, 19.99),
+            Segment(5.5, 7.5)]
+
+
+@pytest.mark.parametrize('fixed', [None, 2.])
+def test_raw_audio_crop_batch(protocol, fixed):
+    raw_audio = RawAudio(sample_rate=SAMPLE_RATE)
+    current_files = list(protocol.train())[:1] * len(SEGMENTS)
+
+    batch = raw_audio.crop_batch(current_files, SEGMENTS, mode='center',
+                                 fixed=fixed)
+
+    assert isinstance(batch, list)
+    for current_file, segment, waveform in zip(current_files, SEGMENTS,
+                                               batch):
+        expected = raw_audio.crop(current_file, segment, mode='center',
+                                  fixed=fixed)
+        assert waveform.shape == expected.shape
+        np.testing.assert_allclose(waveform, expected)
+
+
+class BrokenAugmentation(Augmentation):
+
+    def batch(self, waveforms, sample_rate):
+        return np.full(waveforms.shape, np.nan)
+
+
+def test_raw_audio_crop_batch_invalid_augmentation(protocol):
+    raw_audio = RawAudio(sample_rate=SAMPLE_RATE,
+                         augmentation=BrokenAugmentation())
+    current_files = list(protocol.train())[:1] * len(SEGMENTS)
+    with pytest.raises(ValueError) as excinfo:
+        raw_audio.crop_batch(current_files, SEGMENTS, fixed=2.)
+    assert excinfo.value.__cause__ is not None
+
+
+def test_feature_extraction_crop_batch(protocol):
+    feature_extraction = LibrosaMFCC(sample_rate=SAMPLE_RATE)
+    current_files = list(protocol.train())[:1] * len(SEGMENTS)
+
+    batch = feature_extraction.crop_batch(current_files, SEGMENTS,
+                                          mode='center', fixed=2.)
+
+    for current_file, segment, features in zip(current_files, SEGMENTS,
+                                               batch):
+        expected = feature_extraction.crop(current_file, segment,
+                                           mode='center', fixed=2.)
+        np.testing.assert_allclose(features, expected)
+
+
+@pytest.mark.parametrize('FeatureExtraction', [RawAudio, LibrosaMFCC])
+def test_labeling_random_samples(protocol, FeatureExtraction):
+    feature_extraction = FeatureExtraction(sample_rate=SAMPLE_RATE)
+    generator = LabelingTaskGenerator(feature_extraction, duration=2.,
+                                      batch_size=4, parallel=0)
+    generator.initialize(protocol)
+
+    n_samples = feature_extraction.sliding_window.samples(2., mode='center')
+    samples = generator.random_samples()
+    for _ in range(8):
+        sample = next(samples)
+        assert len(sample['X']) == n_samples
+        assert len(sample['y']) == n_samples
@@ -0,0 +1,204 @@
+import numpy as np
+import pytest
+from pyannote.core import Segment, Timeline
+from pyannote.database import get_unique_identifier
+from pyannote.audio.features import LibrosaMFCC
+from pyannote.audio.labeling.tasks.base import LabelingTaskGenerator
+from conftest import SAMPLE_RATE
+
+
+def get_generator(**kwargs):
+    feature_extraction = LibrosaMFCC(sample_rate=SAMPLE_RATE)
+    return LabelingTaskGenerator(feature_extraction, duration=2.,
+                                 batch_size=4, parallel=0, **kwargs)
+
+
+def assert_same_data(data, other):
+    assert list(data) == list(other)
+    for uri in data:
+        np.testing.assert_array_equal(data[uri]['starts'],
+                                      other[uri]['starts'])
+        np.testing.assert_array_equal(data[uri]['ends'], other[uri]['ends'])
+        np.testing.assert_array_equal(data[uri]['y'].data,
+                                      other[uri]['y'].data)
+
+
+def test_index(protocol, tmp_path):
+
+    reference = get_generator()
+    reference.initialize(protocol)
+
+    generator = get_generator(index_dir=tmp_path)
+    generator.initialize(protocol)
+    assert len(list(tmp_path.glob('train.*.npz'))) == 1
+    assert generator.labels_ == reference.labels_
+    assert_same_data(generator.data_, reference.data_)
+
+    # index is loaded (not rebuilt) when protocol did not change
+    def build_index(files):
+        raise AssertionError('index should not be rebuilt')
+    loaded = get_generator(index_dir=tmp_path)
+    loaded._build_index = build_index
+    loaded.initialize(protocol)
+    assert loaded.labels_ == reference.labels_
+    assert_same_data(loaded.data_, reference.data_)
+
+
+def test_index_crop_annotation(protocol, tmp_path):
+
+    # annotation extends beyond the end of the (20s long) file
+    current_file = protocol.files_[0]
+    current_file['annotation'][Segment(18., 25.)] = 'speaker0'
+
+    generator = get_generator(index_dir=tmp_path)
+    generator.initialize(protocol)
+    loaded = get_generator(index_dir=tmp_path)
+    loaded.initialize(protocol)
+
+    uri = get_unique_identifier(current_file)
+    built = generator.data_[uri]['current_file']['annotation']
+    assert built.get_timeline().extent().end == 20.
+    assert loaded.data_[uri]['current_file']['annotation'] == built
+
+
+@pytest.mark.parametrize('change', ['rename', 'annotated', 'annotation'])
+def test_index_invalidation(protocol, tmp_path, change):
+
+    generator = get_generator(index_dir=tmp_path)
+    generator.initialize(protocol)
+
+    current_file = protocol.files_[0]
+    if change == 'rename':
+        current_file['annotation'] = current_file['annotation'].rename_labels(
+            mapping={'speaker0': 'new_speaker'})
+    elif change == 'annotated':
+        current_file['annotated'] = current_file['annotated'].crop(
+            Segment(0, 10.))
+    elif change == 'annotation':
+        current_file['annotation'] = current_file['annotation'].crop(
+            Segment(0, 10.))
+
+    reference = get_generator()
+    reference.initialize(protocol)
+
+    generator = get_generator(index_dir=tmp_path)
+    generator.initialize(protocol)
+    assert generator.labels_ == reference.labels_
+    assert_same_data(generator.data_, reference.data_)
+
+    # changed protocol gets its own index (and does not overwrite previous one)
+    assert len(list(tmp_path.glob('train.*.npz'))) == 2
+
+
+def test_random_samples(protocol):
+    np.random.seed(0)
+
+    # files (and segments) have different annotated durations
+    protocol.files_[0]['annotated'] = Timeline([Segment(0, 5)])
+    protocol.files_[2]['annotated'] = Timeline([Segment(0, 8),
+                                                Segment(12, 20)])
+    generator = get_generator()
+    generator.initialize(protocol)
+
+    # record what is cropped rather than actually extracting features
+    def crop_batch(current_files, segments, mode='center', fixed=None):
+        return [(get_unique_identifier(current_file), segment)
+                for current_file, segment in zip(current_files, segments)]
+    generator.feature_extraction.crop_batch = crop_batch
+
+    samples = generator.random_samples()
+    n_batches = 1000
+    uris = []
+    for _ in range(n_batches):
+        batch = [next(samples) for _ in range(generator.batch_size)]
+        batch_uris = [sample['X'][0] for sample in batch]
+
+        # feature extraction is grouped by file
+        assert batch_uris == sorted(batch_uris)
+        uris.extend(batch_uris)
+
+        for sample in batch:
+            uri, segment = sample['X']
+            datum = generator.data_[uri]
+            assert np.isclose(segment.duration, generator.duration)
+            assert any(s.start <= segment.start and segment.end <= s.end
+                       for s in datum['segments'])
+            expected = datum['y'].crop(segment, mode='center',
+                                       fixed=generator.duration)
+            np.testing.assert_array_equal(sample['y'], np.squeeze(expected))
+
+    # files are chosen with probability proportional to their duration
+    uris = np.array(uris)
+    for uri, duration in [('Dummy/file0', 5.), ('Dummy/file1', 20.),
+                          ('Dummy/file2', 16.)]:
+        frequency = np.mean(uris == uri)
+        assert abs(frequency - duration / 41.) < 0.03
+
+
+def sliding_samples_baseline(generator, datum):
+    """Reference (crop-based) implementation of exhaustive samples"""
+    features = generator.feature_extraction(datum['current_file'])
+    duration = generator.duration
+    for segment in datum['current_file']['annotated']:
+        t = segment.start + np.random.random() * duration
+        while t + duration <= segment.end:
+            sequence = Segment(t, t + duration)
+            X = features.crop(sequence, mode='center', fixed=duration)
+            y = datum['y'].crop(sequence, mode='center', fixed=duration)
+            yield {'X': X, 'y': np.squeeze(y)}
+            t += duration
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_sliding_samples(protocol, shuffle):
+    protocol.files_[0]['annotated'] = Timeline([Segment(0, 8.5),
+                                                Segment(10, 20)])
+    generator = get_generator(exhaustive=True, shuffle=shuffle)
+    generator.initialize(protocol)
+
+    for seed, datum in enumerate(generator.data_.values()):
+
+        np.random.seed(seed)
+        samples = list(generator._sliding_samples(datum))
+        np.random.seed(seed)
+        expected = list(sliding_samples_baseline(generator, datum))
+        assert len(samples) == len(expected)
+
+        # samples are views of the features of the whole file
+        bases = {id(sample['X'].base) for sample in samples}
+        assert len(bases) == 1 and samples[0]['X'].base is not None
+
+        if shuffle:
+            key = lambda sample: sample['X'][0, 0]
+            samples = sorted(samples, key=key)
+            expected = sorted(expected, key=key)
+
+        for sample, expected_sample in zip(samples, expected):
+            np.testing.assert_array_equal(sample['X'], expected_sample['X'])
+            np.testing.assert_array_equal(sample['y'], expected_sample['y'])
+
+
+@pytest.mark.parametrize('shuffle_buffer', [0, 5])
+def test_sliding_samples_shuffle_buffer(protocol, shuffle_buffer):
+    np.random.seed(0)
+    generator = get_generator(exhaustive=True, shuffle_buffer=shuffle_buffer)
+    generator.initialize(protocol)
+
+    # ten samples per file, identified by (file, index) pairs
+    def _sliding_samples(datum):
+        for i in range(10):
+            yield {'X': datum['current_file']['uri'], 'y': i}
+    generator._sliding_samples = _sliding_samples
+
+    samples = generator.sliding_samples()
+    first = [next(samples) for _ in range(30 - shuffle_buffer)]
+
+    # all samples are eventually generated (once per pass over the files)...
+    assert len({(s['X'], s['y']) for s in first}) == len(first)
+
+    # ... and files are only mixed when using a shuffle buffer
+    changes = sum(a['X'] != b['X'] for a, b in zip(first[:-1], first[1:]))
+    if shuffle_buffer:
+        assert changes > 2
+    else:
+        assert changes == 2
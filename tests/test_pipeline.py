@@ -0,0 +1,287 @@
+import os
+import numpy as np
+import pytest
+from cachetools import LRUCache
+from pyannote.core import Segment, Timeline, Annotation
+from pyannote.core import SlidingWindow, SlidingWindowFeature
+from pyannote.audio.features import Precomputed
+from pyannote.audio.features.precomputed import \
+    PyannoteFeatureExtractionError
+from pyannote.audio.pipeline.utils import memoize
+from pyannote.audio.pipeline.utils import pool_embeddings, label_embeddings
+from pyannote.audio.pipeline.utils import load_precomputed
+from pyannote.audio.pipeline.online_speaker_diarization import \
+    OnlineSpeakerDiarization
+from pyannote.audio.pipeline.speech_turn_segmentation import \
+    SpeechTurnSegmentation
+
+
+SLIDING_WINDOW = SlidingWindow(start=0., duration=0.02, step=0.01)
+
+
+def random_scores(dimension=1, n_samples=1000, seed=0):
+    rng = np.random.RandomState(seed)
+    return SlidingWindowFeature(rng.rand(n_samples, dimension),
+                                SLIDING_WINDOW)
+
+
+def crop_embeddings(embedding, timeline):
+    """Reference (loop-based) implementation of `pool_embeddings`"""
+    for mode in ['strict', 'center', 'loose']:
+        x = embedding.crop(timeline, mode=mode)
+        if len(x) > 0:
+            return np.mean(x, axis=0)
+    return None
+
+
+def random_annotation(n_segments=300, n_labels=20, seed=0):
+    """Annotation with (possibly overlapping, very short or out of bounds)
+    speech turns"""
+    rng = np.random.RandomState(seed)
+    annotation = Annotation()
+    starts = rng.uniform(-2., 60., size=n_segments)
+    durations = rng.exponential(1., size=n_segments)
+    labels = rng.randint(n_labels, size=n_segments)
+    for t, (start, duration, label) in enumerate(zip(starts, durations,
+                                                     labels)):
+        annotation[Segment(start, start + duration), t] = f'speaker{label}'
+    return annotation
+
+
+def random_embedding(n_samples=200, dimension=8, seed=0):
+    rng = np.random.RandomState(seed)
+    sw = SlidingWindow(start=0., duration=1.5, step=0.25)
+    return SlidingWindowFeature(rng.randn(n_samples, dimension), sw)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_pool_embeddings(seed):
+    embedding = random_embedding(seed=seed)
+    annotation = random_annotation(seed=seed)
+    segments = list(annotation.itersegments())
+
+    X, found = pool_embeddings(embedding,
+                               [segment.start for segment in segments],
+                               [segment.end for segment in segments])
+
+    assert X.shape == (len(segments), 8)
+    for segment, x, f in zip(segments, X, found):
+        expected = crop_embeddings(embedding, Timeline([segment]))
+        if expected is None:
+            assert not f
+            assert np.all(np.isnan(x))
+        else:
+            assert f
+            np.testing.assert_allclose(x, expected)
+    assert not np.all(found)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_label_embeddings(seed):
+    embedding = random_embedding(seed=seed)
+    annotation = random_annotation(seed=seed)
+
+    labels, X, found = label_embeddings(embedding, annotation)
+
+    assert labels == annotation.labels()
+    for label, x, f in zip(labels, X, found):
+        expected = crop_embeddings(embedding,
+                                   annotation.label_timeline(label))
+        assert f == (expected is not None)
+        if f:
+            np.testing.assert_allclose(x, expected)
+
+
+def test_pool_embeddings_empty():
+    X, found = pool_embeddings(random_embedding(), [], [])
+    assert X.shape == (0, 8)
+    assert found.shape == (0, )
+
+
+class Counter(object):
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self):
+        self.count += 1
+        return self.count
+
+
+def test_memoize_params():
+    memo, compute = LRUCache(maxsize=10), Counter()
+    current_file = {'uri': 'file'}
+    assert memoize(memo, 'result', current_file, {'a': 1}, compute) == 1
+    assert memoize(memo, 'result', current_file, {'a': 1}, compute) == 1
+    assert memoize(memo, 'result', current_file, {'a': 2}, compute) == 2
+    assert memoize(memo, 'other', current_file, {'a': 1}, compute) == 3
+    assert memoize(memo, 'result', {'uri': 'other'}, {'a': 1}, compute) == 4
+
+
+def test_memoize_in_memory_scores():
+    memo, compute = LRUCache(maxsize=10), Counter()
+    current_file = {'uri': 'file', 'sad_scores': random_scores()}
+    scores = {'sad_scores': None}
+
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 1
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 1
+
+    # same file, new in-memory scores
+    current_file['sad_scores'] = random_scores(seed=1)
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 2
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 2
+
+
+def test_memoize_precomputed_scores(tmp_path):
+    precomputed = Precomputed(root_dir=tmp_path, sliding_window=SLIDING_WINDOW,
+                              dimension=1)
+    current_file = {'uri': 'file'}
+    path = precomputed.get_path(current_file)
+    np.save(path, random_scores().data)
+
+    memo, compute = LRUCache(maxsize=10), Counter()
+    scores = {'sad_scores': precomputed}
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 1
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 1
+
+    # precomputed scores were updated
+    np.save(path, random_scores(seed=1).data)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 2
+
+    # in-memory scores take precedence over precomputed ones
+    current_file['sad_scores'] = random_scores()
+    assert memoize(memo, 'sad', current_file, {}, compute, scores=scores) == 3
+
+
+def test_load_precomputed(tmp_path):
+    precomputed = Precomputed(root_dir=tmp_path, sliding_window=SLIDING_WINDOW,
+                              dimension=1)
+    current_file = {'uri': 'file'}
+    path = precomputed.get_path(current_file)
+    np.save(path, random_scores().data)
+
+    features = load_precomputed(precomputed, current_file)
+    np.testing.assert_array_equal(features.data, random_scores().data)
+    assert not features.data.flags.writeable
+
+    # loaded only once
+    assert load_precomputed(precomputed, current_file) is features
+
+    # derived features are computed only once per name
+    counter = Counter()
+
+    def derive(features):
+        counter()
+        return SlidingWindowFeature(1. - features.data,
+                                    features.sliding_window)
+
+    derived = load_precomputed(precomputed, current_file,
+                               derive=derive, name='complement')
+    np.testing.assert_array_equal(derived.data, 1. - features.data)
+    assert not derived.data.flags.writeable
+    assert load_precomputed(precomputed, current_file,
+                            derive=derive, name='complement') is derived
+    assert counter.count == 1
+    load_precomputed(precomputed, current_file,
+                     derive=derive, name='other')
+    assert counter.count == 2
+
+    # precomputed features were updated
+    np.save(path, random_scores(seed=1).data)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    features = load_precomputed(precomputed, current_file)
+    np.testing.assert_array_equal(features.data, random_scores(seed=1).data)
+    load_precomputed(precomputed, current_file,
+                     derive=derive, name='complement')
+    assert counter.count == 3
+
+
+def test_load_precomputed_missing(tmp_path):
+    precomputed = Precomputed(root_dir=tmp_path, sliding_window=SLIDING_WINDOW,
+                              dimension=1)
+    with pytest.raises(PyannoteFeatureExtractionError):
+        load_precomputed(precomputed, {'uri': 'missing'})
+
+
+def test_memoize_disabled():
+    memo, compute = LRUCache(maxsize=0), Counter()
+    current_file = {'uri': 'file'}
+    assert memoize(memo, 'result', current_file, {}, compute) == 1
+    assert memoize(memo, 'result', current_file, {}, compute) == 2
+
+
+def test_speech_turn_segmentation_memo():
+    pipeline = SpeechTurnSegmentation()
+    pipeline.instantiate({
+        'speech_activity_detection': {'onset': 0.5, 'offset': 0.5,
+                                      'min_duration_on': 0.,
+                                      'min_duration_off': 0.,
+                                      'pad_onset': 0., 'pad_offset': 0.},
+        'speaker_change_detection': {'alpha': 0.5, 'min_duration': 0.}})
+
+    current_file = {'uri': 'file',
+                    'sad_scores': random_scores(dimension=2),
+                    'scd_scores': random_scores()}
+    speech_turns = pipeline(current_file)
+    assert pipeline(current_file).get_timeline() == \
+        speech_turns.get_timeline()
+
+    # replacing scores of a file must not return stale speech turns
+    current_file['sad_scores'] = random_scores(dimension=2, seed=1)
+    current_file['scd_scores'] = random_scores(seed=1)
+    expected = SpeechTurnSegmentation(memo_size=0)
+    expected.instantiate(pipeline.parameters(instantiated=True))
+    assert pipeline(current_file).get_timeline() == \
+        expected(current_file).get_timeline()
+    assert pipeline(current_file).get_timeline() != \
+        speech_turns.get_timeline()
+
+
+class BruteForceOnlineSpeakerDiarization(OnlineSpeakerDiarization):
+    """Re-clustering considering all pairs of speakers"""
+
+    def _merge(self):
+        self.updated_[:self.n_speakers_] = True
+        super()._merge()
+
+
+@pytest.mark.parametrize('recluster', [0, 1, 5])
+def test_online_speaker_diarization(recluster):
+    rng = np.random.RandomState(0)
+    centers = rng.randn(6, 8)
+    X = centers[rng.randint(6, size=300)] + 0.7 * rng.randn(300, 8)
+    weights = rng.uniform(0.5, 3., size=300)
+
+    pipeline = OnlineSpeakerDiarization(metric='euclidean',
+                                        recluster=recluster)
+    pipeline.instantiate({'threshold': 1.5})
+    reference = BruteForceOnlineSpeakerDiarization(metric='euclidean',
+                                                   recluster=recluster)
+    reference.instantiate({'threshold': 1.5})
+
+    speakers = [pipeline.update(x, weight=w) for x, w in zip(X, weights)]
+    expected = [reference.update(x, weight=w) for x, w in zip(X, weights)]
+    assert speakers == expected
+    assert [pipeline.speaker(k) for k in speakers] == \
+        [reference.speaker(k) for k in expected]
+
+    # no two remaining speakers are closer than threshold after re-clustering
+    if recluster == 1:
+        n = pipeline.n_speakers_
+        active = np.flatnonzero(pipeline.parent_[:n] == np.arange(n))
+        centroids = pipeline.sums_[active] / \
+            pipeline.weights_[active, np.newaxis]
+        distance = np.linalg.norm(centroids[:, np.newaxis] - centroids,
+                                  axis=2)
+        np.fill_diagonal(distance, np.inf)
+        assert np.min(distance) > 1.5
+
+
+def test_online_speaker_diarization_without_embedding():
+    pipeline = OnlineSpeakerDiarization()
+    pipeline.instantiate({'threshold': 0.5})
+    with pytest.raises(ValueError):
+        pipeline({'uri': 'file'})
@@ -0,0 +1,374 @@
+import itertools
+import numpy as np
+import pytest
+from pyannote.core import Segment, Timeline, Annotation
+from pyannote.core import SlidingWindow, SlidingWindowFeature
+import scipy.signal
+from pyannote.audio.signal import hysteresis, transitions, Binarize, Peak
+from pyannote.audio.signal import GMMResegmentation, viterbi
+from sklearn.mixture import GaussianMixture
+
+
+def hysteresis_loop(y, onset, offset, initial=False):
+    """Reference implementation of `hysteresis`"""
+    active = initial
+    states = []
+    for y_ in y:
+        if active:
+            active = not (y_ < offset)
+        else:
+            active = y_ > onset
+        states.append(active)
+    return np.array(states, dtype=bool)
+
+
+def binarize_baseline(predictions, onset=0.5, offset=0.5, pad_onset=0.,
+                      pad_offset=0., min_duration_on=0., min_duration_off=0.):
+    """Reference (loop-based) implementation of Binarize.apply"""
+
+    data = predictions.data[:, 0]
+    window = predictions.sliding_window
+    timestamps = [window[i].middle for i in range(len(data))]
+
+    start = timestamps[0]
+    label = data[0] > onset
+
+    active = Timeline()
+    for t, y in zip(timestamps[1:], data[1:]):
+        if label:
+            if y < offset:
+                active.add(Segment(start - pad_onset, t + pad_offset))
+                start = t
+                label = False
+        else:
+            if y > onset:
+                start = t
+                label = True
+
+    if label:
+        active.add(Segment(start - pad_onset, t + pad_offset))
+
+    active = active.support()
+    active = Timeline([s for s in active if s.duration > min_duration_on])
+    for s in active.gaps():
+        if s.duration < min_duration_off:
+            active.add(s)
+    return active.support()
+
+
+def peak_baseline(predictions, alpha=0.5, min_duration=1.0,
+                  scale='absolute'):
+    """Reference (loop-based) implementation of Peak.apply"""
+
+    y = predictions.data[:, 0]
+    sw = predictions.sliding_window
+
+    order = max(1, int(np.rint(min_duration / sw.step)))
+    indices = scipy.signal.argrelmax(y, order=order)[0]
+
+    if scale == 'absolute':
+        mini, maxi = 0, 1
+    elif scale == 'relative':
+        mini, maxi = np.nanmin(y), np.nanmax(y)
+    elif scale == 'percentile':
+        mini, maxi = np.nanpercentile(y, 1), np.nanpercentile(y, 99)
+    threshold = mini + alpha * (maxi - mini)
+
+    peak_time = [sw[i].middle for i in indices if y[i] > threshold]
+    boundaries = [sw[0].start] + peak_time + [sw[len(y)].end]
+
+    segmentation = Timeline()
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        segmentation.add(Segment(start, end))
+    return segmentation
+
+
+def random_scores(n_samples=1000, seed=0):
+    """Smooth random scores in [0, 1]"""
+    np.random.seed(seed)
+    y = np.convolve(np.random.rand(n_samples), np.ones(10) / 10, mode='same')
+    y = (y - y.min()) / (y.max() - y.min())
+    sw = SlidingWindow(start=0., duration=0.02, step=0.01)
+    return SlidingWindowFeature(y[:, np.newaxis], sw)
+
+
+def assert_same_timeline(timeline, expected):
+    assert len(timeline) == len(expected)
+    for segment, expected_segment in zip(timeline, expected):
+        assert np.isclose(segment.start, expected_segment.start)
+        assert np.isclose(segment.end, expected_segment.end)
+
+
+@pytest.mark.parametrize('onset, offset', [(0.6, 0.4), (0.5, 0.5),
+                                           (0.4, 0.6)])
+@pytest.mark.parametrize('initial', [False, True])
+def test_hysteresis(onset, offset, initial):
+    np.random.seed(0)
+    y = np.random.rand(500)
+    y[::37] = np.nan
+    np.testing.assert_array_equal(
+        hysteresis(y, onset, offset, initial=initial),
+        hysteresis_loop(y, onset, offset, initial=initial))
+
+
+def test_hysteresis_many_thresholds():
+    np.random.seed(0)
+    y = np.random.rand(200)
+    onsets = np.array([0.3, 0.5, 0.7])
+    offsets = np.array([0.2, 0.6, 0.5])
+    active = hysteresis(y, onsets, offsets)
+    assert active.shape == (3, 200)
+    for k, (onset, offset) in enumerate(zip(onsets, offsets)):
+        np.testing.assert_array_equal(active[k],
+                                      hysteresis_loop(y, onset, offset))
+
+
+def test_transitions():
+    active = np.array([1, 1, 0, 0, 1, 0, 1], dtype=bool)
+    onsets, offsets = transitions(active, initial=False)
+    np.testing.assert_array_equal(onsets, [0, 4, 6])
+    np.testing.assert_array_equal(offsets, [2, 5])
+
+
+@pytest.mark.parametrize('params', [
+    {'onset': 0.5, 'offset': 0.5},
+    {'onset': 0.7, 'offset': 0.3},
+    {'onset': 0.6, 'offset': 0.4, 'pad_onset': 0.05, 'pad_offset': 0.1},
+    {'onset': 0.6, 'offset': 0.4, 'min_duration_on': 0.1,
+     'min_duration_off': 0.2},
+])
+def test_binarize(params):
+    predictions = random_scores()
+    assert_same_timeline(Binarize(**params).apply(predictions),
+                         binarize_baseline(predictions, **params))
+
+
+@pytest.mark.parametrize('pad_onset, pad_offset', [(0.2, 0.3), (-0.02, 0.),
+                                                   (0., -0.05)])
+@pytest.mark.parametrize('min_duration_on, min_duration_off',
+                         [(0., 0.), (0.15, 0.), (0., 0.5), (0.3, 0.3)])
+def test_binarize_post_processing(pad_onset, pad_offset,
+                                  min_duration_on, min_duration_off):
+    # large padding makes segments overlap, negative padding empties them
+    predictions = random_scores(seed=1)
+    params = {'onset': 0.6, 'offset': 0.4,
+              'pad_onset': pad_onset, 'pad_offset': pad_offset,
+              'min_duration_on': min_duration_on,
+              'min_duration_off': min_duration_off}
+    assert_same_timeline(Binarize(**params).apply(predictions),
+                         binarize_baseline(predictions, **params))
+
+
+@pytest.mark.parametrize('scale', ['absolute', 'relative', 'percentile'])
+@pytest.mark.parametrize('scores', ['smooth', 'quantized', 'nan'])
+def test_binarize_apply_batch(scale, scores):
+    predictions = [random_scores(seed=seed) for seed in range(3)]
+    if scores == 'quantized':
+        # thresholds equal to some scores
+        for prediction in predictions:
+            prediction.data[:] = np.round(prediction.data, 1)
+    elif scores == 'nan':
+        for prediction in predictions:
+            prediction.data[::37] = np.nan
+
+    thresholds = np.linspace(0., 1., num=21)[1:-1]
+    binarize = Binarize(scale=scale, pad_onset=0.02, min_duration_off=0.05)
+    active = binarize.apply_batch(predictions, thresholds)
+
+    for prediction, timelines in zip(predictions, active):
+        for threshold, timeline in zip(thresholds, timelines):
+            expected = Binarize(onset=threshold, offset=threshold,
+                                scale=scale, pad_onset=0.02,
+                                min_duration_off=0.05).apply(prediction)
+            assert_same_timeline(timeline, expected)
+
+
+def test_binarize_apply_batch_onset_offset():
+    predictions = [random_scores()]
+    onsets = np.array([0.3, 0.5, 0.7])
+    offsets = np.array([0.2, 0.6, 0.5])
+    active, = Binarize().apply_batch(predictions, onsets, offset=offsets)
+    for onset, offset, timeline in zip(onsets, offsets, active):
+        expected = Binarize(onset=onset, offset=offset).apply(predictions[0])
+        assert_same_timeline(timeline, expected)
+
+
+@pytest.mark.parametrize('initial', [False, True])
+def test_crossings(initial):
+    y = random_scores().data[1:, 0]
+    thresholds = np.random.RandomState(0).rand(50)
+    initial = np.full(50, initial)
+    crossings = Binarize._crossings(y, thresholds, thresholds, initial)
+    assert crossings is not None
+    for threshold, i, (onsets, offsets) in zip(thresholds, initial,
+                                              crossings):
+        expected = transitions(hysteresis(y, threshold, threshold, initial=i),
+                               initial=i)
+        np.testing.assert_array_equal(onsets, expected[0])
+        np.testing.assert_array_equal(offsets, expected[1])
+
+    # shortcut does not apply when a threshold is equal to one of the scores
+    thresholds[0] = y[10]
+    assert Binarize._crossings(y, thresholds, thresholds, initial) is None
+
+
+@pytest.mark.parametrize('scale', ['absolute', 'relative', 'percentile'])
+@pytest.mark.parametrize('alpha, min_duration', [(0.2, 0.1), (0.5, 0.5),
+                                                 (0.8, 1.)])
+def test_peak(scale, alpha, min_duration):
+    predictions = random_scores()
+    peak = Peak(alpha=alpha, min_duration=min_duration, scale=scale)
+    expected = peak_baseline(predictions, alpha=alpha,
+                             min_duration=min_duration, scale=scale)
+    assert_same_timeline(peak.apply(predictions), expected)
+    # second call goes through the local maxima cache
+    assert_same_timeline(peak.apply(predictions), expected)
+
+
+def test_peak_cache():
+    predictions = random_scores()
+    for min_duration in [0.1, 1.]:
+        expected = peak_baseline(predictions, min_duration=min_duration)
+        assert_same_timeline(
+            Peak(min_duration=min_duration).apply(predictions), expected)
+
+    # modified scores must not use cached local maxima
+    predictions.data[:] = predictions.data[::-1]
+    assert_same_timeline(Peak().apply(predictions),
+                         peak_baseline(predictions))
+
+
+def test_peak_dimension():
+    predictions = random_scores()
+    data = np.hstack([np.zeros_like(predictions.data), predictions.data])
+    multi = SlidingWindowFeature(data, predictions.sliding_window)
+    assert_same_timeline(Peak().apply(multi, dimension=1),
+                         peak_baseline(predictions))
+
+
+@pytest.mark.parametrize('scale', ['absolute', 'relative'])
+def test_peak_apply_batch(scale):
+    predictions = [random_scores(seed=seed) for seed in range(3)]
+    alphas = np.linspace(0., 1., num=11)
+    peak = Peak(min_duration=0.2, scale=scale)
+    segmentations = peak.apply_batch(predictions, alphas)
+    for prediction, timelines in zip(predictions, segmentations):
+        assert len(timelines) == len(alphas)
+        for alpha, timeline in zip(alphas, timelines):
+            expected = Peak(alpha=alpha, min_duration=0.2,
+                            scale=scale).apply(prediction)
+            assert_same_timeline(timeline, expected)
+
+
+def two_speakers(seed=0):
+    """Features of two speakers (changing at 5s) sharing 'phonetic' clusters,
+    and initial annotation with speaker change (wrongly) located at 4s"""
+    np.random.seed(seed)
+    phones = np.array([[3., 0, 0, 0], [0, 3., 0, 0], [0, 0, 3., 0],
+                       [-3., -3., 0, 0]])
+    speaker = np.vstack([np.zeros((500, 4)), np.ones((500, 4))])
+    X = phones[np.random.randint(4, size=1000)] + speaker \
+        + 0.5 * np.random.randn(1000, 4)
+    sw = SlidingWindow(start=0., duration=0.02, step=0.01)
+    annotation = Annotation()
+    annotation[Segment(0, 4)] = 'A'
+    annotation[Segment(4, 10)] = 'B'
+    return annotation, SlidingWindowFeature(X, sw)
+
+
+def test_gmm_resegmentation_score():
+    _, features = two_speakers()
+    X = features.data
+    gmms = [GaussianMixture(n_components=3, covariance_type='diag',
+                            random_state=0).fit(X[i:i + 500])
+            for i in [0, 500]]
+
+    weights = np.stack([gmm.weights_ for gmm in gmms])
+    means = np.stack([gmm.means_ for gmm in gmms])
+    covariances = np.stack([gmm.covariances_ for gmm in gmms])
+
+    # scoring by blocks of frames gives sklearn's log-likelihood
+    log_probs = GMMResegmentation(block_size=17)._score(X, weights, means,
+                                                        covariances)
+    np.testing.assert_allclose(
+        log_probs, np.vstack([gmm.score_samples(X) for gmm in gmms]))
+
+
+@pytest.mark.parametrize('params', [{}, {'n_jobs': 2}, {'ubm': True}])
+def test_gmm_resegmentation(params):
+    annotation, features = two_speakers()
+    hypothesis = GMMResegmentation(n_components=4, **params).apply(
+        annotation, features)
+    assert hypothesis.labels() == ['A', 'B']
+    (first, _, label), _ = hypothesis.itertracks(yield_label=True)
+    assert label == 'A'
+    assert abs(first.end - 5.) < 0.3
+
+
+def viterbi_brute_force(scores, penalty=0., min_duration=1, non_speech=None):
+    """Reference implementation of `viterbi` (exhaustive search)"""
+
+    n_frames, n_states = scores.shape
+    min_duration = np.broadcast_to(min_duration, (n_states, ))
+
+    best, best_score = None, -np.inf
+    for states in itertools.product(range(n_states), repeat=n_frames):
+        states = np.array(states)
+
+        # all segments but first and last must be long enough
+        change = np.where(np.diff(states) != 0)[0] + 1
+        boundaries = np.hstack([[0], change, [n_frames]])
+        durations = np.diff(boundaries)
+        if any(d < min_duration[states[b]]
+               for b, d in zip(boundaries[1:-2], durations[1:-1])):
+            continue
+
+        score = np.sum(scores[np.arange(n_frames), states])
+        for previous, current in zip(states[change - 1], states[change]):
+            if non_speech not in [previous, current]:
+                score -= penalty
+
+        if score > best_score:
+            best, best_score = states, score
+
+    return best
+
+
+@pytest.mark.parametrize('penalty, min_duration, non_speech', [
+    (0., 1, None), (1., 1, None), (0., 3, None), (0.5, [1, 2, 3], None),
+    (1., 2, 0), (2., [3, 1, 2], 1)])
+@pytest.mark.parametrize('seed', range(3))
+def test_viterbi(penalty, min_duration, non_speech, seed):
+    np.random.seed(seed)
+    scores = np.random.randn(8, 3)
+    np.testing.assert_array_equal(
+        viterbi(scores, penalty=penalty, min_duration=min_duration,
+                non_speech=non_speech),
+        viterbi_brute_force(scores, penalty=penalty,
+                            min_duration=min_duration, non_speech=non_speech))
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 100, 1000])
+def test_viterbi_chunks(chunk_size):
+    np.random.seed(0)
+    scores = np.random.randn(500, 4)
+    expected = viterbi(scores, penalty=2., min_duration=[5, 3, 4, 2],
+                       non_speech=0)
+    np.testing.assert_array_equal(
+        viterbi(scores, penalty=2., min_duration=[5, 3, 4, 2],
+                non_speech=0, chunk_size=chunk_size), expected)
+
+
+def test_viterbi_negative_penalty():
+    with pytest.raises(ValueError):
+        viterbi(np.zeros((10, 2)), penalty=-1.)
+
+
+def test_gmm_resegmentation_viterbi():
+    annotation, features = two_speakers()
+    hypothesis = GMMResegmentation(n_components=4, penalty=5.,
+                                   min_duration=0.5).apply(annotation,
+                                                           features)
+    (first, _, label), _ = hypothesis.itertracks(yield_label=True)
+    assert label == 'A'
+    assert abs(first.end - 5.) < 0.1
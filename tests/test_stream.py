@@ -0,0 +1,213 @@
+import numpy as np
+import pytest
+from pyannote.core import SlidingWindow, SlidingWindowFeature
+from pyannote.audio.signal import Peak
+from pyannote.audio.stream import Stream, StreamBinarize, StreamToTimeline
+from pyannote.audio.stream import StreamPeak
+from pyannote.audio.stream import Pipeline, StreamBuffer, StreamStats
+from pyannote.audio.stream import StreamPredict, StreamSplit
+
+
+def binarize_loop(data, onset, offset):
+    """Reference (baseline) implementation of StreamBinarize"""
+    binarized = np.zeros(data.shape, dtype=bool)
+    active = data[0] > onset
+    for i, y in enumerate(data):
+        active = np.where(active, ~(y < offset), y > onset)
+        binarized[i] = active
+    return binarized
+
+
+def chunks(data, n_chunks, step=0.01):
+    """Split data into `n_chunks` consecutive SlidingWindowFeature chunks"""
+    sizes = np.array_split(np.arange(len(data)), n_chunks)
+    for indices in sizes:
+        sw = SlidingWindow(start=indices[0] * step, duration=step, step=step)
+        yield SlidingWindowFeature(data[indices], sw)
+
+
+@pytest.mark.parametrize('dimension', [1, 2])
+def test_stream_binarize_chunks(dimension):
+    np.random.seed(0)
+    data = np.random.rand(300, dimension)
+    expected = binarize_loop(data, 0.6, 0.4)
+
+    binarize = StreamBinarize(onset=0.6, offset=0.4)
+    binarized = [binarize(chunk).data for chunk in chunks(data, 3)]
+
+    for chunk in binarized:
+        assert chunk.shape[1] == dimension
+    np.testing.assert_array_equal(np.vstack(binarized), expected)
+
+
+def test_stream_binarize_one_dimensional_chunks():
+    np.random.seed(1)
+    data = np.random.rand(100)
+    expected = binarize_loop(data, 0.7, 0.3)
+
+    binarize = StreamBinarize(onset=0.7, offset=0.3)
+    binarized = [binarize(chunk).data for chunk in chunks(data, 4)]
+    np.testing.assert_array_equal(np.hstack(binarized), expected)
+
+
+def test_stream_to_timeline():
+    data = np.array([0, 1, 1, 0, 0, 1, 1, 1, 0, 1, 1], dtype=bool)
+    sw = SlidingWindow(start=0., duration=1., step=1.)
+    to_timeline = StreamToTimeline()
+
+    for sequence in [data, data[:, np.newaxis]]:
+        timeline = to_timeline(SlidingWindowFeature(sequence, sw))
+        assert [(s.start, s.end) for s in timeline] == \
+            [(1.5, 3.5), (5.5, 8.5), (9.5, 10.5)]
+
+
+def test_stream_to_timeline_multi_dimensional():
+    sw = SlidingWindow(start=0., duration=1., step=1.)
+    with pytest.raises(ValueError):
+        StreamToTimeline()(SlidingWindowFeature(np.ones((10, 2)), sw))
+
+
+def smooth_scores(n_samples=1000, seed=0):
+    np.random.seed(seed)
+    y = np.convolve(np.random.rand(n_samples), np.ones(10) / 10, mode='same')
+    return ((y - y.min()) / (y.max() - y.min()))[:, np.newaxis]
+
+
+@pytest.mark.parametrize('n_chunks', [1, 7, 50])
+@pytest.mark.parametrize('min_duration', [0.05, 0.3])
+def test_stream_peak(n_chunks, min_duration):
+    data = smooth_scores()
+    peak = StreamPeak(alpha=0.4, min_duration=min_duration)
+
+    segments = []
+    for chunk in chunks(data, n_chunks):
+        output = peak(chunk)
+        if output is Stream.NoNewData:
+            continue
+        # peaks are only confirmed once enough look-ahead is available
+        chunk_end = chunk.sliding_window[len(chunk.data)].end
+        for segment in output:
+            assert segment.end <= chunk_end - min_duration + 0.02
+        segments.extend(output)
+    segments.extend(peak(Stream.EndOfStream))
+    assert peak(Stream.EndOfStream) == Stream.EndOfStream
+
+    sw = SlidingWindow(start=0., duration=0.01, step=0.01)
+    expected = Peak(alpha=0.4, min_duration=min_duration).apply(
+        SlidingWindowFeature(data, sw))
+    assert len(segments) == len(expected)
+    for segment, expected_segment in zip(segments, expected):
+        assert np.isclose(segment.start, expected_segment.start)
+        assert np.isclose(segment.end, expected_segment.end)
+
+
+def stream(data, n_chunks):
+    """Simulate input stream of `n_chunks` chunks followed by end-of-stream"""
+    yield from chunks(data, n_chunks)
+    while True:
+        yield Stream.EndOfStream
+
+
+def test_stream_stats_histogram():
+    stats = StreamStats(buckets=[0.1, 1.])
+    for wall_time in [0.05, 0.5, 0.5, 5.]:
+        stats.observe('module', wall_time)
+    stats.gauge('module', 'delay_seconds', 3.2)
+
+    assert stats.calls_['module'] == 4
+    assert np.isclose(stats.wall_time_['module'], 6.05)
+    np.testing.assert_array_equal(stats.histogram_['module'], [1, 2, 1])
+
+    text = stats.to_prometheus(prefix='test')
+    assert 'test_wall_time_seconds_bucket{module="module",le="0.1"} 1' in text
+    assert 'test_wall_time_seconds_bucket{module="module",le="1"} 3' in text
+    assert 'test_wall_time_seconds_bucket{module="module",le="+Inf"} 4' in text
+    assert 'test_wall_time_seconds_count{module="module"} 4' in text
+    assert 'test_delay_seconds{module="module"} 3.2' in text
+
+
+def test_pipeline_stats():
+    np.random.seed(0)
+    data = np.random.rand(1000, 1)
+
+    def dsk():
+        return {'buffer': (StreamBuffer(duration=2., step=1.), 'input'),
+                'binarize': (StreamBinarize(onset=0.6, offset=0.4), 'buffer')}
+
+    expected = [o['binarize'] for o in Pipeline(dsk())(stream(data, 10))]
+
+    stats = StreamStats()
+    outputs = [o['binarize'] for o in
+               Pipeline(dsk(), stats=stats)(stream(data, 10))]
+
+    # instrumentation does not change outputs
+    assert len(outputs) == len(expected)
+    for output, expected_output in zip(outputs, expected):
+        if expected_output in [Stream.NoNewData, Stream.EndOfStream]:
+            assert output is expected_output
+        else:
+            np.testing.assert_array_equal(output.data, expected_output.data)
+
+    # every module is called once per pipeline step
+    n_steps = len(outputs) + 1
+    assert stats.calls_['buffer'] == n_steps
+    assert stats.calls_['binarize'] == n_steps
+
+    assert stats.gauges_['buffer']['delay_seconds'] == 2.
+    assert 'buffered_samples' in stats.gauges_['buffer']
+    assert np.isclose(stats.gauges_['pipeline']['audio_time_seconds'], 10.)
+    assert stats.gauges_['pipeline']['real_time_factor'] > 0
+
+
+class DummyModel(object):
+    """Sequence labeling model returning the cumulated sum of features"""
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, X, batch_size=32):
+        self.calls.append(len(X))
+        return np.cumsum(X, axis=1)
+
+
+def test_stream_predict_multi_channel():
+    np.random.seed(0)
+    data = np.random.rand(100, 2, 3)
+    sw = SlidingWindow(start=0., duration=0.01, step=0.01)
+
+    model = DummyModel()
+    predicted = StreamPredict(model)(SlidingWindowFeature(data, sw))
+
+    # one single model call for all channels
+    assert model.calls == [2]
+    assert predicted.data.shape == (100, 2, 3)
+
+    for c in range(2):
+        mono = StreamPredict(DummyModel())(
+            SlidingWindowFeature(data[:, c], sw))
+        np.testing.assert_allclose(predicted.data[:, c], mono.data)
+
+
+def test_stream_split():
+    np.random.seed(0)
+    data = np.random.rand(1000, 2, 3)
+
+    dsk = {'buffer': (StreamBuffer(duration=2., step=1.), 'input'),
+           'predict': (StreamPredict(DummyModel(), dimension=0), 'buffer')}
+    for c in [1, 2]:
+        dsk[f'split_{c}'] = (StreamSplit(c), 'predict')
+
+    n_outputs = 0
+    for outputs in Pipeline(dsk)(stream(data, 10)):
+        predicted = outputs['predict']
+        if predicted in [Stream.NoNewData, Stream.EndOfStream]:
+            assert outputs['split_1'] is predicted
+            assert outputs['split_2'] is predicted
+            continue
+        n_outputs += 1
+        for c in [1, 2]:
+            split = outputs[f'split_{c}']
+            assert split.sliding_window is predicted.sliding_window
+            np.testing.assert_array_equal(split.data,
+                                          predicted.data[:, c - 1])
+    assert n_outputs > 0
@@ -0,0 +1,227 @@
+import itertools
+import multiprocessing
+import numpy as np
+import pytest
+
+torch = pytest.importorskip('torch')
+from pyannote.audio.train.loader import BatchLoader
+from pyannote.audio.train.trainer import Trainer
+from pyannote.audio.train import distributed
+
+
+def batches():
+    """Infinite generator of random batches"""
+    for i in itertools.count():
+        yield {'X': np.random.rand(4, 3), 'y': np.arange(4) + i}
+
+
+def load(n_batches, **kwargs):
+    loader = iter(BatchLoader(batches, **kwargs))
+    loaded = [next(loader) for _ in range(n_batches)]
+    loader.close()
+    return loaded
+
+
+def test_batch_loader():
+    loaded = load(12, n_workers=3, prefetch=2, seed=0)
+
+    for batch in loaded:
+        assert isinstance(batch['X'], np.ndarray)
+        assert batch['X'].shape == (4, 3)
+
+    # workers are read in round-robin order
+    np.testing.assert_array_equal([batch['y'][0] for batch in loaded],
+                                  np.repeat(np.arange(4), 3))
+
+    # worker #i is seeded with seed + i
+    for i, batch in enumerate(loaded[:3]):
+        np.random.seed(i)
+        np.testing.assert_array_equal(batch['X'], np.random.rand(4, 3))
+
+
+def test_batch_loader_seed():
+    loaded = load(9, n_workers=3, seed=1)
+    same = load(9, n_workers=3, seed=1)
+    other = load(9, n_workers=3, seed=2)
+    for batch, same_batch in zip(loaded, same):
+        np.testing.assert_array_equal(batch['X'], same_batch['X'])
+    assert not np.allclose(loaded[0]['X'], other[0]['X'])
+
+
+def test_batch_loader_workers_stop():
+    load(3, n_workers=2)
+    assert not multiprocessing.active_children()
+
+
+def failing_batches():
+    yield {'X': np.zeros((4, 3))}
+    raise ValueError('batch generation failed')
+
+
+def test_batch_loader_dead_worker():
+    loader = iter(BatchLoader(failing_batches, n_workers=1))
+    # depending on when the worker dies, its only batch may not be received
+    with pytest.raises(RuntimeError):
+        for _ in range(2):
+            next(loader)
+
+
+class Regression(Trainer):
+    """Least squares regression on random batches"""
+
+    def __init__(self, batches_per_epoch=6):
+        super().__init__()
+        self.batches_per_epoch = batches_per_epoch
+        self.n_batches = 0
+
+    def get_batch_generator(self, feature_extraction):
+        return self
+
+    def __call__(self, protocol, subset='train'):
+        rng = np.random.RandomState(0)
+        while True:
+            self.n_batches += 1
+            yield {'X': rng.randn(8, 3), 'y': rng.randn(8, 1)}
+
+    def batch_loss(self, batch, model, device, writer=None):
+        X = self.as_tensor(batch['X'], device)
+        y = self.as_tensor(batch['y'], device)
+        return torch.mean((model(X) - y) ** 2)
+
+
+def gradients(model):
+    return [p.grad.detach().numpy().copy() for p in model.parameters()]
+
+
+def test_as_tensor():
+    device = torch.device('cpu')
+    X = np.random.rand(4, 3).astype(np.float32)
+    assert np.shares_memory(Trainer.as_tensor(X, device).numpy(), X)
+    X = np.random.rand(3, 4).T
+    tensor = Trainer.as_tensor(X, device)
+    assert tensor.dtype == torch.float32
+    assert tensor.is_contiguous()
+
+
+def test_backward_accumulate():
+    torch.manual_seed(0)
+    model = torch.nn.Linear(3, 1)
+    device = torch.device('cpu')
+    trainer = Regression()
+    batches = list(itertools.islice(trainer(None), 3))
+
+    model.zero_grad()
+    loss, _ = trainer.backward(iter(batches), model, device, accumulate=3)
+    accumulated = gradients(model)
+
+    # same as one (three times larger) batch
+    model.zero_grad()
+    batch = {'X': np.vstack([b['X'] for b in batches]),
+             'y': np.vstack([b['y'] for b in batches])}
+    expected = trainer.batch_loss(batch, model, device)
+    expected.backward()
+
+    assert np.isclose(loss, expected.item())
+    for gradient, expected_gradient in zip(accumulated, gradients(model)):
+        np.testing.assert_allclose(gradient, expected_gradient, rtol=1e-5)
+
+
+def test_backward_mixed_precision():
+    model = torch.nn.Linear(3, 1)
+    device = torch.device('cpu')
+    trainer = Regression()
+
+    if not hasattr(torch, 'autocast'):
+        with pytest.raises(ValueError):
+            trainer.backward(trainer(None), model, device,
+                             mixed_precision=True)
+        return
+
+    loss, _ = trainer.backward(trainer(None), model, device,
+                               mixed_precision=True)
+    assert np.isfinite(loss)
+    for p in model.parameters():
+        assert p.grad.dtype == torch.float32
+
+
+def counting_optimizer(steps):
+    """SGD optimizer factory that counts model updates"""
+
+    class CountingSGD(torch.optim.SGD):
+        def step(self, closure=None):
+            steps.append(None)
+            return super().step(closure=closure)
+
+    return CountingSGD
+
+
+@pytest.mark.parametrize('accumulate', [1, 2, 4])
+def test_fit_accumulate(tmp_path, accumulate):
+    trainer = Regression(batches_per_epoch=8)
+    steps = []
+    trainer.fit(torch.nn.Linear(3, 1), None, None, epochs=1,
+                get_optimizer=counting_optimizer(steps), learning_rate=0.01,
+                log_dir=str(tmp_path / 'log'), accumulate=accumulate)
+
+    # epochs #0 and #1 have the same number of batches, whatever the number
+    # of accumulated batches per update (+ one batch to initialize training)
+    assert trainer.n_batches == 2 * 8 + 1
+    assert len(steps) == 2 * 8 // accumulate
+    assert (tmp_path / 'log' / 'weights' / '0001.pt').exists()
+
+
+def test_fit_invalid_accumulate(tmp_path):
+    with pytest.raises(ValueError):
+        Regression().fit(torch.nn.Linear(3, 1), None, None, epochs=1,
+                         learning_rate=0.01, log_dir=str(tmp_path / 'log'),
+                         accumulate=0)
+
+
+def test_not_distributed():
+    assert distributed.get_rank() == 0
+    assert distributed.get_world_size() == 1
+    assert distributed.broadcast([1., 2.]) == [1., 2.]
+    assert distributed.average_gradients(None, 0.5) == 0.5
+
+
+def average():
+    """Average rank-dependent gradients and losses over all processes"""
+    rank = distributed.get_rank()
+    parameter = torch.nn.Parameter(torch.zeros(2))
+    unused = torch.nn.Parameter(torch.zeros(2))
+    optimizer = torch.optim.SGD([parameter, unused], lr=0.1)
+    parameter.grad = torch.full((2, ), float(rank + 1))
+    loss = distributed.average_gradients(optimizer, float(rank))
+    broadcasted = distributed.broadcast([rank])
+    yield {'world_size': distributed.get_world_size(),
+           'loss': loss,
+           'gradient': parameter.grad.tolist(),
+           'unused': unused.grad,
+           'broadcasted': broadcasted}
+
+
+def test_distributed_launch():
+    result, = distributed.launch(average, 3)
+    assert result['world_size'] == 3
+    assert np.isclose(result['loss'], 1.)
+    np.testing.assert_allclose(result['gradient'], [2., 2.])
+    assert result['unused'] is None
+    assert result['broadcasted'] == [0.]
+    assert not distributed.is_distributed()
+    assert not multiprocessing.active_children()
+
+
+def test_fit_distributed(tmp_path):
+    trainer = Regression(batches_per_epoch=8)
+    steps = []
+    model = trainer.fit(torch.nn.Linear(3, 1), None, None, epochs=1,
+                        get_optimizer=counting_optimizer(steps),
+                        learning_rate=0.01, log_dir=str(tmp_path / 'log'),
+                        accumulate=2, world_size=2)
+
+    # each process goes through its own share of the batches of each epoch
+    assert trainer.n_batches == 2 * 8 // 2 + 1
+    assert len(steps) == 2 * 8 // (2 * 2)
+    assert isinstance(model, torch.nn.Linear)
+    assert not distributed.is_distributed()
+    assert not multiprocessing.active_children()